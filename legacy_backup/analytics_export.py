@@ -0,0 +1,211 @@
+"""
+Columnar export of the inspection history, for pandas / DuckDB / Spark.
+
+Rows of Inspection joined with Extinguisher and User are read through a
+server-side cursor and encoded ARROW_BATCH_ROWS at a time, either as an Arrow
+IPC stream (format=arrow) or as Parquet with one row group per batch
+(format=parquet). Timestamps are typed (UTC, microseconds) and the low-
+cardinality text columns (location, type, inspection_type, observation) are
+dictionary-encoded, so loading them needs no parsing:
+
+    pandas.read_parquet("inspections.parquet")
+    pyarrow.ipc.open_stream(response_body).read_all()
+
+pyarrow is in requirements.txt; an install without it still serves CSV and
+answers 501 for these formats. For offline use, write one file per month
+(month=YYYY-MM/, the layout pyarrow.dataset and Spark read as a partition):
+
+    python analytics_export.py --out exports/ [--format parquet|arrow] [--since 2026-01-01] [--until ...]
+"""
+import os
+from datetime import datetime
+from typing import Iterator, List, Optional
+from sqlmodel import Session, select
+from database import engine
+from models import Extinguisher, Inspection, User
+from audit_pack import ChunkSink
+
+ARROW_BATCH_ROWS = int(os.getenv("ARROW_BATCH_ROWS", "65536"))
+PARQUET_COMPRESSION = "zstd"
+FORMATS = {
+    # format -> (media type, file extension)
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+# (column name, selected expression, kind): kind picks the Arrow type in schema()
+COLUMNS = [
+    ("inspection_id", Inspection.id, "id"),
+    ("inspection_date", Inspection.inspection_date, "timestamp"),
+    ("inspection_type", Inspection.inspection_type, "category"),
+    ("observation", Inspection.observation, "category"),
+    ("remarks", Inspection.remarks, "text"),
+    ("pressure_tested_on", Inspection.pressure_tested_on, "timestamp"),
+    ("date_of_discharge", Inspection.date_of_discharge, "timestamp"),
+    ("refilled_on", Inspection.refilled_on, "timestamp"),
+    ("due_for_refilling", Inspection.due_for_refilling, "timestamp"),
+    ("hydro_pressure_tested_on", Inspection.hydro_pressure_tested_on, "timestamp"),
+    ("next_hydro_pressure_test_due", Inspection.next_hydro_pressure_test_due, "timestamp"),
+    ("device_id", Inspection.device_id, "text"),
+    ("inspector_id", User.id, "id"),
+    ("inspector", User.username, "category"),
+    ("extinguisher_id", Extinguisher.id, "id"),
+    ("sl_no", Extinguisher.sl_no, "text"),
+    ("location", Extinguisher.location, "category"),
+    ("type", Extinguisher.type, "category"),
+    ("capacity", Extinguisher.capacity, "category"),
+    ("year_of_manufacture", Extinguisher.year_of_manufacture, "int"),
+]
+DATE_INDEX = 1 # Position of inspection_date in COLUMNS
+
+
+def available() -> bool:
+    try:
+        import pyarrow # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def schema():
+    import pyarrow as pa
+
+    types = {
+        "id": pa.string(),
+        "text": pa.string(),
+        "category": pa.dictionary(pa.int32(), pa.string()),
+        "timestamp": pa.timestamp("us", tz="UTC"), # Stored as naive UTC
+        "int": pa.int32(),
+    }
+    return pa.schema([pa.field(name, types[kind]) for name, _, kind in COLUMNS])
+
+
+def export_statement(since: Optional[datetime] = None, until: Optional[datetime] = None, ascending: bool = False):
+    order = Inspection.inspection_date.asc() if ascending else Inspection.inspection_date.desc()
+    statement = (
+        select(*[column for _, column, _ in COLUMNS])
+        .join(User, Inspection.inspector_id == User.id, isouter=True)
+        .join(Extinguisher, Inspection.extinguisher_id == Extinguisher.id, isouter=True)
+        .order_by(order)
+    )
+    if since:
+        statement = statement.where(Inspection.inspection_date >= since)
+    if until:
+        statement = statement.where(Inspection.inspection_date < until)
+    return statement
+
+
+def to_batch(rows: List[tuple], arrow_schema):
+    import pyarrow as pa
+
+    arrays = []
+    for index, (name, _, kind) in enumerate(COLUMNS):
+        values = [row[index] for row in rows]
+        if kind == "id":
+            values = [str(value) if value is not None else None for value in values]
+        field_type = arrow_schema.field(name).type
+        if kind == "category":
+            arrays.append(pa.array(values, type=pa.string()).dictionary_encode().cast(field_type))
+        else:
+            arrays.append(pa.array(values, type=field_type))
+    return pa.record_batch(arrays, schema=arrow_schema)
+
+
+def iter_row_chunks(statement, batch_rows: int = ARROW_BATCH_ROWS) -> Iterator[List[tuple]]:
+    with Session(engine) as session:
+        result = session.exec(statement.execution_options(yield_per=batch_rows))
+        for partition in result.partitions(batch_rows):
+            yield [tuple(row) for row in partition]
+
+
+def _writer(fmt: str, sink, arrow_schema):
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        return pq.ParquetWriter(sink, arrow_schema, compression=PARQUET_COMPRESSION)
+    import pyarrow as pa
+    return pa.ipc.new_stream(sink, arrow_schema)
+
+
+def stream_export(fmt: str, since: Optional[datetime] = None, until: Optional[datetime] = None) -> Iterator[bytes]:
+    """
+    The export as a byte stream, one chunk per batch (Parquet: plus the footer at the end).
+    """
+    arrow_schema = schema()
+    sink = ChunkSink()
+    writer = _writer(fmt, sink, arrow_schema)
+    try:
+        for rows in iter_row_chunks(export_statement(since, until)):
+            writer.write_batch(to_batch(rows, arrow_schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def write_partitioned(out_dir: str, fmt: str = "parquet", since: Optional[datetime] = None,
+                      until: Optional[datetime] = None) -> dict:
+    """
+    One file per month of inspection_date: <out_dir>/month=YYYY-MM/inspections.<ext>.
+    Rows are read oldest first, so each month's file is opened once.
+    """
+    arrow_schema = schema()
+    extension = FORMATS[fmt][1]
+    files, rows_written = {}, 0
+    month, handle, writer, pending = None, None, None, []
+
+    def flush():
+        nonlocal rows_written
+        if pending:
+            writer.write_batch(to_batch(pending, arrow_schema))
+            rows_written += len(pending)
+            pending.clear()
+
+    def close():
+        nonlocal writer, handle
+        flush()
+        if writer is not None:
+            writer.close()
+            handle.close()
+            writer = handle = None
+
+    try:
+        for rows in iter_row_chunks(export_statement(since, until, ascending=True)):
+            for row in rows:
+                row_month = row[DATE_INDEX].strftime("%Y-%m")
+                if row_month != month:
+                    close()
+                    month = row_month
+                    directory = os.path.join(out_dir, f"month={month}")
+                    os.makedirs(directory, exist_ok=True)
+                    path = os.path.join(directory, f"inspections.{extension}")
+                    handle = open(path, "wb")
+                    writer = _writer(fmt, handle, arrow_schema)
+                    files[month] = path
+                pending.append(row)
+                if len(pending) >= ARROW_BATCH_ROWS:
+                    flush()
+    finally:
+        close()
+    return {"rows": rows_written, "files": files}
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    from database import init_db
+
+    parser = argparse.ArgumentParser(description="Write the inspection history as monthly Parquet/Arrow files.")
+    parser.add_argument("--out", required=True, help="Output directory")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="parquet")
+    parser.add_argument("--since", type=datetime.fromisoformat)
+    parser.add_argument("--until", type=datetime.fromisoformat)
+    args = parser.parse_args()
+
+    if not available():
+        parser.exit(1, "pyarrow is not installed: pip install pyarrow\n")
+    init_db()
+    start = time.perf_counter()
+    result = write_partitioned(args.out, args.format, args.since, args.until)
+    for month, path in result["files"].items():
+        print(f"{month}: {path}")
+    print(f"Wrote {result['rows']} rows to {len(result['files'])} files in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,339 @@
+"""
+Audit packs: every inspection report matching a filter in one download
+(see GET /inspections/audit-pack).
+
+format=zip streams a ZIP with one PDF per inspection plus an index.csv; each
+entry is written as soon as its report is ready, so the download starts with
+the first report. format=pdf merges the reports into one PDF with a contents
+page and bookmarks. The contents page needs every page number, so the merged
+file is spooled to a temporary file and streamed once complete.
+
+Reports go through the same digest-keyed cache as single downloads (see
+pdf_reports.py): rows load LOAD_CHUNK at a time with one joined query, photos
+referenced by URL are prefetched into the image cache (images.py) on a small
+thread pool, and cache misses render in parallel on the render pool.
+"""
+import asyncio
+import csv
+import math
+import os
+import re
+import tempfile
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from io import BytesIO, StringIO
+from typing import AsyncIterator, List, Optional, Tuple
+from starlette.concurrency import run_in_threadpool
+from sqlmodel import Session, select
+from database import run_db
+from models import Inspection, Extinguisher
+from pdf_reports import load_report_data, report_digest, report_file, get_or_render, get_pdf_styles, pdf_cache
+from images import image_cache, is_remote
+
+AUDIT_PACK_MAX_REPORTS = int(os.getenv("AUDIT_PACK_MAX_REPORTS", "2000"))
+# The merger holds every source PDF in memory while it writes, so merged packs are capped lower
+AUDIT_PACK_MAX_MERGED = int(os.getenv("AUDIT_PACK_MAX_MERGED", "300"))
+LOAD_CHUNK = 100 # Reports loaded (and queued for rendering) per query
+IMAGE_FETCH_THREADS = 8
+STREAM_CHUNK_BYTES = 64 * 1024
+CONTENTS_ROWS_PER_PAGE = 40
+
+ReportEntry = Tuple[dict, Optional[str]] # (report_data, path of the rendered PDF or None if it failed)
+
+
+def audit_pack_ids(
+    session: Session,
+    location: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    inspection_type: Optional[str] = None,
+    limit: int = AUDIT_PACK_MAX_REPORTS + 1,
+) -> List[uuid.UUID]:
+    """
+    Ids of the matching inspections, grouped by location and asset, oldest first.
+    """
+    statement = (
+        select(Inspection.id)
+        .join(Extinguisher, Inspection.extinguisher_id == Extinguisher.id, isouter=True)
+        .order_by(Extinguisher.location, Extinguisher.sl_no, Inspection.inspection_date)
+        .limit(limit)
+    )
+    if location:
+        statement = statement.where(Extinguisher.location == location)
+    if since:
+        statement = statement.where(Inspection.inspection_date >= since)
+    if until:
+        statement = statement.where(Inspection.inspection_date < until)
+    if inspection_type:
+        statement = statement.where(Inspection.inspection_type == inspection_type)
+    return list(session.exec(statement).all())
+
+
+# --- Images ------------------------------------------------------------------
+
+def _remote_images(data: dict) -> List[Tuple[str, str]]:
+    """
+    (source, derivative kind) pairs the render worker will ask the image cache for.
+    """
+    inspection = data["inspection"]
+    pairs = []
+    if inspection["photo_path"] and is_remote(inspection["photo_path"]):
+        pairs.append((inspection["photo_path"], "pdf"))
+    if inspection["signature_path"] and is_remote(inspection["signature_path"]):
+        pairs.append((inspection["signature_path"], "signature"))
+    return pairs
+
+
+def prefetch_images(pairs: List[Tuple[str, str]]) -> None:
+    """
+    Download and downsize remote images into the image cache, IMAGE_FETCH_THREADS at a time,
+    so render workers find them there instead of each fetching serially.
+    """
+    with ThreadPoolExecutor(max_workers=IMAGE_FETCH_THREADS) as pool:
+        list(pool.map(lambda pair: image_cache.derivative(*pair), pairs))
+
+
+# --- Report pipeline ---------------------------------------------------------
+
+async def iter_reports(ids: List[uuid.UUID]) -> AsyncIterator[ReportEntry]:
+    """
+    Yield (report_data, pdf_path) for each id, in order. The next chunk is loaded and
+    queued for rendering while the current one is being consumed. A report that fails
+    to render is yielded with path None rather than ending the pack.
+    """
+    prefetched = set()
+
+    async def prepare(chunk: List[uuid.UUID]) -> List[Tuple[dict, asyncio.Task]]:
+        reports = await run_db(load_report_data, chunk)
+        entries = [(reports[i], report_digest(reports[i])) for i in chunk if i in reports]
+
+        # Images are only needed for reports that still have to be rendered
+        missing = {
+            pair for data, digest in entries if not os.path.exists(pdf_cache.path(report_file(digest)))
+            for pair in _remote_images(data)
+        } - prefetched
+        if missing:
+            prefetched.update(missing)
+            await run_in_threadpool(prefetch_images, sorted(missing))
+
+        return [(data, asyncio.ensure_future(get_or_render(data, digest))) for data, digest in entries]
+
+    chunks = [ids[i:i + LOAD_CHUNK] for i in range(0, len(ids), LOAD_CHUNK)]
+    upcoming = asyncio.ensure_future(prepare(chunks[0])) if chunks else None
+    current = []
+    try:
+        for index in range(len(chunks)):
+            current = await upcoming
+            upcoming = asyncio.ensure_future(prepare(chunks[index + 1])) if index + 1 < len(chunks) else None
+            for data, task in current:
+                try:
+                    path = await task
+                except Exception as e:
+                    print(f"Audit pack: failed to render inspection {data['inspection']['id']}: {e}")
+                    path = None
+                yield data, path
+    finally:
+        # Client went away mid-download: don't leave renders nobody will read
+        if upcoming is not None:
+            if upcoming.done() and not upcoming.cancelled() and upcoming.exception() is None:
+                current = current + upcoming.result()
+            upcoming.cancel()
+        for _, task in current:
+            task.cancel() # No-op once done; a queued render never starts
+
+
+def safe_name(value) -> str:
+    """
+    value as a file name component: no separators, no leading dots.
+    """
+    return re.sub(r"[^\w.-]+", "_", str(value or "-")).strip("._") or "-"
+
+
+def entry_name(data: dict) -> str:
+    """
+    <location>/<serial>_<date>_<type>_<id>.pdf, safe for any unzip tool.
+    """
+    safe = safe_name
+    inspection = data["inspection"]
+    extinguisher = data["extinguisher"] or {}
+    stem = "_".join([
+        safe(extinguisher.get("sl_no", "Deleted Asset")),
+        safe(inspection["date"]),
+        safe(inspection["type"]),
+        inspection["id"][:8],
+    ])
+    return f"{safe(extinguisher.get('location', 'Unknown'))}/{stem}.pdf"
+
+
+INDEX_HEADER = ["File", "Inspection ID", "Date", "Type", "Extinguisher SN", "Location", "Inspector", "Result"]
+
+
+def index_row(data: dict, name: str) -> list:
+    inspection = data["inspection"]
+    extinguisher = data["extinguisher"] or {}
+    return [
+        name,
+        inspection["id"],
+        inspection["date"],
+        inspection["type"],
+        extinguisher.get("sl_no", "Deleted Asset"),
+        extinguisher.get("location", "N/A"),
+        data["inspector"] or "Unknown",
+        inspection["observation"],
+    ]
+
+
+# --- ZIP ---------------------------------------------------------------------
+
+class ChunkSink:
+    """
+    Write-only file object for zipfile. Without seek/tell zipfile switches to
+    streaming mode (sizes go in data descriptors after each entry). Also used
+    for the Arrow/Parquet writers in analytics_export.py.
+    """
+    closed = False # Checked by pyarrow before writing
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _zip_file(zf: zipfile.ZipFile, sink: ChunkSink, name: str, path: str) -> bytes:
+    info = zipfile.ZipInfo(name, date_time=time.localtime(os.path.getmtime(path))[:6])
+    info.compress_type = zipfile.ZIP_DEFLATED
+    with open(path, "rb") as src, zf.open(info, "w") as dest:
+        while chunk := src.read(STREAM_CHUNK_BYTES):
+            dest.write(chunk)
+    return sink.drain()
+
+
+def _zip_close(zf: zipfile.ZipFile, sink: ChunkSink, rows: List[list]) -> bytes:
+    index = StringIO()
+    writer = csv.writer(index)
+    writer.writerow(INDEX_HEADER)
+    writer.writerows(rows)
+    zf.writestr("index.csv", index.getvalue(), compress_type=zipfile.ZIP_DEFLATED)
+    zf.close()
+    return sink.drain()
+
+
+async def stream_zip(ids: List[uuid.UUID]) -> AsyncIterator[bytes]:
+    """
+    ZIP of one PDF per inspection plus index.csv, yielded entry by entry.
+    """
+    sink = ChunkSink()
+    zf = zipfile.ZipFile(sink, mode="w")
+    rows = []
+    reports = iter_reports(ids)
+    try:
+        async for data, path in reports:
+            if path is None:
+                rows.append(index_row(data, "(render failed)"))
+                continue
+            name = entry_name(data)
+            rows.append(index_row(data, name))
+            yield await run_in_threadpool(_zip_file, zf, sink, name, path)
+        yield await run_in_threadpool(_zip_close, zf, sink, rows)
+    finally:
+        # Closing this generator (disconnect) doesn't close the one it iterates: do it now,
+        # so its pending renders are cancelled rather than left to the garbage collector
+        await reports.aclose()
+
+
+# --- Merged PDF --------------------------------------------------------------
+
+def render_contents(rows: List[list], title: str) -> bytes:
+    """
+    Contents pages: one line per report with the page it starts on.
+    """
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+
+    styles = get_pdf_styles()
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    table = Table([["Serial No", "Location", "Date", "Type", "Result", "Page"]] + rows,
+                  colWidths=[90, 130, 100, 70, 70, 40], repeatRows=1)
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 8),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+        ('ALIGN', (-1, 0), (-1, -1), 'RIGHT'),
+    ]))
+    doc.build([Paragraph(title, styles['Title']), Spacer(1, 12), table])
+    return buffer.getvalue()
+
+
+def _clip(value, width: int) -> str:
+    value = str(value or "-")
+    return value if len(value) <= width else value[:width - 3] + "..."
+
+
+def merge_reports(entries: List[ReportEntry], title: str, out) -> None:
+    """
+    Write contents page(s) followed by every report, with one bookmark per report, to out.
+    """
+    from pypdf import PdfReader, PdfWriter
+
+    readers = [PdfReader(path) for _, path in entries]
+
+    # Page numbers depend on how long the contents are; re-render if the estimate was off
+    contents_pages = max(1, math.ceil(len(entries) / CONTENTS_ROWS_PER_PAGE))
+    while True:
+        page, rows = contents_pages + 1, []
+        for (data, _), reader in zip(entries, readers):
+            extinguisher = data["extinguisher"] or {}
+            inspection = data["inspection"]
+            rows.append([
+                _clip(extinguisher.get("sl_no", "Deleted Asset"), 18),
+                _clip(extinguisher.get("location"), 26),
+                inspection["date"],
+                _clip(inspection["type"], 14),
+                _clip(inspection["observation"], 14),
+                str(page),
+            ])
+            page += len(reader.pages)
+        contents = PdfReader(BytesIO(render_contents(rows, title)))
+        if len(contents.pages) == contents_pages:
+            break
+        contents_pages = len(contents.pages)
+
+    writer = PdfWriter()
+    writer.append(contents, outline_item="Contents")
+    for (data, _), reader in zip(entries, readers):
+        extinguisher = data["extinguisher"] or {}
+        label = f"{extinguisher.get('sl_no', 'Deleted Asset')} - {data['inspection']['date']}"
+        writer.append(reader, outline_item=label, import_outline=False)
+    writer.write(out)
+
+
+def _read_chunk(f) -> bytes:
+    return f.read(STREAM_CHUNK_BYTES)
+
+
+async def stream_merged_pdf(ids: List[uuid.UUID], title: str) -> AsyncIterator[bytes]:
+    """
+    One PDF with a contents page, spooled to disk and then streamed.
+    """
+    entries = [entry async for entry in iter_reports(ids) if entry[1] is not None]
+    with tempfile.TemporaryFile() as out:
+        await run_in_threadpool(merge_reports, entries, title, out)
+        out.seek(0)
+        while chunk := await run_in_threadpool(_read_chunk, out):
+            yield chunk
@@ -1,8 +1,15 @@
 # from passlib.context import CryptContext
 import bcrypt
 from jose import jwt, JWTError
+from fastapi import HTTPException, status
 from datetime import datetime, timedelta
 from typing import Optional
+from concurrent.futures import ThreadPoolExecutor, Future
+import asyncio
+import threading
+import time
+import uuid
+import os
 
 # CONSTANTS - CHANGE IN PROD
 SECRET_KEY = "simplesecret"
@@ -11,32 +18,186 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 # 1 Day
 
 # pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-def verify_password(plain, hashed):
-    # return pwd_context.verify(plain, hashed)
+# bcrypt cost factor. Raising it is safe: existing hashes are upgraded on the next successful login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# bcrypt is CPU-bound (~250 ms at cost 12) and releases the GIL, so it runs on
+# its own small thread pool instead of the event loop or the request threadpool.
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", str(os.cpu_count() or 2)))
+BCRYPT_MAX_QUEUE = int(os.getenv("BCRYPT_MAX_QUEUE", "256"))
+
+class HashPool:
+    """
+    Bounded worker pool for password hashing. When more than max_queue jobs are
+    waiting, new ones are refused with 503 instead of piling up behind a login storm.
+    """
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._lock = threading.Lock()
+        self.waiting = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_run = 0.0
+
+    def submit(self, fn, *args) -> Future:
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many concurrent logins, please retry",
+                headers={"Retry-After": "1"},
+            )
+        queued_at = time.perf_counter()
+        with self._lock:
+            self.waiting += 1
+
+        def job():
+            started_at = time.perf_counter()
+            with self._lock:
+                self.waiting -= 1
+                self.running += 1
+                wait = started_at - queued_at
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self.running -= 1
+                    self.completed += 1
+                    self.total_run += time.perf_counter() - started_at
+                self._slots.release()
+
+        return self._executor.submit(job)
+
+    async def run(self, fn, *args):
+        """
+        Await a hashing job from async code without blocking the event loop.
+        """
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+    def run_sync(self, fn, *args):
+        """
+        Run a hashing job from sync code (already off the event loop) and wait for it.
+        """
+        return self.submit(fn, *args).result()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "rounds": BCRYPT_ROUNDS,
+                "waiting": self.waiting,
+                "running": self.running,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_wait_ms": round(1000 * self.total_wait / self.completed, 2) if self.completed else 0.0,
+                "max_wait_ms": round(1000 * self.max_wait, 2),
+                "avg_hash_ms": round(1000 * self.total_run / self.completed, 2) if self.completed else 0.0,
+            }
+
+hash_pool = HashPool(BCRYPT_WORKERS, BCRYPT_MAX_QUEUE)
+
+def _checkpw(plain, hashed):
     if isinstance(hashed, str):
         hashed = hashed.encode('utf-8')
     return bcrypt.checkpw(plain.encode('utf-8'), hashed)
 
+def _hashpw(password):
+    salt = bcrypt.gensalt(rounds=BCRYPT_ROUNDS)
+    return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+
+def verify_password(plain, hashed):
+    # return pwd_context.verify(plain, hashed)
+    return hash_pool.run_sync(_checkpw, plain, hashed)
+
+async def verify_password_async(plain, hashed):
+    return await hash_pool.run(_checkpw, plain, hashed)
+
 def get_password_hash(password):
     # return pwd_context.hash(password)
-    salt = bcrypt.gensalt()
-    return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+    return hash_pool.run_sync(_hashpw, password)
+
+async def get_password_hash_async(password):
+    return await hash_pool.run(_hashpw, password)
+
+def password_needs_rehash(hashed: str) -> bool:
+    """
+    True if the hash was made with a different cost factor than BCRYPT_ROUNDS ($2b$<cost>$...).
+    """
+    try:
+        return int(hashed.split("$")[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError, AttributeError):
+        return False
 
 def create_access_token(data: dict):
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    now = datetime.utcnow()
+    expire = now + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    to_encode.update({"exp": expire, "iat": now, "jti": uuid.uuid4().hex})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-from fastapi import Depends, HTTPException, status
+def token_claims(user) -> dict:
+    """
+    Claims for a user's access token. uid/ver let get_current_user skip the DB lookup.
+    """
+    return {
+        "sub": user.username,
+        "role": user.role,
+        "uid": str(user.id),
+        "ver": user.token_version or 0,
+    }
+
+from fastapi import Depends
 from fastapi.security import OAuth2PasswordBearer
-from sqlmodel import Session, select
-from database import get_session
+from sqlmodel import SQLModel, select
+from database import run_db
 from models import User
+from cache import TTLCache
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-async def get_current_user(token: str = Depends(oauth2_scheme), session: Session = Depends(get_session)):
+class TokenUser(SQLModel):
+    """
+    The authenticated user as described by verified token claims.
+    Has the User attributes routes rely on (id, username, role, is_active) without a DB row.
+    """
+    id: uuid.UUID
+    username: str
+    role: str
+    is_active: bool = True
+
+# user id -> (token_version, is_active). Workers learn about revocations made
+# elsewhere when their entry expires, so the TTL bounds that delay.
+user_state_cache = TTLCache(
+    "auth_users",
+    maxsize=int(os.getenv("AUTH_USER_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("AUTH_USER_CACHE_TTL", "30")),
+)
+
+def remember_user_state(user: User):
+    user_state_cache.set(user.id, (user.token_version or 0, user.is_active))
+
+def revoke_user_tokens(user: User):
+    """
+    Invalidate every token issued to this user so far. Commit, then call remember_user_state.
+    """
+    user.token_version = (user.token_version or 0) + 1
+
+def _user_by_id(session, user_id: uuid.UUID) -> Optional[User]:
+    return session.get(User, user_id)
+
+def _user_by_username(session, username: str) -> Optional[User]:
+    return session.exec(select(User).where(User.username == username)).first()
+
+async def get_current_user(token: str = Depends(oauth2_scheme)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -49,10 +210,36 @@ async def get_current_user(token: str = Depends(oauth2_scheme), session: Session
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-        
+
+    # Fast path: the signed claims carry everything routes need; only the
+    # token version / active flag is checked, against the in-memory cache.
+    user_id, version, role = payload.get("uid"), payload.get("ver"), payload.get("role")
+    if user_id is not None and version is not None and role is not None:
+        try:
+            user_uuid = uuid.UUID(user_id)
+        except ValueError:
+            raise credentials_exception
+
+        found, state = user_state_cache.get(user_uuid)
+        if not found:
+            try:
+                user = await run_db(_user_by_id, user_uuid)
+            except Exception as e:
+                print(f"AUTH DB ERROR: {e}")
+                raise HTTPException(status_code=500, detail="Database Authentication Error")
+            if user is None:
+                raise credentials_exception
+            remember_user_state(user)
+            state = (user.token_version or 0, user.is_active)
+
+        current_version, is_active = state
+        if not is_active or version != current_version:
+            raise credentials_exception
+        return TokenUser(id=user_uuid, username=username, role=role)
+
+    # Tokens issued before uid/ver were added: look the user up by name
     try:
-        statement = select(User).where(User.username == username)
-        user = session.exec(statement).first()
+        user = await run_db(_user_by_username, username)
     except Exception as e:
         print(f"AUTH DB ERROR: {e}")
         # If DB error (e.g. missing column), we can't authenticate.
@@ -60,7 +247,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme), session: Session
         # For the user, they see 401 usually.
         raise HTTPException(status_code=500, detail="Database Authentication Error")
 
-    if user is None:
+    if user is None or not user.is_active:
         raise credentials_exception
         
     return user
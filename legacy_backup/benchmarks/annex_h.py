@@ -0,0 +1,141 @@
+"""
+Benchmark: Annex H report (/inspections/export-csv), legacy per-asset scans vs. the correlated latest-row query.
+
+Builds a synthetic SQLite database, renders the report both ways, checks the
+outputs match and prints timings.
+
+    python benchmarks/annex_h.py                         # 50k assets x 40 inspections
+    python benchmarks/annex_h.py --assets 2000 --inspections 10
+    python benchmarks/annex_h.py --db /tmp/annex.db --reuse
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert
+from sqlalchemy.orm import selectinload
+from sqlmodel import SQLModel, Session, create_engine, select
+from models import Extinguisher, Inspection
+from routers.inspections import iter_annex_h_rows
+
+INSPECTION_TYPES = ["Monthly", "Quarterly", "Annual"]
+BATCH = 10_000
+
+
+def build_dataset(engine, assets: int, per_asset: int, seed: int = 7):
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    SQLModel.metadata.create_all(engine)
+    with engine.begin() as conn:
+        ext_rows, insp_rows = [], []
+        for n in range(assets):
+            ext_id = uuid.uuid4()
+            ext_rows.append({
+                "id": ext_id, "sl_no": f"FE-{n:06d}", "type": rng.choice(["CO2", "ABC", "Water"]),
+                "capacity": "4.5KG", "location": f"Plant {n % 12}", "make": "FireSafe",
+                "year_of_manufacture": 2015 + n % 10, "status": "Operational",
+                "is_active": n % 50 != 0, "created_at": now - timedelta(minutes=n),
+            })
+            for k in range(per_asset):
+                optional = lambda: now - timedelta(days=rng.randint(0, 3650)) if rng.random() < 0.2 else None
+                insp_rows.append({
+                    "id": uuid.uuid4(), "extinguisher_id": ext_id,
+                    "inspection_type": rng.choice(INSPECTION_TYPES),
+                    "inspection_date": now - timedelta(days=k * 91, minutes=rng.randint(0, 1440)),
+                    "observation": "Ok", "remarks": f"r{k}" if rng.random() < 0.5 else None,
+                    "pressure_tested_on": optional(), "date_of_discharge": optional(),
+                    "refilled_on": optional(), "due_for_refilling": optional(),
+                })
+            if len(insp_rows) >= BATCH:
+                conn.execute(insert(Extinguisher.__table__), ext_rows)
+                conn.execute(insert(Inspection.__table__), insp_rows)
+                ext_rows, insp_rows = [], []
+        if ext_rows:
+            conn.execute(insert(Extinguisher.__table__), ext_rows)
+        if insp_rows:
+            conn.execute(insert(Inspection.__table__), insp_rows)
+
+
+def legacy_rows(session: Session):
+    """
+    The original implementation: load every history, sort and scan it per column.
+    """
+    statement = (
+        select(Extinguisher)
+        .where(Extinguisher.is_active == True)
+        .options(selectinload(Extinguisher.inspections))
+    )
+    for ext in session.exec(statement).all():
+        sorted_inspections = sorted(ext.inspections, key=lambda x: x.inspection_date, reverse=True)
+
+        def get_latest_date(insp_type):
+            for i in sorted_inspections:
+                if i.inspection_type == insp_type:
+                    return i.inspection_date.strftime("%d/%m/%Y")
+            return "-"
+
+        def fmt_date(d):
+            return d.strftime("%d/%m/%Y") if d else "-"
+
+        def get_latest_attr(attr_name):
+            for i in sorted_inspections:
+                val = getattr(i, attr_name, None)
+                if val:
+                    return val.strftime("%d/%m/%Y")
+            return "-"
+
+        yield [
+            ext.sl_no, ext.type, ext.capacity, ext.year_of_manufacture or "-", ext.make or "-", ext.location,
+            get_latest_date("Monthly"), get_latest_date("Quarterly"), get_latest_date("Annual"),
+            get_latest_attr("pressure_tested_on"), get_latest_attr("date_of_discharge"),
+            get_latest_attr("refilled_on"), get_latest_attr("due_for_refilling"),
+            fmt_date(ext.hydro_pressure_tested_on), fmt_date(ext.next_hydro_pressure_test_due),
+            ext.status,
+            sorted_inspections[0].remarks if sorted_inspections and sorted_inspections[0].remarks else "-",
+        ]
+
+
+def timed(label, engine, producer):
+    with Session(engine) as session:
+        start = time.perf_counter()
+        rows = list(producer(session))
+        elapsed = time.perf_counter() - start
+    print(f"{label:<10} {len(rows):>8} rows  {elapsed:8.2f} s")
+    return rows, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--assets", type=int, default=50_000)
+    parser.add_argument("--inspections", type=int, default=40, help="inspections per asset")
+    parser.add_argument("--db", help="SQLite file to use (default: temporary)")
+    parser.add_argument("--reuse", action="store_true", help="skip data generation if --db exists")
+    args = parser.parse_args()
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(), "annex_h.db")
+    engine = create_engine(f"sqlite:///{db_path}")
+    if not (args.reuse and os.path.exists(db_path) and os.path.getsize(db_path) > 0):
+        print(f"Generating {args.assets} assets x {args.inspections} inspections in {db_path} ...")
+        start = time.perf_counter()
+        build_dataset(engine, args.assets, args.inspections)
+        print(f"Generated in {time.perf_counter() - start:.1f} s")
+
+    lateral_rows, lateral_time = timed("lateral", engine, iter_annex_h_rows)
+    legacy, legacy_time = timed("legacy", engine, legacy_rows)
+
+    key = lambda row: row[0]
+    if sorted(lateral_rows, key=key) != sorted(legacy, key=key):
+        print("MISMATCH between legacy and lateral output")
+        sys.exit(1)
+    print(f"Outputs match. Speed-up: {legacy_time / lateral_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Minimal in-process ASGI driver for the benchmarks: no server, no sockets,
+no extra dependencies. Requests go straight into main.app.
+"""
+import asyncio
+import json
+from typing import Optional
+from urllib.parse import urlencode
+
+
+class Response:
+    def __init__(self, status: int, headers: list, body: bytes):
+        self.status_code = status
+        self.headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in headers}
+        self.content = body
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class ASGIClient:
+    def __init__(self, app, headers: Optional[dict] = None):
+        self.app = app
+        self.headers = dict(headers or {})
+        self._lifespan_task = None
+        self._lifespan_events = None
+
+    async def start(self):
+        """
+        Run the app's lifespan startup (init_db, migrations, ...).
+        """
+        self._lifespan_events = asyncio.Queue()
+        started = asyncio.get_running_loop().create_future()
+        self._stopped = asyncio.get_running_loop().create_future()
+        await self._lifespan_events.put({"type": "lifespan.startup"})
+
+        async def send(message):
+            if message["type"] == "lifespan.startup.complete":
+                started.set_result(True)
+            elif message["type"] == "lifespan.startup.failed":
+                started.set_exception(RuntimeError(message.get("message")))
+            elif message["type"] == "lifespan.shutdown.complete":
+                self._stopped.set_result(True)
+
+        scope = {"type": "lifespan", "asgi": {"version": "3.0"}, "state": {}}
+        self._lifespan_task = asyncio.create_task(self.app(scope, self._lifespan_events.get, send))
+        await started
+
+    async def stop(self):
+        if self._lifespan_task:
+            await self._lifespan_events.put({"type": "lifespan.shutdown"})
+            await self._stopped
+            await self._lifespan_task
+
+    async def request(self, method: str, path: str, params: Optional[dict] = None,
+                      json_body=None, form: Optional[dict] = None, headers: Optional[dict] = None) -> Response:
+        body = b""
+        all_headers = {**self.headers, **(headers or {})}
+        if json_body is not None:
+            body = json.dumps(json_body, default=str).encode()
+            all_headers["content-type"] = "application/json"
+        elif form is not None:
+            body = urlencode(form).encode()
+            all_headers["content-type"] = "application/x-www-form-urlencoded"
+        all_headers["content-length"] = str(len(body))
+
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method.upper(),
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": urlencode(params or {}, doseq=True).encode(),
+            "root_path": "",
+            "headers": [(k.lower().encode("latin-1"), str(v).encode("latin-1")) for k, v in all_headers.items()],
+            "client": ("127.0.0.1", 12345),
+            "server": ("testserver", 80),
+        }
+        request_sent = False
+
+        async def receive():
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            await asyncio.Event().wait() # Never disconnects
+            return {"type": "http.disconnect"}
+
+        status, response_headers, chunks = 500, [], []
+
+        async def send(message):
+            nonlocal status, response_headers
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                response_headers = message.get("headers", [])
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, send)
+        return Response(status, response_headers, b"".join(chunks))
+
+    async def get(self, path: str, **kwargs) -> Response:
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path: str, **kwargs) -> Response:
+        return await self.request("POST", path, **kwargs)
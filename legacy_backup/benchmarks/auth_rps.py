@@ -0,0 +1,70 @@
+"""
+Benchmark: authenticated requests per second, legacy token (user looked up by
+username on every request) vs. claims token (uid/ver verified against the
+in-memory user-state cache).
+
+    python benchmarks/auth_rps.py --requests 2000 --concurrency 8
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_auth.db')}"
+
+from asgi_client import ASGIClient
+
+
+async def drive(client: ASGIClient, path: str, token: str, total: int, concurrency: int) -> float:
+    headers = {"authorization": f"Bearer {token}"}
+    remaining = iter(range(total))
+
+    async def worker():
+        for _ in remaining:
+            response = await client.get(path, headers=headers)
+            if response.status_code != 200:
+                raise RuntimeError(f"{path} -> {response.status_code}: {response.content[:200]}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return total / (time.perf_counter() - start)
+
+
+async def main(args):
+    import main as app_module
+    from sqlmodel import Session, select
+    from database import engine
+    from models import User
+    from auth import create_access_token, token_claims, get_password_hash
+
+    client = ASGIClient(app_module.app)
+    await client.start()
+    with Session(engine) as session:
+        admin = session.exec(select(User).where(User.username == "bench_admin")).first()
+        if not admin:
+            admin = User(username="bench_admin", password_hash=get_password_hash("x"), role="admin")
+            session.add(admin)
+            session.commit()
+            session.refresh(admin)
+        legacy_token = create_access_token(data={"sub": admin.username, "role": admin.role})
+        claims_token = create_access_token(data=token_claims(admin))
+
+    results = {}
+    for label, token in (("legacy", legacy_token), ("claims", claims_token)):
+        await drive(client, args.path, token, min(100, args.requests), args.concurrency) # Warm-up
+        results[label] = await drive(client, args.path, token, args.requests, args.concurrency)
+        print(f"{label:<8} {results[label]:8.1f} req/s  ({args.requests} x GET {args.path}, concurrency {args.concurrency})")
+    print(f"Speed-up: {results['claims'] / results['legacy']:.2f}x")
+    await client.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--path", default="/users/", help="authenticated endpoint to hit")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,191 @@
+"""
+Synthetic production-scale data: inspectors, extinguishers across many
+locations, and a history of inspections per asset, a share of them with a
+photo reference. Rows go in through batched executemany inserts; the derived
+state the routes rely on (current-state columns, daily rollup, compliance due
+dates, change log) is filled in afterwards, so the API sees a consistent
+database.
+
+    python benchmarks/datagen.py --db /tmp/bench.db                  # 20k assets x 24 inspections
+    python benchmarks/datagen.py --db /tmp/bench.db --assets 100000 --inspections 40 --locations 200 --photos 0.5
+    DATABASE_URL=postgresql://... python benchmarks/datagen.py       # any database the app supports
+
+Every generated user's password is BENCH_PASSWORD. Same --seed, same data.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert
+from models import ChangeLog, Extinguisher, Inspection, User
+from extinguisher_state import RECENT_INSPECTIONS
+from utils import normalize_serial
+
+BATCH = 10_000
+BENCH_PASSWORD = "bench"
+BENCH_ADMIN = "bench_admin"
+TYPES = [("ABC Powder", "6KG"), ("CO2", "4.5KG"), ("Water", "9L"), ("Foam", "9L"), ("Clean Agent", "2KG")]
+MAKES = ["FireSafe", "Ceasefire", "Kanex", "Safex", None]
+INSPECTION_TYPES = ["Monthly", "Quarterly", "Annual"]
+OBSERVATIONS = ["Ok"] * 17 + ["Not Ok", "Pressure Low", "Seal Broken"]
+
+
+def _flush(conn, table, rows: list):
+    if rows:
+        conn.execute(insert(table), rows)
+        rows.clear()
+
+
+def generate(engine, assets: int = 20_000, per_asset: int = 24, locations: int = 60, inspectors: int = 25,
+             photo_ratio: float = 0.3, interval_days: int = 30, seed: int = 7) -> dict:
+    """
+    Insert the dataset into an already-migrated database. Returns row counts and timings.
+    """
+    from sqlmodel import Session
+    from auth import get_password_hash
+    from compliance import recompute
+    from rollups import rebuild_daily_rollup
+
+    rng = random.Random(seed)
+    now = datetime.utcnow().replace(microsecond=0)
+    password_hash = get_password_hash(BENCH_PASSWORD) # bcrypt once, not per user
+    timings = {}
+
+    start = time.perf_counter()
+    users = [{"id": uuid.UUID(int=rng.getrandbits(128)), "username": BENCH_ADMIN, "role": "admin"}]
+    users += [
+        {"id": uuid.UUID(int=rng.getrandbits(128)), "username": f"bench_inspector_{n:03d}", "role": "inspector"}
+        for n in range(inspectors)
+    ]
+    for user in users:
+        user.update(password_hash=password_hash, is_active=True, created_at=now, token_version=0)
+    usernames = {user["id"]: user["username"] for user in users}
+    location_names = [f"Plant {n // 10 + 1} / Bay {n % 10 + 1}" for n in range(locations)]
+
+    ext_rows, insp_rows, ids = [], [], {"extinguisher": [], "inspection": [], "user": [u["id"] for u in users]}
+    with engine.begin() as conn:
+        conn.execute(insert(User.__table__), users)
+        for n in range(assets):
+            ext_id = uuid.UUID(int=rng.getrandbits(128))
+            ext_type, capacity = rng.choice(TYPES)
+            sl_no = f"BF-{n:07d}"
+            history = []
+            for k in range(per_asset):
+                inspector = rng.choice(users[1:] or users)
+                history.append({
+                    "id": uuid.UUID(int=rng.getrandbits(128)),
+                    "extinguisher_id": ext_id,
+                    "inspector_id": inspector["id"],
+                    "inspection_type": "Annual" if k % 12 == 0 else rng.choice(INSPECTION_TYPES),
+                    "inspection_date": now - timedelta(days=k * interval_days + rng.randint(0, interval_days - 1),
+                                                       minutes=rng.randint(0, 1439)),
+                    "observation": rng.choice(OBSERVATIONS),
+                    "remarks": "Checked" if rng.random() < 0.3 else None,
+                    "refilled_on": now - timedelta(days=rng.randint(0, 1000)) if rng.random() < 0.05 else None,
+                    "pressure_tested_on": None,
+                    "date_of_discharge": None,
+                    "due_for_refilling": None,
+                    "hydro_pressure_tested_on": None,
+                    "next_hydro_pressure_test_due": None,
+                    "photo_path": f"/static/uploads/photo_{uuid.UUID(int=rng.getrandbits(128)).hex}.jpg"
+                                  if rng.random() < photo_ratio else None,
+                    "signature_path": None,
+                    "device_id": f"device-{inspector['username'][-3:]}",
+                    "idempotency_key": None,
+                })
+            # Current-state columns, as extinguisher_state.apply_inspection would have left them
+            latest = sorted(history, key=lambda row: row["inspection_date"], reverse=True)[:RECENT_INSPECTIONS]
+            newest = latest[0] if latest else None
+            ext_rows.append({
+                "id": ext_id, "sl_no": sl_no, "sl_no_normalized": normalize_serial(sl_no),
+                "type": ext_type, "capacity": capacity, "location": rng.choice(location_names),
+                "make": rng.choice(MAKES), "year_of_manufacture": rng.randint(now.year - 12, now.year),
+                "qr_code_url": None, "status": "Non-Operational" if rng.random() < 0.03 else "Operational",
+                "is_active": rng.random() >= 0.02,
+                "created_at": now - timedelta(days=per_asset * interval_days, minutes=n),
+                "last_inspection_date": newest and newest["inspection_date"],
+                "next_service_due": None,
+                "hydro_pressure_tested_on": None,
+                "next_hydro_pressure_test_due": None,
+                "last_inspection_id": newest and newest["id"],
+                "last_inspector_id": newest and newest["inspector_id"],
+                "last_inspector_name": newest and usernames[newest["inspector_id"]],
+                "last_due_for_refilling": None,
+                "recent_inspection_ids": ",".join(str(row["id"]) for row in latest) or None,
+            })
+            ids["extinguisher"].append(ext_id)
+            ids["inspection"].extend(row["id"] for row in history)
+            insp_rows.extend(history)
+            if len(insp_rows) >= BATCH or len(ext_rows) >= BATCH:
+                _flush(conn, Extinguisher.__table__, ext_rows) # Before inspection, for the foreign key
+                _flush(conn, Inspection.__table__, insp_rows)
+        _flush(conn, Extinguisher.__table__, ext_rows)
+        _flush(conn, Inspection.__table__, insp_rows)
+
+        # One change per row, as migration 14 seeds it, so /sync from 0 returns the dataset
+        for entity, entity_ids in ids.items():
+            for offset in range(0, len(entity_ids), BATCH):
+                conn.execute(insert(ChangeLog.__table__), [
+                    {"entity": entity, "entity_id": str(row_id), "deleted": False, "changed_at": now}
+                    for row_id in entity_ids[offset:offset + BATCH]
+                ])
+    timings["insert_s"] = round(time.perf_counter() - start, 2)
+
+    start = time.perf_counter()
+    with Session(engine) as session:
+        rollup_rows = rebuild_daily_rollup(session)
+        recompute(session)
+        session.commit()
+    timings["derive_s"] = round(time.perf_counter() - start, 2)
+
+    return {
+        "users": len(users),
+        "extinguishers": assets,
+        "inspections": len(ids["inspection"]),
+        "locations": locations,
+        "rollup_rows": rollup_rows,
+        "seed": seed,
+        **timings,
+    }
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--assets", type=int, default=20_000)
+    parser.add_argument("--inspections", type=int, default=24, help="inspections per asset")
+    parser.add_argument("--locations", type=int, default=60)
+    parser.add_argument("--inspectors", type=int, default=25)
+    parser.add_argument("--photos", type=float, default=0.3, help="share of inspections with a photo reference")
+    parser.add_argument("--seed", type=int, default=7)
+
+
+def generate_from_args(engine, args) -> dict:
+    return generate(engine, assets=args.assets, per_asset=args.inspections, locations=args.locations,
+                    inspectors=args.inspectors, photo_ratio=args.photos, seed=args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="SQLite file to create (default: DATABASE_URL)")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    if args.db:
+        if os.path.exists(args.db):
+            parser.exit(1, f"{args.db} already exists; generate into a new file\n")
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.abspath(args.db)}"
+    from database import engine, init_db
+
+    init_db()
+    print(f"Generating {args.assets} assets x {args.inspections} inspections ...")
+    result = generate_from_args(engine, args)
+    print(", ".join(f"{key}={value}" for key, value in result.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Stress test: many parallel POST /inspections/ at one extinguisher, with a
+share of them re-sent under the same Idempotency-Key (a retrying client whose
+first attempt is still in flight). Afterwards the asset must show exactly one
+inspection per key, consistent current-state columns and a matching rollup.
+
+    python benchmarks/inspection_stress.py --requests 300 --concurrency 32 --retry-ratio 0.5
+
+Exits non-zero if any check fails.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_stress.db')}"
+
+from asgi_client import ASGIClient
+
+
+async def main(args):
+    import main as app_module
+    from sqlmodel import Session, select, func
+    from database import engine
+    from models import User, Extinguisher, Inspection, InspectionDailyStat
+    from auth import create_access_token, token_claims, get_password_hash
+    from extinguisher_state import _expected_state, _usernames
+
+    client = ASGIClient(app_module.app)
+    await client.start()
+    with Session(engine) as session:
+        inspector = User(username=f"stress_{uuid.uuid4().hex[:8]}", password_hash=get_password_hash("x"), role="inspector")
+        asset = Extinguisher(sl_no=f"STRESS-{uuid.uuid4().hex[:8]}", type="CO2", capacity="4.5kg", location="Stress Bay")
+        session.add(inspector)
+        session.add(asset)
+        session.commit()
+        session.refresh(inspector)
+        session.refresh(asset)
+        token = create_access_token(data=token_claims(inspector))
+        asset_id, location = asset.id, asset.location
+        rollup_before = session.exec(
+            select(func.coalesce(func.sum(InspectionDailyStat.count), 0)).where(InspectionDailyStat.location == location)
+        ).one()
+
+    # Each request gets a fresh key, or re-sends one already handed out
+    keys = []
+    plan = []
+    for _ in range(args.requests):
+        if keys and random.random() < args.retry_ratio:
+            plan.append(random.choice(keys))
+        else:
+            keys.append(str(uuid.uuid4()))
+            plan.append(keys[-1])
+    body = {"extinguisher_id": str(asset_id), "inspection_type": "Quarterly", "device_id": "stress"}
+    headers = {"authorization": f"Bearer {token}"}
+
+    responses = defaultdict(list)
+    statuses = defaultdict(int)
+    pending = iter(plan)
+
+    async def worker():
+        for key in pending:
+            response = await client.post("/inspections/", json_body=body, headers={**headers, "idempotency-key": key})
+            statuses[response.status_code] += 1
+            if response.status_code == 200:
+                responses[key].append(response.json()["id"])
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+    await client.stop()
+
+    failures = []
+    if set(statuses) != {200}:
+        failures.append(f"non-200 responses: {dict(statuses)}")
+    split = [key for key, ids in responses.items() if len(set(ids)) != 1]
+    if split:
+        failures.append(f"{len(split)} keys returned more than one inspection id")
+
+    with Session(engine) as session:
+        stored = session.exec(select(func.count()).select_from(Inspection).where(Inspection.extinguisher_id == asset_id)).one()
+        if stored != len(responses):
+            failures.append(f"{stored} inspections stored for {len(responses)} distinct keys")
+
+        asset = session.get(Extinguisher, asset_id)
+        expected = _expected_state(session, asset, _usernames(session))
+        for column, value in expected.items():
+            if column != "last_inspection_date" and getattr(asset, column) != value:
+                failures.append(f"extinguisher.{column} is {getattr(asset, column)!r}, history says {value!r}")
+
+        rollup_after = session.exec(
+            select(func.coalesce(func.sum(InspectionDailyStat.count), 0)).where(InspectionDailyStat.location == location)
+        ).one()
+        if rollup_after - rollup_before != stored:
+            failures.append(f"rollup grew by {rollup_after - rollup_before}, expected {stored}")
+
+    print(f"{args.requests} requests ({len(keys)} distinct keys), concurrency {args.concurrency}: "
+          f"{args.requests / elapsed:.1f} req/s, statuses {dict(statuses)}, {stored} inspections stored")
+    if failures:
+        print("FAILED:")
+        for failure in failures:
+            print(f"  - {failure}")
+        sys.exit(1)
+    print("OK: one inspection per key, current state and rollup consistent")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--retry-ratio", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    random.seed(args.seed)
+    asyncio.run(main(args))
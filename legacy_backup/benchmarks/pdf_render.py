@@ -0,0 +1,112 @@
+"""
+Benchmark: GET /inspections/{id}/pdf cold (empty cache, every request renders
+on the pool), warm (served from the disk cache) and conditional (If-None-Match,
+304 without a body).
+
+Each inspection carries a photo from uploads/ when one exists, so the cold
+numbers include image decoding like real reports do.
+
+    python benchmarks/pdf_render.py --inspections 100 --concurrency 16
+    PDF_RENDER_WORKERS=0 python benchmarks/pdf_render.py   # render in a thread instead
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+async def drive(client, paths: list, headers: list, concurrency: int, expect: int) -> dict:
+    remaining = iter(range(len(paths)))
+    latencies = []
+
+    async def worker():
+        for i in remaining:
+            start = time.perf_counter()
+            response = await client.get(paths[i], headers=headers[i])
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != expect:
+                raise RuntimeError(f"{paths[i]} -> {response.status_code}: {response.content[:200]}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "rps": len(paths) / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+    }
+
+
+async def main(args):
+    from asgi_client import ASGIClient
+    import main as app_module
+    from sqlmodel import Session
+    from database import engine
+    from models import User, Extinguisher, Inspection
+    from auth import create_access_token, token_claims, get_password_hash
+    from pdf_reports import pdf_cache, warm_render_pool, PDF_RENDER_WORKERS
+
+    photos = [name for name in os.listdir(os.path.join(ROOT, "uploads")) if name.endswith((".jpg", ".jpeg", ".png"))]
+
+    client = ASGIClient(app_module.app)
+    await client.start()
+    with Session(engine) as session:
+        inspector = User(username="bench_pdf", password_hash=get_password_hash("x"), role="inspector")
+        session.add(inspector)
+        session.commit()
+        session.refresh(inspector)
+        ids = []
+        for i in range(args.inspections):
+            asset = Extinguisher(sl_no=f"PDF-{i}", type="CO2", capacity="4.5kg", location=f"Bay {i % 5}")
+            session.add(asset)
+            session.flush()
+            inspection = Inspection(
+                extinguisher_id=asset.id, inspector_id=inspector.id, inspection_type="Quarterly",
+                photo_path=photos[i % len(photos)] if photos else None,
+            )
+            session.add(inspection)
+            session.flush()
+            ids.append(inspection.id)
+        session.commit()
+        auth = {"authorization": f"Bearer {create_access_token(data=token_claims(inspector))}"}
+
+    # Start the workers up front, as the startup warm-up does, so cold measures rendering only
+    warm_render_pool()
+
+    paths = [f"/inspections/{inspection_id}/pdf" for inspection_id in ids]
+    plain = [auth] * len(paths)
+    results = {"cold": await drive(client, paths, plain, args.concurrency, 200)}
+    results["warm"] = await drive(client, paths, plain, args.concurrency, 200)
+
+    etags = []
+    for path in paths:
+        etags.append({**auth, "if-none-match": (await client.get(path, headers=auth)).headers["etag"]})
+    results["304"] = await drive(client, paths, etags, args.concurrency, 304)
+    await client.stop()
+
+    print(f"{args.inspections} reports, concurrency {args.concurrency}, render workers {PDF_RENDER_WORKERS}")
+    for name, result in results.items():
+        print(f"  {name:<5} {result['rps']:8.1f} req/s  p50 {result['p50_ms']:7.1f} ms  p99 {result['p99_ms']:7.1f} ms")
+    print(f"  cache: {pdf_cache.stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--inspections", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    # Render workers are spawned and re-import this file: keep all setup under the main guard
+    scratch = tempfile.mkdtemp()
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(scratch, 'bench_pdf.db')}")
+    os.environ.setdefault("PDF_CACHE_DIR", os.path.join(scratch, "pdf"))
+    os.environ.setdefault("STARTUP_WARMUP", "0")
+    os.chdir(ROOT)
+    sys.path.insert(0, ROOT)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    asyncio.run(main(args))
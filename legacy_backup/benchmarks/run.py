@@ -0,0 +1,263 @@
+"""
+Benchmark suite for the hot endpoints, driven through main.app in-process (see
+asgi_client.py) against a dataset from datagen.py. Reports p50/p99 latency,
+throughput and peak RSS per scenario as JSON, so runs can be compared.
+
+    python benchmarks/run.py --out before.json                          # fresh 20k-asset dataset
+    python benchmarks/run.py --db /tmp/bench.db --out after.json --baseline before.json
+    python benchmarks/run.py --db /tmp/bench.db --only extinguisher_detail,inspection_create --requests 2000
+
+--db reuses a database made by datagen.py (generated first if the file is
+missing; datagen options apply then). With --baseline, every scenario present
+in both runs is compared and the exit status is 1 if its p99 or throughput got
+worse by more than --tolerance. Only compare runs on the same machine and dataset.
+
+Scenarios run in the order below. peak_rss_mb is the process high-water mark
+after each one, so a scenario's own cost is its rss_growth_mb. PDFs render on
+the process pool; that memory is under children_peak_rss_mb.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from asgi_client import ASGIClient
+import datagen
+
+HEAVY_CONCURRENCY = 2 # Full-table scenarios: a couple of concurrent downloads, not a stampede
+
+
+async def list_page(client, ctx):
+    return await client.get("/extinguishers/", params={"view": "summary", "limit": 100})
+
+
+async def list_all(client, ctx):
+    return await client.get("/extinguishers/")
+
+
+async def extinguisher_detail(client, ctx):
+    return await client.get(f"/extinguishers/{ctx['rng'].choice(ctx['extinguisher_ids'])}")
+
+
+async def inspection_create(client, ctx):
+    extinguisher_id = ctx["rng"].choice(ctx["extinguisher_ids"])
+    return await client.post("/inspections/", json_body={"extinguisher_id": extinguisher_id, "inspection_type": "Monthly"})
+
+
+async def inspection_stats(client, ctx):
+    return await client.get("/inspections/stats", params={"days": 30})
+
+
+async def export_history(client, ctx):
+    return await client.get("/inspections/export")
+
+
+async def export_annex_h(client, ctx):
+    return await client.get("/inspections/export-csv")
+
+
+async def inspection_pdf(client, ctx):
+    return await client.get(f"/inspections/{ctx['rng'].choice(ctx['inspection_ids'])}/pdf")
+
+
+# name -> (request, heavy); heavy ones use --heavy-requests and HEAVY_CONCURRENCY
+SCENARIOS = {
+    "list_page": (list_page, False),
+    "extinguisher_detail": (extinguisher_detail, False),
+    "inspection_stats": (inspection_stats, False),
+    "inspection_create": (inspection_create, False),
+    "inspection_pdf": (inspection_pdf, False),
+    "list_all": (list_all, True),
+    "export_history": (export_history, True),
+    "export_annex_h": (export_annex_h, True),
+}
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    # Nearest rank: p99 of 100 samples is the 99th, not an interpolation
+    return sorted_values[max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)]
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF) -> float:
+    peak = resource.getrusage(who).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024 # bytes on macOS, KiB elsewhere
+
+
+async def run_scenario(client, ctx, request, total: int, concurrency: int, warmup: int) -> dict:
+    for _ in range(warmup):
+        await request(client, ctx)
+
+    latencies, errors, statuses = [], 0, {}
+    remaining = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            start = time.perf_counter()
+            response = await request(client, ctx)
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            if response.status_code >= 400:
+                errors += 1
+
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "errors": errors,
+        "statuses": {str(code): count for code, count in sorted(statuses.items())},
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2),
+        "throughput_rps": round(total / elapsed, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "rss_growth_mb": round(peak_rss_mb() - rss_before, 1),
+    }
+
+
+def dataset_summary(session) -> dict:
+    from sqlmodel import func, select
+    from models import Extinguisher, Inspection, User
+
+    count = lambda model: session.exec(select(func.count()).select_from(model)).one()
+    return {"extinguishers": count(Extinguisher), "inspections": count(Inspection), "users": count(User)}
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except Exception:
+        return ""
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Print both runs side by side. Returns the scenarios that regressed beyond tolerance.
+    """
+    regressions = []
+    print(f"\n{'scenario':<22} {'p50 ms':>17} {'p99 ms':>17} {'req/s':>17}")
+    for name, result in current["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        cells = [
+            f"{before[key]:>7} -> {result[key]:<7}"
+            for key in ("p50_ms", "p99_ms", "throughput_rps")
+        ]
+        slower = result["p99_ms"] > before["p99_ms"] * (1 + tolerance)
+        fewer = result["throughput_rps"] < before["throughput_rps"] * (1 - tolerance)
+        if slower or fewer:
+            regressions.append(name)
+        print(f"{name:<22} {' '.join(cells)}{'  REGRESSION' if slower or fewer else ''}")
+    return regressions
+
+
+async def main(args, names: list):
+    import main as app_module
+    from sqlmodel import Session, select
+    from database import engine
+    from models import Extinguisher, Inspection, User
+    from auth import create_access_token, get_password_hash, token_claims
+
+    client = ASGIClient(app_module.app)
+    await client.start() # Migrations
+    with Session(engine) as session:
+        if session.exec(select(Extinguisher.id).limit(1)).first() is None:
+            print(f"Generating {args.assets} assets x {args.inspections} inspections ...")
+            print(datagen.generate_from_args(engine, args))
+
+        admin = session.exec(select(User).where(User.username == datagen.BENCH_ADMIN)).first()
+        if not admin:
+            admin = User(username=datagen.BENCH_ADMIN, password_hash=get_password_hash(datagen.BENCH_PASSWORD), role="admin")
+            session.add(admin)
+            session.commit()
+            session.refresh(admin)
+        client.headers["authorization"] = f"Bearer {create_access_token(data=token_claims(admin))}"
+
+        rng = random.Random(args.seed)
+        ctx = {
+            "rng": rng,
+            "extinguisher_ids": [str(i) for i in session.exec(
+                select(Extinguisher.id).where(Extinguisher.is_active == True).limit(args.sample)).all()],
+            "inspection_ids": [str(i) for i in session.exec(select(Inspection.id).limit(args.sample)).all()],
+        }
+        dataset = dataset_summary(session)
+
+    results = {
+        "meta": {
+            "started_at": datetime.utcnow().isoformat(timespec="seconds"),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": engine.dialect.name,
+            "dataset": dataset,
+        },
+        "scenarios": {},
+    }
+    for name in names:
+        request, heavy = SCENARIOS[name]
+        total = args.heavy_requests if heavy else args.requests
+        concurrency = min(args.concurrency, HEAVY_CONCURRENCY) if heavy else args.concurrency
+        result = await run_scenario(client, ctx, request, total, concurrency, 1 if heavy else args.warmup)
+        results["scenarios"][name] = result
+        print(f"{name:<22} p50 {result['p50_ms']:>9.2f} ms  p99 {result['p99_ms']:>9.2f} ms  "
+              f"{result['throughput_rps']:>8.1f} req/s  rss {result['peak_rss_mb']:>7.1f} MB  errors {result['errors']}")
+    await client.stop()
+
+    results["peak_rss_mb"] = round(peak_rss_mb(), 1)
+    results["children_peak_rss_mb"] = round(peak_rss_mb(resource.RUSAGE_CHILDREN), 1)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"Regressed beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="SQLite file to use, generated if missing (default: a fresh temporary one)")
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario")
+    parser.add_argument("--heavy-requests", type=int, default=10, help="requests per full-table scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=20, help="unmeasured requests before each scenario")
+    parser.add_argument("--sample", type=int, default=5000, help="ids to pick random targets from")
+    parser.add_argument("--only", help="comma-separated scenario names")
+    parser.add_argument("--out", help="write results JSON here")
+    parser.add_argument("--baseline", help="results JSON of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed slowdown before flagging, 0.15 = 15%%")
+    datagen.add_arguments(parser)
+    args = parser.parse_args()
+
+    names = args.only.split(",") if args.only else list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)} (have {', '.join(SCENARIOS)})")
+    if args.db:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.abspath(args.db)}"
+    elif "DATABASE_URL" not in os.environ:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_run.db')}"
+    asyncio.run(main(args, names))
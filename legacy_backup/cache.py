@@ -0,0 +1,207 @@
+"""
+Small in-process caches.
+
+TTLCache is a thread-safe LRU with a per-entry time-to-live. Every instance
+registers itself so /metrics can report hit/miss/eviction counters.
+Caches are per worker process: a write on one worker invalidates only its own
+copy, and the TTL bounds how stale the other workers can get.
+
+DiskCache is a size-bounded directory of files (rendered PDFs, image
+derivatives) shared by every process on the host. Entries are immutable and
+named by content, so there is nothing to invalidate; least recently used
+files are evicted once the directory outgrows its budget.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+_MISSING = object()
+
+CACHES: Dict[str, "TTLCache"] = {}
+DISK_CACHES: Dict[str, "DiskCache"] = {}
+
+
+class TTLCache:
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        CACHES[name] = self
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """
+        Returns (found, value). A cached None is a hit, so negative lookups can be cached too.
+        """
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return False, None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return False, None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return True, value
+
+    def set(self, key: Hashable, value: Any, ttl: float = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, *keys: Hashable):
+        with self._lock:
+            for key in keys:
+                if self._data.pop(key, _MISSING) is not _MISSING:
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+class DiskCache:
+    """
+    Files on disk, looked up by name. Reads bump the file's mtime; once the
+    directory grows past max_bytes the least recently used files are deleted.
+    Writes are atomic, so readers in other processes never see a partial file.
+    """
+    def __init__(self, name: str, directory: str, max_bytes: int):
+        self.name = name
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        DISK_CACHES[name] = self
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def get(self, name: str) -> Optional[str]:
+        """
+        Path of the cached file, or None.
+        """
+        path = self.path(name)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return path
+
+    def put(self, name: str, content: bytes) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(name)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(content)
+        os.replace(tmp, path)
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += len(content)
+            if self._size > self.max_bytes:
+                self._evict()
+        return path
+
+    def _entries(self):
+        try:
+            with os.scandir(self.directory) as it:
+                return [entry for entry in it if entry.is_file() and not entry.name.endswith(".tmp")]
+        except FileNotFoundError:
+            return []
+
+    def _scan_size(self) -> int:
+        return sum(entry.stat().st_size for entry in self._entries())
+
+    def _evict(self):
+        # Down to 90% of the budget so we don't evict on every put
+        target = int(self.max_bytes * 0.9)
+        entries = sorted(self._entries(), key=lambda entry: entry.stat().st_mtime)
+        size = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if size <= target:
+                break
+            try:
+                size -= entry.stat().st_size
+                os.remove(entry.path)
+                self.evictions += 1
+            except FileNotFoundError:
+                pass
+        self._size = size
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "directory": self.directory,
+            "max_bytes": self.max_bytes,
+            "size_bytes": self._size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+# QR scan lookups (/extinguishers/{id}), keyed by normalized identifier
+scan_cache = TTLCache(
+    "scan",
+    maxsize=int(os.getenv("SCAN_CACHE_SIZE", "4096")),
+    ttl=float(os.getenv("SCAN_CACHE_TTL", "60")),
+)
+
+
+def scan_cache_key(identifier: str) -> str:
+    """
+    Normalize a scanned identifier: UUIDs by value, anything else as a canonical serial.
+    """
+    import uuid
+    from utils import normalize_serial
+    value = identifier.strip()
+    try:
+        return f"id:{uuid.UUID(value)}"
+    except ValueError:
+        return f"sl:{normalize_serial(value)}"
+
+
+def invalidate_scan(extinguisher):
+    """
+    Drop every cached scan entry that can point at this extinguisher. Call after commit.
+    """
+    scan_cache.delete(scan_cache_key(str(extinguisher.id)), scan_cache_key(extinguisher.sl_no))
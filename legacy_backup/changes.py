@@ -0,0 +1,162 @@
+"""
+Changes feed for GET /sync.
+
+Every insert, update or delete of an Extinguisher, Inspection, User or
+CompanySettings row appends a ChangeLog row in the same transaction (mapper
+events in models.py). Its autoincrement seq is the sync token: a client sends
+the last token it saw and gets the rows changed after it, newest version
+only, a page at a time. Soft deletes (is_active=False) come back as the row
+with is_active false; hard deletes as {"entity", "id"} under "deleted".
+
+On SQLite writers are serialized by the database lock, so seq order is
+commit order: a reader that sees 12 can never later see 11 commit, and the
+token moves straight past any gap (a rolled-back write or a compacted entry).
+
+Elsewhere (Postgres) writers run concurrently and a seq is allocated before
+its transaction commits, so a reader can see 12 while 11 is still in flight.
+A gap younger than SYNC_SETTLE_SECONDS holds the token back (those rows are
+sent again next time); older gaps are taken to be rollbacks. A transaction
+that takes longer than SYNC_SETTLE_SECONDS to commit after allocating its seq
+is never delivered to clients that already moved past it, so keep the setting
+well above the longest write transaction.
+
+Superseded entries (same row changed again later) can be pruned with:
+
+    python changes.py compact
+"""
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import delete, func
+from sqlmodel import Session, select
+from models import ChangeLog, CompanySettings, Extinguisher, Inspection, User
+
+SYNC_PAGE_SIZE = 500
+SYNC_MAX_PAGE_SIZE = 2000
+SYNC_SETTLE_SECONDS = int(os.getenv("SYNC_SETTLE_SECONDS", "300"))
+ORDERED_DIALECTS = {"sqlite"} # One writer at a time: seq order is commit order
+COMPACT_MIN_AGE = timedelta(hours=1) # Leave recent history alone for clients mid-way through paging
+
+# Columns left out of the feed: internal bookkeeping, secrets
+EXTINGUISHER_OMIT = {"sl_no_normalized", "recent_inspection_ids"}
+INSPECTION_OMIT = {"idempotency_key"}
+USER_FIELDS = ("id", "username", "role", "is_active", "created_at")
+
+
+def record_changes(session: Session, entity: str, ids: Iterable):
+    """
+    For bulk update()/delete() statements, which the mapper events don't see.
+    """
+    now = datetime.utcnow()
+    session.add_all([ChangeLog(entity=entity, entity_id=str(row_id), changed_at=now) for row_id in ids])
+
+
+def _uuids(values: List[str]) -> List[uuid.UUID]:
+    return [uuid.UUID(value) for value in values]
+
+
+def _load(session: Session, entity: str, ids: List[str], is_admin: bool) -> Dict[str, dict]:
+    if entity == "extinguisher":
+        rows = session.exec(select(Extinguisher).where(Extinguisher.id.in_(_uuids(ids)))).all()
+        return {str(row.id): row.model_dump(exclude=EXTINGUISHER_OMIT) for row in rows}
+    if entity == "inspection":
+        rows = session.exec(select(Inspection).where(Inspection.id.in_(_uuids(ids)))).all()
+        return {str(row.id): row.model_dump(exclude=INSPECTION_OMIT) for row in rows}
+    if entity == "user":
+        if not is_admin:
+            return {}
+        rows = session.exec(select(User).where(User.id.in_(_uuids(ids)))).all()
+        return {str(row.id): {field: getattr(row, field) for field in USER_FIELDS} for row in rows}
+    if entity == "settings":
+        rows = session.exec(select(CompanySettings).where(CompanySettings.id.in_([int(i) for i in ids]))).all()
+        return {str(row.id): row.model_dump() for row in rows}
+    return {}
+
+
+def next_token(entries: List[ChangeLog], since: int, now: datetime, ordered: bool = True) -> int:
+    """
+    The highest seq a client can safely resume after. With commit-ordered seqs that is
+    the last one read; otherwise it stops before a gap younger than SYNC_SETTLE_SECONDS.
+    """
+    if ordered:
+        return entries[-1].seq if entries else since
+    settled = now - timedelta(seconds=SYNC_SETTLE_SECONDS)
+    token = since
+    for entry in entries:
+        if entry.seq != token + 1 and entry.changed_at > settled:
+            break
+        token = entry.seq
+    return token
+
+
+def changes_since(session: Session, since: int, limit: int = SYNC_PAGE_SIZE, is_admin: bool = False) -> dict:
+    entries = session.exec(
+        select(ChangeLog).where(ChangeLog.seq > since).order_by(ChangeLog.seq).limit(limit + 1)
+    ).all()
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    # Latest entry per row; the row itself is read as it is now
+    latest: Dict[tuple, ChangeLog] = {}
+    for entry in entries:
+        latest[(entry.entity, entry.entity_id)] = entry
+    wanted: Dict[str, List[str]] = {}
+    for entity, entity_id in latest:
+        wanted.setdefault(entity, []).append(entity_id)
+
+    changed = {"extinguishers": [], "inspections": [], "users": [], "settings": None}
+    plural = {"extinguisher": "extinguishers", "inspection": "inspections", "user": "users"}
+    deleted = []
+    for entity, ids in wanted.items():
+        rows = _load(session, entity, ids, is_admin)
+        for entity_id in ids:
+            row = rows.get(entity_id)
+            if row is None:
+                if entity != "user" or is_admin:
+                    deleted.append({"entity": entity, "id": entity_id})
+            elif entity == "settings":
+                changed["settings"] = row
+            else:
+                changed[plural[entity]].append(row)
+
+    ordered = session.get_bind().dialect.name in ORDERED_DIALECTS
+    token = next_token(entries, since, datetime.utcnow(), ordered)
+    return {
+        **changed,
+        "deleted": deleted,
+        "since": since,
+        "next": token,
+        "has_more": has_more,
+    }
+
+
+def latest_token(session: Session) -> int:
+    return session.exec(select(func.max(ChangeLog.seq))).one() or 0
+
+
+def compact(session: Session, older_than: Optional[timedelta] = None) -> int:
+    """
+    Delete entries superseded by a later one for the same row. Returns how many.
+    """
+    cutoff = datetime.utcnow() - (older_than or max(COMPACT_MIN_AGE, timedelta(seconds=SYNC_SETTLE_SECONDS)))
+    newest = select(func.max(ChangeLog.seq)).group_by(ChangeLog.entity, ChangeLog.entity_id)
+    result = session.exec(
+        delete(ChangeLog).where(ChangeLog.seq.not_in(newest), ChangeLog.changed_at < cutoff)
+    )
+    return result.rowcount
+
+
+if __name__ == "__main__":
+    import sys
+    from database import engine, init_db
+
+    if len(sys.argv) < 2 or sys.argv[1] != "compact":
+        print("Usage: python changes.py compact")
+        sys.exit(1)
+
+    init_db()
+    with Session(engine) as session:
+        removed = compact(session)
+        session.commit()
+    print(f"Removed {removed} superseded change log entries.")
@@ -0,0 +1,372 @@
+"""
+Compliance due dates (IS 2190) and the overdue status job.
+
+Every extinguisher carries one due date per obligation:
+
+- next_service_due: inspection, at most INSPECTION_INTERVAL_MONTHS after the last one
+- next_maintenance_due: maintenance, yearly; only an "Annual" inspection counts
+- next_hydro_pressure_test_due: hydraulic pressure test, per extinguisher family
+- next_refill_due: refilling, per family (or as entered by the inspector)
+- end_of_life: replacement, from year_of_manufacture
+
+compliance_due is the earliest of them (kept in step by a mapper event in
+models.py) and is indexed with is_active and location, so "due in the next N
+days" and "overdue" are range scans rather than a full list filtered in the
+browser (see routers/compliance.py).
+
+The intervals are in RULES, by family; rule_for() maps the free-text type
+("CO2", "ABC", "Water", ...) to a family. They follow IS 2190:2010: check
+them against the edition your auditor uses, then run
+
+    python compliance.py recompute     # re-derive every due date from history
+    python compliance.py evaluate      # one pass of the status job
+
+A background job (every COMPLIANCE_JOB_MINUTES, 0 to disable) marks
+Operational assets past compliance_due as "Overdue", and puts them back to
+"Operational" once an inspection moves the date, in two bulk UPDATEs. Every
+worker starts it, but only the one holding the job lock (JobLeader) runs it;
+another takes over when that worker exits.
+"""
+import asyncio
+import calendar
+import os
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional
+from sqlalchemy import func, or_, text, update
+from sqlmodel import Session, select
+from models import Extinguisher, Inspection
+from changes import record_changes
+from cache import invalidate_scan
+
+INSPECTION_INTERVAL_MONTHS = 3
+MAINTENANCE_INTERVAL_MONTHS = 12
+MAINTENANCE_TYPES = {"Annual"}
+OVERDUE_STATUS = "Overdue"
+COMPLIANCE_JOB_MINUTES = float(os.getenv("COMPLIANCE_JOB_MINUTES", "60"))
+COMPLIANCE_JOB_LOCK_KEY = 2190_0003
+RECOMPUTE_CHUNK = 500
+
+
+class Rule(NamedTuple):
+    hydro_test_years: int
+    refill_months: Optional[int] # None: refilled on use or weight loss, not on a schedule
+    life_years: int
+
+
+RULES: Dict[str, Rule] = {
+    "water": Rule(hydro_test_years=3, refill_months=12, life_years=10),
+    "foam": Rule(hydro_test_years=3, refill_months=12, life_years=10),
+    "dcp": Rule(hydro_test_years=3, refill_months=36, life_years=10), # ABC / BC powder
+    "co2": Rule(hydro_test_years=5, refill_months=None, life_years=15),
+    "clean_agent": Rule(hydro_test_years=5, refill_months=None, life_years=10),
+}
+
+# Substrings of Extinguisher.type, checked in order
+FAMILY_KEYWORDS = [
+    ("co2", ("co2", "carbon")),
+    ("clean_agent", ("clean", "hfc", "fk-5", "halo")),
+    ("foam", ("foam", "afff")),
+    ("water", ("water",)),
+    ("dcp", ("dcp", "abc", "powder", "dry", "bc")),
+]
+DEFAULT_FAMILY = "dcp"
+
+
+def family(extinguisher_type: Optional[str]) -> str:
+    value = (extinguisher_type or "").lower()
+    for name, keywords in FAMILY_KEYWORDS:
+        if any(keyword in value for keyword in keywords):
+            return name
+    return DEFAULT_FAMILY
+
+
+def rule_for(extinguisher_type: Optional[str]) -> Rule:
+    return RULES[family(extinguisher_type)]
+
+
+def add_months(value: datetime, months: int) -> datetime:
+    index = value.month - 1 + months
+    year, month = value.year + index // 12, index % 12 + 1
+    return value.replace(year=year, month=month, day=min(value.day, calendar.monthrange(year, month)[1]))
+
+
+def _year_start(year: int, plus_years: int) -> datetime:
+    return datetime(year + plus_years, 1, 1)
+
+
+# --- Due dates ---------------------------------------------------------------
+
+def apply_asset(extinguisher: Extinguisher):
+    """
+    Due dates that follow from the asset alone: end of life, and first hydro test /
+    maintenance for one that has none on record. Caller adds/commits.
+    """
+    rule = rule_for(extinguisher.type)
+    if extinguisher.year_of_manufacture:
+        extinguisher.end_of_life = _year_start(extinguisher.year_of_manufacture, rule.life_years)
+        if extinguisher.next_hydro_pressure_test_due is None and extinguisher.hydro_pressure_tested_on is None:
+            extinguisher.next_hydro_pressure_test_due = _year_start(extinguisher.year_of_manufacture, rule.hydro_test_years)
+    if extinguisher.next_maintenance_due is None:
+        extinguisher.next_maintenance_due = add_months(extinguisher.created_at or datetime.utcnow(), MAINTENANCE_INTERVAL_MONTHS)
+
+
+def apply_inspection(extinguisher: Extinguisher, inspection: Inspection):
+    """
+    Move the due dates an inspection satisfies. Dates the inspector entered win
+    over computed ones. Caller adds/commits.
+    """
+    rule = rule_for(extinguisher.type)
+    done_on = inspection.inspection_date or datetime.utcnow()
+
+    extinguisher.next_service_due = add_months(done_on, INSPECTION_INTERVAL_MONTHS)
+    if inspection.inspection_type in MAINTENANCE_TYPES:
+        extinguisher.next_maintenance_due = add_months(done_on, MAINTENANCE_INTERVAL_MONTHS)
+
+    if inspection.hydro_pressure_tested_on:
+        extinguisher.hydro_pressure_tested_on = inspection.hydro_pressure_tested_on
+    if inspection.next_hydro_pressure_test_due:
+        extinguisher.next_hydro_pressure_test_due = inspection.next_hydro_pressure_test_due
+    elif inspection.hydro_pressure_tested_on:
+        extinguisher.next_hydro_pressure_test_due = add_months(inspection.hydro_pressure_tested_on, 12 * rule.hydro_test_years)
+
+    if inspection.due_for_refilling:
+        extinguisher.next_refill_due = inspection.due_for_refilling
+    elif inspection.refilled_on and rule.refill_months:
+        extinguisher.next_refill_due = add_months(inspection.refilled_on, rule.refill_months)
+
+    apply_asset(extinguisher)
+
+
+def recompute(session: Session) -> int:
+    """
+    Re-derive every active asset's due dates from its stored state and inspection
+    history, e.g. after editing RULES. Caller commits. Returns how many were updated.
+    """
+    last_maintenance = dict(session.exec(
+        select(Inspection.extinguisher_id, func.max(Inspection.inspection_date))
+        .where(Inspection.inspection_type.in_(MAINTENANCE_TYPES))
+        .group_by(Inspection.extinguisher_id)
+    ).all())
+    last_refill = dict(session.exec(
+        select(Inspection.extinguisher_id, func.max(Inspection.refilled_on))
+        .where(Inspection.refilled_on.is_not(None))
+        .group_by(Inspection.extinguisher_id)
+    ).all())
+
+    updated, offset = 0, 0
+    while True:
+        chunk = session.exec(
+            select(Extinguisher).where(Extinguisher.is_active == True)
+            .order_by(Extinguisher.id).offset(offset).limit(RECOMPUTE_CHUNK)
+        ).all()
+        if not chunk:
+            return updated
+        offset += len(chunk)
+        for extinguisher in chunk:
+            rule = rule_for(extinguisher.type)
+            if extinguisher.last_inspection_date:
+                extinguisher.next_service_due = add_months(extinguisher.last_inspection_date, INSPECTION_INTERVAL_MONTHS)
+            maintained = last_maintenance.get(extinguisher.id)
+            extinguisher.next_maintenance_due = add_months(maintained, MAINTENANCE_INTERVAL_MONTHS) if maintained else None
+            if extinguisher.hydro_pressure_tested_on:
+                extinguisher.next_hydro_pressure_test_due = (
+                    extinguisher.next_hydro_pressure_test_due
+                    or add_months(extinguisher.hydro_pressure_tested_on, 12 * rule.hydro_test_years)
+                )
+            refilled = last_refill.get(extinguisher.id)
+            if extinguisher.last_due_for_refilling:
+                extinguisher.next_refill_due = extinguisher.last_due_for_refilling
+            elif refilled and rule.refill_months:
+                extinguisher.next_refill_due = add_months(refilled, rule.refill_months)
+            apply_asset(extinguisher)
+            if session.is_modified(extinguisher):
+                session.add(extinguisher)
+                updated += 1
+        session.flush()
+
+
+OBLIGATIONS = [
+    ("inspection", "next_service_due"),
+    ("maintenance", "next_maintenance_due"),
+    ("hydro_test", "next_hydro_pressure_test_due"),
+    ("refill", "next_refill_due"),
+    ("replacement", "end_of_life"),
+]
+
+
+def obligations(extinguisher: Extinguisher, before: datetime) -> List[dict]:
+    """
+    The obligations due before `before`, earliest first.
+    """
+    due = [
+        {"kind": kind, "due": getattr(extinguisher, column)}
+        for kind, column in OBLIGATIONS
+        if getattr(extinguisher, column) is not None and getattr(extinguisher, column) < before
+    ]
+    return sorted(due, key=lambda item: item["due"])
+
+
+# --- Status job --------------------------------------------------------------
+
+def evaluate_statuses(session: Session, now: Optional[datetime] = None) -> dict:
+    """
+    Operational -> Overdue past compliance_due, Overdue -> Operational once it has
+    moved. Two bulk UPDATEs; Pending / Non-Operational are left to people. Commits,
+    then drops the changed assets from this worker's scan cache.
+    """
+    now = now or datetime.utcnow()
+    transitions = {
+        "overdue": (
+            (Extinguisher.status == "Operational", Extinguisher.compliance_due < now),
+            OVERDUE_STATUS,
+        ),
+        "cleared": (
+            (Extinguisher.status == OVERDUE_STATUS,
+             or_(Extinguisher.compliance_due.is_(None), Extinguisher.compliance_due >= now)),
+            "Operational",
+        ),
+    }
+    counts, changed = {}, []
+    for name, (conditions, new_status) in transitions.items():
+        rows = session.exec(
+            select(Extinguisher.id, Extinguisher.sl_no).where(Extinguisher.is_active == True, *conditions)
+        ).all()
+        ids = [row.id for row in rows]
+        if ids:
+            session.exec(update(Extinguisher).where(Extinguisher.id.in_(ids)).values(status=new_status))
+            record_changes(session, "extinguisher", ids)
+        counts[name] = len(ids)
+        changed.extend(rows)
+    session.commit()
+    for row in changed:
+        invalidate_scan(row) # Has .id and .sl_no, all invalidate_scan reads
+    return counts
+
+
+class JobLeader:
+    """
+    Non-blocking, held-until-exit lock that picks the one worker running the status job.
+    Postgres: a session-level advisory lock on a connection kept open for it (the same
+    mechanism as the migration lock). SQLite: flock on a file next to the database.
+    Elsewhere, or where flock doesn't exist (Windows), every worker leads.
+    """
+    def __init__(self, engine):
+        self.engine = engine
+        self._connection = None
+        self._handle = None
+
+    def acquire(self) -> bool:
+        dialect = self.engine.dialect.name
+        if dialect == "postgresql":
+            return self._acquire_advisory()
+        if dialect == "sqlite":
+            return self._acquire_file()
+        return True
+
+    def _acquire_advisory(self) -> bool:
+        if self._connection is not None:
+            try:
+                self._connection.execute(text("SELECT 1")) # Lock goes with the connection if it dropped
+                self._connection.commit()
+                return True
+            except Exception:
+                self._close_connection()
+        connection = self.engine.connect()
+        try:
+            held = connection.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": COMPLIANCE_JOB_LOCK_KEY}).scalar()
+            connection.commit()
+        except Exception:
+            connection.close()
+            raise
+        if not held:
+            connection.close()
+            return False
+        self._connection = connection
+        return True
+
+    def _acquire_file(self) -> bool:
+        if self._handle is not None:
+            return True
+        path = self.engine.url.database
+        if not path or path == ":memory:":
+            return True
+        try:
+            import fcntl
+        except ImportError:
+            return True
+        handle = open(f"{path}.jobs.lock", "a")
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        self._handle = handle
+        return True
+
+    def _close_connection(self):
+        try:
+            self._connection.close()
+        except Exception:
+            pass
+        self._connection = None
+
+    def release(self):
+        if self._connection is not None:
+            try:
+                self._connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": COMPLIANCE_JOB_LOCK_KEY})
+                self._connection.commit()
+            except Exception:
+                pass
+            self._close_connection()
+        if self._handle is not None:
+            self._handle.close() # Releases the flock
+            self._handle = None
+
+
+def _evaluate() -> dict:
+    from database import engine
+    with Session(engine) as session:
+        return evaluate_statuses(session)
+
+
+async def run_status_job(interval_minutes: float = COMPLIANCE_JOB_MINUTES):
+    """
+    Background loop started by main.py in every worker; only the JobLeader runs the UPDATEs.
+    """
+    from starlette.concurrency import run_in_threadpool
+    from database import engine
+    import events
+
+    leader = JobLeader(engine)
+    try:
+        while True:
+            try:
+                if await run_in_threadpool(leader.acquire):
+                    counts = await run_in_threadpool(_evaluate)
+                    if counts["overdue"] or counts["cleared"]:
+                        print(f"Compliance: {counts['overdue']} now overdue, {counts['cleared']} cleared")
+                        events.publish("extinguishers.status_evaluated", **counts)
+            except Exception as e:
+                print(f"Compliance status job failed: {e}")
+            await asyncio.sleep(interval_minutes * 60)
+    finally:
+        leader.release()
+
+
+if __name__ == "__main__":
+    import sys
+    from database import engine, init_db
+
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command not in ("recompute", "evaluate"):
+        print("Usage: python compliance.py recompute|evaluate")
+        sys.exit(1)
+
+    init_db()
+    with Session(engine) as session:
+        if command == "recompute":
+            updated = recompute(session)
+            session.commit()
+            print(f"Recomputed due dates for {updated} extinguishers.")
+        counts = evaluate_statuses(session)
+    print(f"Status: {counts['overdue']} now overdue, {counts['cleared']} cleared.")
@@ -1,5 +1,9 @@
 from sqlmodel import SQLModel, create_engine, Session
-from typing import Generator
+from sqlmodel.ext.asyncio.session import AsyncSession
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import AsyncGenerator, Generator
+import anyio
 import os
 
 # Get DB URL from env or fallback to local SQLite
@@ -7,16 +11,166 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     DATABASE_URL = f"sqlite:///{os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fire_safety.db')}"
 
+# Many hosts hand out postgres://, which SQLAlchemy no longer accepts
+if DATABASE_URL.startswith("postgres://"):
+    DATABASE_URL = "postgresql://" + DATABASE_URL[len("postgres://"):]
+
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+def _env_flag(name: str, default: str) -> str:
+    return os.getenv(name, default).strip().lower()
+
+# Connection pool sizing (server databases only; SQLite keeps SQLAlchemy's defaults).
+# Size the pool for the sync threadpool (40 threads by default) plus the async routes.
+POOL_SETTINGS = {
+    "pool_size": int(os.getenv("DB_POOL_SIZE", "10")),
+    "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "30")),
+    "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+    "pool_pre_ping": _env_flag("DB_POOL_PRE_PING", "true") in ("1", "true", "yes"),
+    "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+}
+
 # Handle args based on DB type
 connect_args = {}
-if "sqlite" in DATABASE_URL:
+engine_kwargs = {}
+if IS_SQLITE:
     connect_args = {"check_same_thread": False}
+else:
+    engine_kwargs = dict(POOL_SETTINGS)
+
+engine = create_engine(DATABASE_URL, connect_args=connect_args, **engine_kwargs)
+
+def _async_url(url: str) -> str:
+    if url.startswith("sqlite:"):
+        return "sqlite+aiosqlite:" + url[len("sqlite:"):]
+    rest = url.split("://", 1)[1]
+    # asyncpg spells libpq's sslmode as ssl
+    return "postgresql+asyncpg://" + rest.replace("sslmode=", "ssl=")
+
+def _build_async_engine():
+    """
+    DB_ASYNC=auto (default): async engine for Postgres, sync fallback for SQLite dev.
+    DB_ASYNC=1 / 0 forces it on / off. Falls back to sync if the driver is not installed.
+    """
+    mode = _env_flag("DB_ASYNC", "auto")
+    wanted = mode in ("1", "true", "yes") or (mode == "auto" and not IS_SQLITE)
+    if not wanted:
+        return None
+    try:
+        from sqlalchemy.ext.asyncio import create_async_engine
+        return create_async_engine(_async_url(DATABASE_URL), **({} if IS_SQLITE else POOL_SETTINGS))
+    except ImportError as e:
+        print(f"Async database driver unavailable ({e}), using sync fallback")
+        return None
 
-engine = create_engine(DATABASE_URL, connect_args=connect_args)
+async_engine = _build_async_engine()
 
 def get_session() -> Generator[Session, None, None]:
     with Session(engine) as session:
         yield session
 
+# Sync fallback for async routes. Fallback sessions keep their connection across
+# awaits, so they get their own worker threads (never queued behind sync routes
+# waiting on the pool) and are capped at one thread each; otherwise a burst can
+# park every thread on pool checkout while the connections wait for a thread.
+FALLBACK_SESSIONS = int(os.getenv("DB_FALLBACK_SESSIONS", "8"))
+_fallback_limiter = anyio.CapacityLimiter(FALLBACK_SESSIONS)
+_fallback_slots = anyio.Semaphore(FALLBACK_SESSIONS)
+
+class SyncSessionAdapter:
+    """
+    Sync fallback with the AsyncSession calls the async routes use.
+    Every call that can touch the database runs on a worker thread, so the
+    event loop never blocks on I/O even without an async driver.
+    """
+    def __init__(self, session: Session):
+        self.sync_session = session
+
+    async def _call(self, fn, *args, **kwargs):
+        return await anyio.to_thread.run_sync(partial(fn, *args, **kwargs), limiter=_fallback_limiter)
+
+    def add(self, instance):
+        self.sync_session.add(instance)
+
+    def add_all(self, instances):
+        self.sync_session.add_all(instances)
+
+    async def exec(self, statement, **kwargs):
+        # Buffer rows in the worker thread; the caller reads them on the event loop
+        options = {**kwargs.pop("execution_options", {}), "prebuffer_rows": True}
+        return await self._call(self.sync_session.exec, statement, execution_options=options, **kwargs)
+
+    async def get(self, *args, **kwargs):
+        return await self._call(self.sync_session.get, *args, **kwargs)
+
+    async def commit(self):
+        await self._call(self.sync_session.commit)
+
+    async def rollback(self):
+        await self._call(self.sync_session.rollback)
+
+    async def refresh(self, instance, *args, **kwargs):
+        await self._call(self.sync_session.refresh, instance, *args, **kwargs)
+
+    async def flush(self):
+        await self._call(self.sync_session.flush)
+
+    async def delete(self, instance):
+        await self._call(self.sync_session.delete, instance)
+
+    async def run_sync(self, fn, *args, **kwargs):
+        """
+        Same contract as AsyncSession.run_sync: fn(sync_session, *args).
+        """
+        return await self._call(fn, self.sync_session, *args, **kwargs)
+
+    async def close(self):
+        await self._call(self.sync_session.close)
+
+@asynccontextmanager
+async def async_session() -> AsyncGenerator[AsyncSession, None]:
+    """
+    A real AsyncSession when an async engine is configured, otherwise the sync
+    fallback. Objects stay usable after commit in both cases (no lazy reloads
+    on the event loop).
+    """
+    if async_engine is not None:
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            yield session
+        return
+
+    async with _fallback_slots:
+        session = SyncSessionAdapter(Session(engine, expire_on_commit=False))
+        try:
+            yield session
+        finally:
+            await session.close()
+
+async def run_db(fn, *args, **kwargs):
+    """
+    Run fn(sync_session, *args) in a short-lived session of its own and return the result,
+    without holding a connection across awaits. Meant for quick lookups made by
+    dependencies (e.g. get_current_user) that must not pin a connection for the whole request.
+    """
+    if async_engine is not None:
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            return await session.run_sync(fn, *args, **kwargs)
+
+    def call():
+        with Session(engine, expire_on_commit=False) as session:
+            return fn(session, *args, **kwargs)
+    return await anyio.to_thread.run_sync(call)
+
+async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Session dependency for async routes, see async_session.
+    """
+    async with async_session() as session:
+        yield session
+
 def init_db():
-    SQLModel.metadata.create_all(engine)
+    """
+    Create or upgrade the schema (see migrations.py). Cheap when already current.
+    """
+    from migrations import migrate
+    migrate(engine)
@@ -0,0 +1,249 @@
+"""
+Dashboard events: small JSON deltas pushed to /ws/dashboard.
+
+Routes call publish() after their commit:
+
+    events.publish("inspection.created", id=..., extinguisher_id=...)
+
+Each event is sent on to the backend, which delivers it to every worker's
+broadcaster, which fans it out to that worker's connected clients:
+
+- memory (default): in-process only; fine for a single worker
+- redis: Redis pub/sub on EVENTS_CHANNEL, so every worker sees every event
+  (EVENTS_BACKEND=redis, REDIS_URL). If the connection drops, the listener
+  resubscribes with backoff (up to EVENTS_RECONNECT_MAX_SECONDS apart);
+  events published while it was away are lost
+
+Every client has its own queue of at most EVENTS_QUEUE_SIZE events. A client
+that can't keep up loses its oldest events, never blocks the others, and is
+sent {"type": "events.dropped", "count": n} first so it knows to refetch.
+
+publish() is safe to call from sync routes (threadpool) and async ones, and
+does nothing before the broadcaster has started (scripts, migrations).
+"""
+import asyncio
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Callable, Optional, Set
+
+EVENTS_BACKEND = os.getenv("EVENTS_BACKEND", "memory").strip().lower()
+EVENTS_CHANNEL = os.getenv("EVENTS_CHANNEL", "dashboard")
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "100"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+EVENTS_RECONNECT_MAX_SECONDS = float(os.getenv("EVENTS_RECONNECT_MAX_SECONDS", "30"))
+
+
+def encode(event_type: str, **fields) -> str:
+    event = {"type": event_type, "at": datetime.utcnow().isoformat(timespec="seconds")}
+    event.update(fields)
+    return json.dumps(event, separators=(",", ":"), default=str) # UUIDs and datetimes as strings
+
+
+# --- Backends ----------------------------------------------------------------
+
+class MemoryHub:
+    """
+    Stand-in for a pub/sub server: every MemoryBackend on the same hub sees every message.
+    """
+    def __init__(self):
+        self.listeners: Set[Callable[[str], None]] = set()
+
+
+class MemoryBackend:
+    def __init__(self, hub: Optional[MemoryHub] = None):
+        self.hub = hub or MemoryHub()
+        self._deliver = None
+
+    async def start(self, deliver: Callable[[str], None]):
+        self._deliver = deliver
+        self.hub.listeners.add(deliver)
+
+    async def publish(self, message: str):
+        for deliver in list(self.hub.listeners):
+            deliver(message)
+
+    async def stop(self):
+        self.hub.listeners.discard(self._deliver)
+
+
+class RedisBackend:
+    """
+    Redis pub/sub. Works with anything speaking the protocol (e.g. a local stand-in server).
+    """
+    def __init__(self, url: str = REDIS_URL, channel: str = EVENTS_CHANNEL):
+        self.url = url
+        self.channel = channel
+        self._client = None
+        self._listener = None
+
+    async def start(self, deliver: Callable[[str], None]):
+        import redis.asyncio as redis
+
+        self._client = redis.from_url(self.url, decode_responses=True)
+        pubsub = await self._subscribe() # Fails here if Redis is down, so the broadcaster falls back
+        self._listener = asyncio.create_task(self._listen(pubsub, deliver))
+
+    async def _subscribe(self):
+        pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(self.channel)
+        except BaseException:
+            await pubsub.aclose()
+            raise
+        return pubsub
+
+    async def _listen(self, pubsub, deliver: Callable[[str], None]):
+        """
+        Deliver messages until cancelled (stop()), resubscribing whenever the connection drops.
+        """
+        delay = 0.0
+        while True:
+            try:
+                if pubsub is None:
+                    pubsub = await self._subscribe()
+                    print(f"Event listener resubscribed to {self.channel}")
+                delay = 0.0
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        deliver(message["data"])
+                raise ConnectionError("subscription ended")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                delay = min(max(delay * 2, 0.5), EVENTS_RECONNECT_MAX_SECONDS)
+                print(f"Event listener lost {self.channel}, reconnecting in {delay:.1f}s: {e}")
+            finally:
+                if pubsub is not None:
+                    try:
+                        await pubsub.aclose()
+                    except Exception:
+                        pass
+                    pubsub = None
+            await asyncio.sleep(delay)
+
+    async def publish(self, message: str):
+        await self._client.publish(self.channel, message)
+
+    async def stop(self):
+        if self._listener:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except (asyncio.CancelledError, Exception):
+                pass
+        if self._client:
+            await self._client.aclose()
+
+
+def make_backend(name: str = EVENTS_BACKEND):
+    if name == "memory":
+        return MemoryBackend()
+    if name == "redis":
+        return RedisBackend()
+    raise ValueError(f"Unknown EVENTS_BACKEND: {name}")
+
+
+# --- Fan-out -----------------------------------------------------------------
+
+class Subscriber:
+    """
+    One client's bounded queue. Only touched from the event loop.
+    """
+    def __init__(self, maxsize: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def offer(self, message: str) -> bool:
+        """
+        Queue message, dropping the oldest one if full. Returns False if something was dropped.
+        """
+        dropped = False
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+            dropped = True
+        self.queue.put_nowait(message)
+        return not dropped
+
+    async def next(self) -> str:
+        if self.dropped:
+            count, self.dropped = self.dropped, 0
+            return encode("events.dropped", count=count)
+        return await self.queue.get()
+
+
+class Broadcaster:
+    def __init__(self, backend=None, queue_size: int = EVENTS_QUEUE_SIZE):
+        self.backend = backend or make_backend()
+        self.queue_size = queue_size
+        self.subscribers: Set[Subscriber] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.publish_errors = 0
+
+    async def start(self):
+        try:
+            await self.backend.start(self._fan_out)
+        except Exception as e:
+            # Live updates limited to this worker beat no API at all
+            print(f"Event backend {type(self.backend).__name__} unavailable, using memory: {e}")
+            self.backend = MemoryBackend()
+            await self.backend.start(self._fan_out)
+        self._loop = asyncio.get_running_loop()
+
+    async def stop(self):
+        self._loop = None
+        await self.backend.stop()
+
+    def subscribe(self) -> Subscriber:
+        subscriber = Subscriber(self.queue_size)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+
+    def _fan_out(self, message: str):
+        for subscriber in list(self.subscribers):
+            self.delivered += 1
+            if not subscriber.offer(message):
+                self.dropped += 1
+
+    async def _publish(self, message: str):
+        try:
+            await self.backend.publish(message)
+        except Exception as e:
+            self.publish_errors += 1
+            print(f"Event publish failed: {e}")
+
+    def publish(self, message: str):
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        with self._lock:
+            self.published += 1
+        # From a threadpool route or the loop itself: either way, hand over to the loop
+        loop.call_soon_threadsafe(lambda: asyncio.ensure_future(self._publish(message)))
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.backend).__name__,
+            "clients": len(self.subscribers),
+            "queue_size": self.queue_size,
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "publish_errors": self.publish_errors,
+        }
+
+
+broadcaster = Broadcaster()
+
+
+def publish(event_type: str, **fields):
+    broadcaster.publish(encode(event_type, **fields))
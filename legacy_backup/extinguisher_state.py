@@ -0,0 +1,140 @@
+"""
+Denormalized "current state" columns on Extinguisher.
+
+create_inspection keeps last_inspection_id, last_inspector_id/name,
+last_due_for_refilling and a short ring of recent inspection ids up to date,
+so the QR scan endpoint needs one primary-key read plus one bounded query.
+
+For databases that predate these columns, or to audit them:
+
+    python extinguisher_state.py backfill [--all]
+    python extinguisher_state.py check
+"""
+import uuid
+from typing import List, Optional
+from sqlmodel import Session, select
+from models import Extinguisher, Inspection, User
+
+RECENT_INSPECTIONS = 10
+
+
+def recent_ids(extinguisher: Extinguisher) -> List[uuid.UUID]:
+    if not extinguisher.recent_inspection_ids:
+        return []
+    return [uuid.UUID(value) for value in extinguisher.recent_inspection_ids.split(",") if value]
+
+
+def apply_inspection(extinguisher: Extinguisher, inspection: Inspection, inspector_name: Optional[str]):
+    """
+    Record a new inspection as the asset's latest. Caller adds/commits.
+    """
+    extinguisher.last_inspection_id = inspection.id
+    extinguisher.last_inspection_date = inspection.inspection_date
+    extinguisher.last_inspector_id = inspection.inspector_id
+    extinguisher.last_inspector_name = inspector_name
+    extinguisher.last_due_for_refilling = inspection.due_for_refilling
+
+    ring = [inspection.id] + [i for i in recent_ids(extinguisher) if i != inspection.id]
+    extinguisher.recent_inspection_ids = ",".join(str(i) for i in ring[:RECENT_INSPECTIONS])
+
+
+def _expected_state(session: Session, extinguisher: Extinguisher, usernames: dict) -> dict:
+    """
+    What the current-state columns should hold, recomputed from inspection history.
+    """
+    latest = session.exec(
+        select(Inspection)
+        .where(Inspection.extinguisher_id == extinguisher.id)
+        .order_by(Inspection.inspection_date.desc())
+        .limit(RECENT_INSPECTIONS)
+    ).all()
+
+    if not latest:
+        return {
+            "last_inspection_id": None,
+            "last_inspector_id": None,
+            "last_inspector_name": None,
+            "last_due_for_refilling": None,
+            "recent_inspection_ids": None,
+        }
+
+    newest = latest[0]
+    return {
+        "last_inspection_id": newest.id,
+        "last_inspection_date": newest.inspection_date,
+        "last_inspector_id": newest.inspector_id,
+        "last_inspector_name": usernames.get(newest.inspector_id),
+        "last_due_for_refilling": newest.due_for_refilling,
+        "recent_inspection_ids": ",".join(str(i.id) for i in latest),
+    }
+
+
+def _usernames(session: Session) -> dict:
+    return {user_id: username for user_id, username in session.exec(select(User.id, User.username)).all()}
+
+
+def backfill(session: Session, only_missing: bool = True) -> int:
+    """
+    Recompute current state from history. With only_missing, touch just the assets that
+    have inspections but no last_inspection_id yet. Returns the number of assets updated.
+    """
+    statement = select(Extinguisher)
+    if only_missing:
+        has_history = select(Inspection.id).where(Inspection.extinguisher_id == Extinguisher.id).exists()
+        statement = statement.where(Extinguisher.last_inspection_id == None, has_history)
+
+    usernames = _usernames(session)
+    updated = 0
+    for extinguisher in session.exec(statement).all():
+        for name, value in _expected_state(session, extinguisher, usernames).items():
+            setattr(extinguisher, name, value)
+        session.add(extinguisher)
+        updated += 1
+    return updated
+
+
+def find_drift(session: Session) -> List[dict]:
+    """
+    Compare stored current state with inspection history. Returns one entry per mismatched column.
+    """
+    usernames = _usernames(session)
+    drift = []
+    for extinguisher in session.exec(select(Extinguisher)).all():
+        for name, expected in _expected_state(session, extinguisher, usernames).items():
+            if name == "last_inspection_date":
+                # Predates the current-state columns and was stamped at write time, not from the inspection
+                continue
+            actual = getattr(extinguisher, name)
+            if actual != expected:
+                drift.append({
+                    "extinguisher_id": str(extinguisher.id),
+                    "sl_no": extinguisher.sl_no,
+                    "column": name,
+                    "stored": actual,
+                    "expected": expected,
+                })
+    return drift
+
+
+if __name__ == "__main__":
+    import sys
+    from database import engine, init_db
+
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command not in ("backfill", "check"):
+        print("Usage: python extinguisher_state.py backfill [--all] | check")
+        sys.exit(1)
+
+    init_db()
+    with Session(engine) as session:
+        if command == "backfill":
+            count = backfill(session, only_missing="--all" not in sys.argv)
+            session.commit()
+            print(f"Backfilled current state for {count} extinguishers.")
+        else:
+            drift = find_drift(session)
+            for item in drift:
+                print(f"{item['sl_no']} ({item['extinguisher_id']}): {item['column']} "
+                      f"stored={item['stored']!r} expected={item['expected']!r}")
+            print(f"{len(drift)} drifted columns.")
+            sys.exit(1 if drift else 0)
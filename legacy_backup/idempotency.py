@@ -0,0 +1,79 @@
+"""
+Idempotency-Key support for create_inspection.
+
+Flaky mobile networks make clients retry. A client that sends the same
+Idempotency-Key again (within IDEMPOTENCY_TTL_HOURS) gets the inspection the
+first request created instead of a duplicate. The key row is written in the
+same transaction as the inspection, so a key exists if and only if its
+inspection does. Reusing a key for a different payload is rejected.
+"""
+import hashlib
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+from fastapi import HTTPException
+from sqlalchemy import delete
+from sqlmodel import Session
+from models import IdempotencyKey
+
+IDEMPOTENCY_TTL = timedelta(hours=float(os.getenv("IDEMPOTENCY_TTL_HOURS", "24")))
+MAX_KEY_LENGTH = 255
+PURGE_INTERVAL_SECONDS = 600
+
+_last_purge = 0.0
+
+
+def fingerprint(payload: str) -> str:
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def validate_key(key: str) -> str:
+    key = key.strip()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters")
+    return key
+
+
+def find(session: Session, user_id: uuid.UUID, key: str, request_hash: str) -> Optional[IdempotencyKey]:
+    """
+    The live record for this key, or None. Expired records are dropped (in the caller's
+    transaction) so the key can be used again. Raises 422 if the key was used for another payload.
+    """
+    record = session.get(IdempotencyKey, (user_id, key))
+    if record is None:
+        return None
+    if record.expires_at <= datetime.utcnow():
+        session.delete(record)
+        session.flush()
+        return None
+    if record.request_hash != request_hash:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+    return record
+
+
+def remember(session: Session, user_id: uuid.UUID, key: str, request_hash: str, inspection_id: uuid.UUID):
+    """
+    Stage the key record next to the inspection it produced. Caller commits.
+    """
+    session.add(IdempotencyKey(
+        user_id=user_id,
+        key=key,
+        request_hash=request_hash,
+        inspection_id=inspection_id,
+        expires_at=datetime.utcnow() + IDEMPOTENCY_TTL,
+    ))
+
+
+def purge_expired(session: Session, force: bool = False) -> int:
+    """
+    Delete expired key records, at most once per PURGE_INTERVAL_SECONDS per process. Caller commits.
+    """
+    global _last_purge
+    now = time.monotonic()
+    if not force and now - _last_purge < PURGE_INTERVAL_SECONDS:
+        return 0
+    _last_purge = now
+    result = session.exec(delete(IdempotencyKey).where(IdempotencyKey.expires_at <= datetime.utcnow()))
+    return result.rowcount or 0
@@ -0,0 +1,308 @@
+"""
+Image derivatives for reports and the dashboard.
+
+Inspection photos and signatures are either Cloudinary URLs or files under
+STATIC_DIR (/static/... URLs or bare names). Instead of embedding originals, callers ask for a derivative:
+
+    path = image_cache.derivative(source, "pdf")   # or "thumb", "signature"
+
+The first request for a source downloads (or reads) it once and builds every
+derivative in DERIVATIVES with Pillow; each is stored in IMAGE_CACHE_DIR under
+a name derived from the source's content hash, bounded by IMAGE_CACHE_MAX_MB
+(least recently used evicted first). A small pointer file maps the source
+(URL, or path + mtime + size) to that hash, so later calls, from any process,
+skip the download entirely.
+
+Remote sources go through image_cache.fetcher, a callable url -> bytes. Set
+IMAGE_FETCH_ROOT to serve URLs from a local directory (by file name) instead
+of the network, or assign a different fetcher in code.
+
+check_image / transcode_upload are the ingest side: uploaded photos are
+checked when they arrive and re-encoded before they go to storage (see
+uploads.py), capped at the size and quality set in CompanySettings.
+"""
+import hashlib
+import os
+import threading
+from functools import lru_cache
+from io import BytesIO
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+from urllib.parse import urlparse
+from cache import DiskCache
+from static_files import STATIC_DIR, static_path
+
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "images"))
+IMAGE_CACHE_MAX_BYTES = int(float(os.getenv("IMAGE_CACHE_MAX_MB", "1024")) * 1024 * 1024)
+IMAGE_TIMEOUT = (3.05, 10) # connect, read (seconds)
+
+
+class Derivative(NamedTuple):
+    max_px: int # Longest side
+    format: str # Pillow format
+    extension: str
+    quality: int = 0 # JPEG only
+    mode: str = "RGB"
+
+
+DERIVATIVES: Dict[str, Derivative] = {
+    "thumb": Derivative(320, "JPEG", "jpg", quality=75),
+    "pdf": Derivative(1000, "JPEG", "jpg", quality=78), # ~240dpi in the report's 300pt box
+    "signature": Derivative(600, "PNG", "png", mode="L"), # Flattened on white, grayscale
+}
+
+
+@lru_cache(maxsize=1)
+def get_http():
+    """
+    One pooled HTTP session per process for image downloads.
+    """
+    import requests
+    return requests.Session()
+
+
+def http_fetcher(url: str) -> bytes:
+    res = get_http().get(url, timeout=IMAGE_TIMEOUT)
+    res.raise_for_status()
+    return res.content
+
+
+def directory_fetcher(root: str) -> Callable[[str], bytes]:
+    """
+    Fetcher that serves a URL from root/<last path segment>: a local stand-in for Cloudinary.
+    """
+    def fetch(url: str) -> bytes:
+        name = os.path.basename(urlparse(url).path)
+        with open(os.path.join(root, name), "rb") as f:
+            return f.read()
+    return fetch
+
+
+def make_derivative(content: bytes, spec: Derivative) -> bytes:
+    from PIL import Image, ImageOps
+
+    with Image.open(BytesIO(content)) as original:
+        image = ImageOps.exif_transpose(original) # Phone photos are often stored sideways
+        image.thumbnail((spec.max_px, spec.max_px), Image.Resampling.LANCZOS)
+        # No alpha in JPEG; reportlab embeds opaque images faster too
+        image = _flatten(image).convert(spec.mode)
+
+        out = BytesIO()
+        if spec.format == "JPEG":
+            image.save(out, "JPEG", quality=spec.quality, optimize=True, progressive=True)
+        else:
+            image.save(out, spec.format, optimize=True)
+
+        # A small, upright JPEG can come out bigger after re-encoding: keep the original then
+        upright = original.getexif().get(0x0112, 1) == 1 # EXIF Orientation
+        if (original.format == spec.format == "JPEG" and upright and max(original.size) <= spec.max_px
+                and len(content) <= out.tell()):
+            return content
+        return out.getvalue()
+
+
+def _flatten(image):
+    """
+    image without transparency, composited on white.
+    """
+    from PIL import Image
+
+    if image.mode not in ("RGBA", "LA", "P"):
+        return image
+    rgba = image.convert("RGBA")
+    flat = Image.new("RGB", rgba.size, "white")
+    flat.paste(rgba, mask=rgba.getchannel("A"))
+    return flat
+
+
+def is_remote(source: str) -> bool:
+    return source.startswith("http")
+
+
+def local_path(source: str) -> Optional[str]:
+    """
+    A local source: a /static/... URL, or a path relative to the working directory or to STATIC_DIR.
+    """
+    for path in (static_path(source), source, os.path.join(STATIC_DIR, source)):
+        if path and os.path.isfile(path):
+            return path
+    return None
+
+
+class ImageCache:
+    def __init__(self, directory: str, max_bytes: int, fetcher: Callable[[str], bytes]):
+        self.files = DiskCache("images", directory, max_bytes)
+        self.fetcher = fetcher
+        self._locks = [threading.Lock() for _ in range(64)]
+        self.fetches = 0
+        self.bytes_fetched = 0
+
+    def _source_key(self, source: str) -> Optional[str]:
+        if is_remote(source):
+            return source
+        path = local_path(source)
+        if path is None:
+            return None
+        stat = os.stat(path)
+        return f"{os.path.abspath(path)}:{stat.st_mtime_ns}:{stat.st_size}"
+
+    def _lock_for(self, key: str) -> threading.Lock:
+        # Striped: one build per source at a time within this process, without a lock per source
+        return self._locks[hash(key) % len(self._locks)]
+
+    @staticmethod
+    def _pointer_name(key: str) -> str:
+        return f"src-{hashlib.sha1(key.encode('utf-8')).hexdigest()}"
+
+    @staticmethod
+    def _derivative_name(digest: str, kind: str) -> str:
+        return f"{digest}-{kind}.{DERIVATIVES[kind].extension}"
+
+    def _lookup(self, key: str, kind: str) -> Optional[str]:
+        pointer = self.files.get(self._pointer_name(key))
+        if pointer is None:
+            return None
+        try:
+            with open(pointer) as f:
+                digest = f.read().strip()
+        except FileNotFoundError: # Evicted in between
+            return None
+        return self.files.get(self._derivative_name(digest, kind))
+
+    def _read(self, source: str) -> bytes:
+        if is_remote(source):
+            content = self.fetcher(source)
+            self.fetches += 1
+            self.bytes_fetched += len(content)
+            return content
+        with open(local_path(source), "rb") as f:
+            return f.read()
+
+    def derivative(self, source: str, kind: str) -> Optional[str]:
+        """
+        Path of the `kind` derivative of source (URL or upload), building it on first use.
+        None if the source is missing, cannot be fetched or is not an image.
+        """
+        if kind not in DERIVATIVES:
+            raise ValueError(f"Unknown image derivative: {kind}")
+        key = self._source_key(source)
+        if key is None:
+            return None
+        path = self._lookup(key, kind)
+        if path:
+            return path
+
+        with self._lock_for(key):
+            path = self._lookup(key, kind) # Built by another thread while we waited
+            if path:
+                return path
+            try:
+                content = self._read(source)
+                digest = hashlib.sha256(content).hexdigest()
+                # Every kind at once: the source is only read again if the derivatives get evicted
+                paths = {
+                    name: self.files.put(self._derivative_name(digest, name), make_derivative(content, spec))
+                    for name, spec in DERIVATIVES.items()
+                }
+            except Exception as e:
+                print(f"Error preparing image {source}: {e}")
+                return None
+            self.files.put(self._pointer_name(key), digest.encode("ascii"))
+            return paths[kind]
+
+    def fetch_stats(self) -> dict:
+        # Cache counters are under DISK_CACHES["images"]
+        return {"fetches": self.fetches, "bytes_fetched": self.bytes_fetched}
+
+
+_fetch_root = os.getenv("IMAGE_FETCH_ROOT")
+image_cache = ImageCache(
+    IMAGE_CACHE_DIR,
+    IMAGE_CACHE_MAX_BYTES,
+    directory_fetcher(_fetch_root) if _fetch_root else http_fetcher,
+)
+
+
+# --- Upload ingest -------------------------------------------------------------
+
+ACCEPTED_UPLOAD_FORMATS = {"JPEG", "MPO", "PNG", "WEBP"} # MPO: the multi-picture JPEGs some phones write
+MAX_SOURCE_PIXELS = int(os.getenv("MAX_SOURCE_MEGAPIXELS", "60")) * 1_000_000
+TRANSCODE_FORMATS = {"jpeg": ("JPEG", "image/jpeg", ".jpg"), "webp": ("WEBP", "image/webp", ".webp")}
+
+EXIF_IFD = 0x8769
+CAPTURE_TIME_TAGS = (0x9003, 0x9011) # DateTimeOriginal, OffsetTimeOriginal (Exif IFD)
+DATETIME_TAG = 0x0132
+
+
+class RejectedImage(ValueError):
+    pass
+
+
+class TranscodeParams(NamedTuple):
+    max_px: int
+    format: str # Key of TRANSCODE_FORMATS
+    quality: int
+
+
+def check_image(path: str) -> Tuple[str, int, int]:
+    """
+    Format and dimensions from the file header (nothing is decoded). Raises RejectedImage
+    for files that are not a supported image or are too large to process safely.
+    """
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        with Image.open(path) as image:
+            info = image.format, image.width, image.height
+    except Image.DecompressionBombError:
+        raise RejectedImage("Image dimensions are too large")
+    except (UnidentifiedImageError, OSError):
+        raise RejectedImage("Not a supported image")
+    if info[0] not in ACCEPTED_UPLOAD_FORMATS:
+        raise RejectedImage(f"Unsupported image format {info[0]}, use JPEG, PNG or WebP")
+    if info[1] * info[2] > MAX_SOURCE_PIXELS:
+        raise RejectedImage("Image dimensions are too large")
+    return info
+
+
+def _capture_time_exif(exif):
+    """
+    A fresh EXIF block with only the capture time: no GPS, device or maker data.
+    """
+    from PIL import Image
+
+    kept = Image.Exif()
+    if DATETIME_TAG in exif:
+        kept[DATETIME_TAG] = exif[DATETIME_TAG]
+    original_ifd = exif.get_ifd(EXIF_IFD)
+    for tag in CAPTURE_TIME_TAGS:
+        if tag in original_ifd:
+            kept.get_ifd(EXIF_IFD)[tag] = original_ifd[tag]
+    return kept
+
+
+def transcode_upload(source: str, destination: str, params: TranscodeParams) -> Tuple[str, str]:
+    """
+    Re-encode an uploaded photo: upright, longest side capped at params.max_px, EXIF
+    reduced to the capture time. Returns (content_type, extension) of what was written.
+    """
+    from PIL import Image, ImageOps
+
+    pil_format, content_type, extension = TRANSCODE_FORMATS[params.format]
+    with Image.open(source) as original:
+        exif = original.getexif()
+        image = ImageOps.exif_transpose(original) # Pixels rotated, so the Orientation tag can go
+        image.thumbnail((params.max_px, params.max_px), Image.Resampling.LANCZOS)
+        if pil_format == "JPEG":
+            image = _flatten(image).convert("RGB")
+        elif image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() or image.mode == "P" else "RGB")
+
+        options = {"quality": params.quality, "exif": _capture_time_exif(exif).tobytes()}
+        if pil_format == "JPEG":
+            options.update(optimize=True, progressive=True)
+        else:
+            options.update(method=4) # Encoder effort 0-6: 4 is most of the gain at a fraction of 6's time
+        tmp = f"{destination}.tmp"
+        image.save(tmp, pil_format, **options)
+    os.replace(tmp, destination)
+    return content_type, extension
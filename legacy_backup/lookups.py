@@ -0,0 +1,85 @@
+"""
+Resolving scanned codes (asset UUIDs or serial numbers) to extinguishers.
+
+Serials are matched on Extinguisher.sl_no_normalized, so every lookup is a
+single indexed query whatever the case or separators on the printed tag.
+"""
+import uuid
+from typing import Dict, List, Optional
+from sqlalchemy import update
+from sqlmodel import Session, select, or_
+from models import Extinguisher
+from utils import normalize_serial
+
+
+def parse_uuid(code: str) -> Optional[uuid.UUID]:
+    try:
+        return uuid.UUID(code.strip())
+    except (ValueError, AttributeError):
+        return None
+
+
+def resolve_extinguisher(session: Session, code: str) -> Optional[Extinguisher]:
+    """
+    One query: primary key for UUIDs, the normalized-serial index for everything else.
+    Inactive (soft-deleted) extinguishers are returned too; callers decide.
+    """
+    ext_uuid = parse_uuid(code)
+    if ext_uuid:
+        return session.get(Extinguisher, ext_uuid)
+    return session.exec(
+        select(Extinguisher).where(Extinguisher.sl_no_normalized == normalize_serial(code))
+    ).first()
+
+
+def resolve_codes(session: Session, codes: List[str]) -> Dict[str, Extinguisher]:
+    """
+    Map many scanned codes to active extinguishers in one round trip.
+    Codes that match nothing are left out of the result.
+    """
+    by_uuid = {}
+    by_serial = {}
+    for code in codes:
+        ext_uuid = parse_uuid(code)
+        if ext_uuid:
+            by_uuid.setdefault(ext_uuid, []).append(code)
+        else:
+            by_serial.setdefault(normalize_serial(code), []).append(code)
+
+    if not by_uuid and not by_serial:
+        return {}
+
+    conditions = []
+    if by_uuid:
+        conditions.append(Extinguisher.id.in_(list(by_uuid)))
+    if by_serial:
+        conditions.append(Extinguisher.sl_no_normalized.in_(list(by_serial)))
+
+    statement = select(Extinguisher).where(Extinguisher.is_active == True, or_(*conditions))
+
+    resolved = {}
+    for extinguisher in session.exec(statement).all():
+        for code in by_uuid.get(extinguisher.id, []) + by_serial.get(extinguisher.sl_no_normalized, []):
+            resolved[code] = extinguisher
+    return resolved
+
+
+def lock_extinguishers(session: Session, extinguishers: List[Extinguisher]):
+    """
+    Take row locks for the rest of the transaction and reload the rows, so concurrent
+    writes to the same asset (e.g. two inspectors scanning one tag) apply one after the other.
+    Locks are taken in id order to avoid deadlocks between overlapping batches.
+    """
+    ids = sorted({extinguisher.id for extinguisher in extinguishers})
+    if not ids:
+        return
+    if session.get_bind().dialect.name == "sqlite":
+        # No FOR UPDATE in SQLite: a no-op write takes the database write lock instead
+        session.exec(update(Extinguisher).where(Extinguisher.id.in_(ids)).values(id=Extinguisher.id))
+    session.exec(
+        select(Extinguisher)
+        .where(Extinguisher.id.in_(ids))
+        .order_by(Extinguisher.id)
+        .with_for_update()
+        .execution_options(populate_existing=True)
+    ).all()
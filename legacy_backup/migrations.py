@@ -0,0 +1,368 @@
+"""
+Versioned schema migrations.
+
+Each step below is registered with @migration(version, description) and is
+applied at most once; applied versions are recorded in the schema_version
+table. On boot, migrate() makes one query (SELECT MAX(version)) and returns
+if the schema is current. Otherwise it takes a lock so only one worker
+migrates (pg_advisory_lock on Postgres, BEGIN IMMEDIATE on SQLite), re-checks
+the version and applies the pending steps.
+
+Steps must be idempotent: databases that predate this runner already have
+some of the columns, so every step checks before it alters. Steps marked
+data=True load ORM models and run after the schema steps of the same run.
+
+    python migrations.py            # upgrade
+    python migrations.py status
+    python migrations.py repair     # re-run every step (e.g. after a manual schema edit)
+"""
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, List, NamedTuple
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import DBAPIError
+from sqlmodel import Session, SQLModel
+
+# Arbitrary constant shared by all workers for pg_advisory_lock
+MIGRATION_LOCK_KEY = 2190_0001
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    apply: Callable[[Connection], None]
+    data: bool
+
+
+MIGRATIONS: List[Migration] = []
+
+
+def migration(version: int, description: str, data: bool = False):
+    def register(fn):
+        assert all(m.version != version for m in MIGRATIONS), f"Duplicate migration {version}"
+        MIGRATIONS.append(Migration(version, description, fn, data))
+        MIGRATIONS.sort(key=lambda m: m.version)
+        return fn
+    return register
+
+
+# --- Helpers -----------------------------------------------------------------
+
+def _quote(conn: Connection, table: str) -> str:
+    return conn.dialect.identifier_preparer.quote(table)
+
+
+def has_column(conn: Connection, table: str, column: str) -> bool:
+    # Fresh inspector each time: earlier steps in the same run may have altered the table
+    return column in {c["name"] for c in inspect(conn).get_columns(table)}
+
+
+def add_column(conn: Connection, table: str, column: str, ddl: str, fill: str = None):
+    """
+    ALTER TABLE ... ADD COLUMN unless it exists. `fill` is a SQL expression written
+    into existing rows (SQLite cannot add a column with a non-constant default).
+    """
+    if has_column(conn, table, column):
+        return
+    conn.execute(text(f"ALTER TABLE {_quote(conn, table)} ADD COLUMN {column} {ddl}"))
+    if fill is not None:
+        conn.execute(text(f"UPDATE {_quote(conn, table)} SET {column} = {fill} WHERE {column} IS NULL"))
+    print(f"Added {table}.{column}")
+
+
+def add_index(conn: Connection, name: str, table: str, columns: str, unique: bool = False):
+    # CREATE INDEX IF NOT EXISTS is understood by both SQLite and Postgres
+    conn.execute(text(
+        f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {name} ON {_quote(conn, table)} ({columns})"
+    ))
+
+
+def _uuid_type(conn: Connection) -> str:
+    return "UUID" if conn.dialect.name == "postgresql" else "CHAR(32)"
+
+
+def _true(conn: Connection) -> str:
+    return "TRUE" if conn.dialect.name == "postgresql" else "1"
+
+
+# --- Steps -------------------------------------------------------------------
+
+@migration(1, "Create missing tables")
+def create_tables(conn: Connection):
+    import models  # noqa: F401 (registers the tables on SQLModel.metadata)
+    SQLModel.metadata.create_all(conn)
+
+
+@migration(2, "Inspection detail and audit columns (Phase 6.6 / 6.10)")
+def inspection_columns(conn: Connection):
+    add_column(conn, "extinguisher", "hydro_pressure_tested_on", "TIMESTAMP")
+    add_column(conn, "extinguisher", "next_hydro_pressure_test_due", "TIMESTAMP")
+
+    for column in ("hydro_pressure_tested_on", "next_hydro_pressure_test_due", "pressure_tested_on",
+                   "date_of_discharge", "refilled_on", "due_for_refilling"):
+        add_column(conn, "inspection", column, "TIMESTAMP")
+
+    add_column(conn, "inspection", "observation", "VARCHAR DEFAULT 'Ok'")
+    for column in ("remarks", "device_id", "photo_path", "signature_path"):
+        add_column(conn, "inspection", column, "VARCHAR")
+
+    add_column(conn, "companysettings", "timezone", "VARCHAR DEFAULT 'Asia/Kolkata'")
+
+
+@migration(3, "Soft delete and sortable lists (Phase 6.9 / 6.11)")
+def soft_delete_and_created_at(conn: Connection):
+    for table in ("user", "extinguisher"):
+        add_column(conn, table, "is_active", f"BOOLEAN DEFAULT {_true(conn)}")
+        if conn.dialect.name == "postgresql":
+            add_column(conn, table, "created_at", "TIMESTAMP DEFAULT NOW()")
+        else:
+            add_column(conn, table, "created_at", "TIMESTAMP", fill="CURRENT_TIMESTAMP")
+
+
+@migration(4, "Extinguisher list and inspection history indexes")
+def list_indexes(conn: Connection):
+    add_index(conn, "ix_extinguisher_active_created", "extinguisher", "is_active, created_at, id")
+    add_index(conn, "ix_extinguisher_active_status", "extinguisher", "is_active, status")
+    add_index(conn, "ix_extinguisher_active_location", "extinguisher", "is_active, location")
+    add_index(conn, "ix_extinguisher_active_type", "extinguisher", "is_active, type")
+    add_index(conn, "ix_extinguisher_next_service_due", "extinguisher", "next_service_due")
+    add_index(conn, "ix_inspection_date", "inspection", "inspection_date")
+    add_index(conn, "ix_inspection_extinguisher_date", "inspection", "extinguisher_id, inspection_date")
+
+
+@migration(5, "Current-state columns on extinguisher (see extinguisher_state.py)")
+def current_state_columns(conn: Connection):
+    add_column(conn, "extinguisher", "last_inspection_id", _uuid_type(conn))
+    add_column(conn, "extinguisher", "last_inspector_id", _uuid_type(conn))
+    add_column(conn, "extinguisher", "last_inspector_name", "VARCHAR")
+    add_column(conn, "extinguisher", "last_due_for_refilling", "TIMESTAMP")
+    add_column(conn, "extinguisher", "recent_inspection_ids", "VARCHAR")
+
+
+@migration(6, "Token revocation counter on user")
+def token_version(conn: Connection):
+    add_column(conn, "user", "token_version", "INTEGER DEFAULT 0")
+
+
+@migration(7, "Normalized serial lookup key (see utils.normalize_serial)")
+def normalized_serials(conn: Connection):
+    from utils import normalize_serial
+
+    add_column(conn, "extinguisher", "sl_no_normalized", "VARCHAR")
+    missing = conn.execute(text("SELECT id, sl_no FROM extinguisher WHERE sl_no_normalized IS NULL")).all()
+    for ext_id, sl_no in missing:
+        conn.execute(
+            text("UPDATE extinguisher SET sl_no_normalized = :value WHERE id = :id"),
+            {"value": normalize_serial(sl_no), "id": ext_id}
+        )
+    if missing:
+        print(f"Normalized {len(missing)} serial numbers")
+    try:
+        with conn.begin_nested():
+            add_index(conn, "ix_extinguisher_sl_no_normalized", "extinguisher", "sl_no_normalized", unique=True)
+    except DBAPIError as e:
+        # Two serials that only differ in case/separators: keep lookups indexed, flag for cleanup
+        print(f"Serials collide after normalization, creating non-unique index: {e}")
+        add_index(conn, "ix_extinguisher_sl_no_normalized_dup", "extinguisher", "sl_no_normalized")
+
+
+@migration(8, "Seed the inspection daily rollup (see rollups.py)", data=True)
+def seed_daily_rollup(conn: Connection):
+    from sqlmodel import select
+    from models import Inspection, InspectionDailyStat
+    from rollups import rebuild_daily_rollup
+
+    with Session(bind=conn) as session:
+        has_rollup = session.exec(select(InspectionDailyStat.day).limit(1)).first() is not None
+        has_inspections = session.exec(select(Inspection.id).limit(1)).first() is not None
+        if has_inspections and not has_rollup:
+            rows = rebuild_daily_rollup(session)
+            print(f"Built inspection daily rollup ({rows} rows)")
+
+
+@migration(9, "Backfill extinguisher current state from history", data=True)
+def backfill_current_state(conn: Connection):
+    from extinguisher_state import backfill
+
+    with Session(bind=conn) as session:
+        updated = backfill(session, only_missing=True)
+        session.flush()
+        if updated:
+            print(f"Backfilled current state for {updated} extinguishers")
+
+
+@migration(10, "Idempotency key on inspection (offline batch sync)")
+def inspection_idempotency_key(conn: Connection):
+    add_column(conn, "inspection", "idempotency_key", "VARCHAR")
+    add_index(conn, "ix_inspection_idempotency_key", "inspection", "idempotency_key", unique=True)
+
+
+@migration(11, "Idempotency-Key records for create_inspection")
+def idempotency_keys(conn: Connection):
+    from models import IdempotencyKey
+    SQLModel.metadata.create_all(conn, tables=[IdempotencyKey.__table__])
+
+
+@migration(12, "Upload handles for background storage transfers")
+def upload_handles(conn: Connection):
+    from models import Upload
+    SQLModel.metadata.create_all(conn, tables=[Upload.__table__])
+
+
+@migration(13, "Photo transcoding settings and stored upload size")
+def photo_transcoding(conn: Connection):
+    add_column(conn, "companysettings", "photo_max_px", "INTEGER DEFAULT 2048")
+    add_column(conn, "companysettings", "photo_format", "VARCHAR DEFAULT 'jpeg'")
+    add_column(conn, "companysettings", "photo_quality", "INTEGER DEFAULT 80")
+    add_column(conn, "upload", "stored_size", "INTEGER")
+
+
+@migration(14, "Change log for GET /sync, seeded with every synced row")
+def change_log(conn: Connection):
+    from models import ChangeLog, SYNCED_ENTITIES
+    SQLModel.metadata.create_all(conn, tables=[ChangeLog.__table__])
+    if conn.execute(text("SELECT 1 FROM changelog LIMIT 1")).first():
+        return
+    # Everything that exists now counts as one change, so a first sync from 0 returns it all
+    seeded = 0
+    for model, entity in SYNCED_ENTITIES.items():
+        ids = conn.execute(model.__table__.select().with_only_columns(model.__table__.c.id)).scalars().all()
+        for start in range(0, len(ids), 1000):
+            conn.execute(ChangeLog.__table__.insert(), [
+                {"entity": entity, "entity_id": str(row_id), "deleted": False, "changed_at": datetime.utcnow()}
+                for row_id in ids[start:start + 1000]
+            ])
+        seeded += len(ids)
+    if seeded:
+        print(f"Seeded change log with {seeded} rows")
+
+
+@migration(15, "Compliance due-date columns and indexes")
+def compliance_columns(conn: Connection):
+    for column in ("next_maintenance_due", "next_refill_due", "end_of_life", "compliance_due"):
+        add_column(conn, "extinguisher", column, "TIMESTAMP")
+    add_index(conn, "ix_extinguisher_active_compliance_due", "extinguisher", "is_active, compliance_due")
+    add_index(conn, "ix_extinguisher_active_location_compliance_due", "extinguisher", "is_active, location, compliance_due")
+
+
+@migration(16, "Compute compliance due dates from history (see compliance.py)", data=True)
+def compliance_due_dates(conn: Connection):
+    from compliance import recompute
+
+    with Session(bind=conn) as session:
+        updated = recompute(session)
+        session.flush()
+        if updated:
+            print(f"Computed compliance due dates for {updated} extinguishers")
+
+
+# --- Runner ------------------------------------------------------------------
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def current_version(conn: Connection) -> int:
+    try:
+        return conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
+    except DBAPIError:
+        # No schema_version table yet
+        conn.rollback()
+        return 0
+
+
+@contextmanager
+def _migration_lock(conn: Connection):
+    """
+    Hold the migration lock for the duration of the block.
+    On SQLite the whole run is one IMMEDIATE transaction (the write lock is the migration lock);
+    elsewhere each step commits on its own.
+    """
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        conn.execution_options(isolation_level="AUTOCOMMIT")
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            conn.exec_driver_sql("ROLLBACK")
+            raise
+        conn.exec_driver_sql("COMMIT")
+        return
+
+    if dialect == "postgresql":
+        conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        conn.commit()
+    try:
+        yield
+    finally:
+        conn.rollback()
+        if dialect == "postgresql":
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+            conn.commit()
+
+
+def migrate(bind: Engine = None, repair: bool = False) -> List[str]:
+    """
+    Bring the schema up to LATEST_VERSION. With repair, re-run every step.
+    Returns the steps that ran.
+    """
+    if bind is None:
+        from database import engine as bind
+
+    with bind.connect() as conn:
+        version = current_version(conn)
+        if version >= LATEST_VERSION and not repair:
+            return []
+        conn.rollback()
+
+        applied = []
+        with _migration_lock(conn):
+            conn.execute(text(
+                "CREATE TABLE IF NOT EXISTS schema_version ("
+                "version INTEGER PRIMARY KEY, description VARCHAR NOT NULL, applied_at TIMESTAMP NOT NULL)"
+            ))
+            # Another worker may have migrated while we waited for the lock
+            version = current_version(conn)
+            pending = [m for m in MIGRATIONS if repair or m.version > version]
+            pending.sort(key=lambda m: (m.data, m.version))
+
+            for step in pending:
+                print(f"Applying migration {step.version}: {step.description}")
+                step.apply(conn)
+                if step.version > version:
+                    conn.execute(
+                        text("INSERT INTO schema_version (version, description, applied_at) VALUES (:v, :d, :t)"),
+                        {"v": step.version, "d": step.description, "t": datetime.utcnow()}
+                    )
+                if conn.dialect.name != "sqlite":
+                    conn.commit()
+                applied.append(f"{step.version}: {step.description}")
+        print(f"Schema at version {LATEST_VERSION}")
+        return applied
+
+
+def status(bind: Engine = None) -> dict:
+    if bind is None:
+        from database import engine as bind
+    with bind.connect() as conn:
+        version = current_version(conn)
+    return {
+        "version": version,
+        "latest": LATEST_VERSION,
+        "pending": [f"{m.version}: {m.description}" for m in MIGRATIONS if m.version > version],
+    }
+
+
+if __name__ == "__main__":
+    import sys
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "upgrade"
+    if command == "status":
+        print(status())
+    elif command in ("upgrade", "repair"):
+        applied = migrate(repair=command == "repair")
+        print(f"Applied {len(applied)} migration(s)." if applied else "Nothing to do.")
+    else:
+        print("Usage: python migrations.py [upgrade|status|repair]")
+        sys.exit(1)
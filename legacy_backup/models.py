@@ -1,7 +1,10 @@
 from typing import Optional, List
 from sqlmodel import Field, SQLModel, Relationship
-from datetime import datetime
+from sqlalchemy import Index, event
+from sqlalchemy.orm import object_session
+from datetime import datetime, date
 import uuid
+from utils import normalize_serial
 
 class UserBase(SQLModel):
     username: str = Field(index=True, unique=True)
@@ -12,6 +15,7 @@ class User(UserBase, table=True):
     password_hash: str
     is_active: bool = Field(default=True)
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    token_version: int = Field(default=0) # Bumped to revoke all issued tokens
 
 class UserCreate(UserBase):
     password: str
@@ -51,16 +55,76 @@ class ExtinguisherCreate(ExtinguisherBase):
     pass
 
 class Extinguisher(ExtinguisherBase, table=True):
+    # Keyset pagination walks (created_at, id) over active rows; the others back the list filters
+    __table_args__ = (
+        Index("ix_extinguisher_active_created", "is_active", "created_at", "id"),
+        Index("ix_extinguisher_active_status", "is_active", "status"),
+        Index("ix_extinguisher_active_location", "is_active", "location"),
+        Index("ix_extinguisher_active_type", "is_active", "type"),
+        Index("ix_extinguisher_next_service_due", "next_service_due"),
+        # "Due soon / overdue", overall and by location (see compliance.py)
+        Index("ix_extinguisher_active_compliance_due", "is_active", "compliance_due"),
+        Index("ix_extinguisher_active_location_compliance_due", "is_active", "location", "compliance_due"),
+    )
+
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     is_active: bool = Field(default=True)
     created_at: datetime = Field(default_factory=datetime.utcnow)
     inspections: List["Inspection"] = Relationship(back_populates="extinguisher")
 
+    # Lookup key for scanned serials, kept in sync with sl_no (see normalize_serial)
+    sl_no_normalized: Optional[str] = Field(default=None, unique=True, index=True)
+
+    # Current state, maintained by create_inspection (see extinguisher_state.py)
+    last_inspection_id: Optional[uuid.UUID] = None
+    last_inspector_id: Optional[uuid.UUID] = None
+    last_inspector_name: Optional[str] = None
+    last_due_for_refilling: Optional[datetime] = None
+    recent_inspection_ids: Optional[str] = None # Comma-separated, newest first
+
+    # Due dates besides next_service_due / next_hydro_pressure_test_due (see compliance.py)
+    next_maintenance_due: Optional[datetime] = None
+    next_refill_due: Optional[datetime] = None
+    end_of_life: Optional[datetime] = None
+    compliance_due: Optional[datetime] = None # Earliest of all of them
+
+COMPLIANCE_DUE_COLUMNS = (
+    "next_service_due", "next_maintenance_due", "next_hydro_pressure_test_due", "next_refill_due", "end_of_life",
+)
+
+@event.listens_for(Extinguisher, "before_insert")
+@event.listens_for(Extinguisher, "before_update")
+def _sync_sl_no_normalized(mapper, connection, target):
+    target.sl_no_normalized = normalize_serial(target.sl_no)
+
+@event.listens_for(Extinguisher, "before_insert")
+@event.listens_for(Extinguisher, "before_update")
+def _sync_compliance_due(mapper, connection, target):
+    dates = [getattr(target, column) for column in COMPLIANCE_DUE_COLUMNS if getattr(target, column) is not None]
+    target.compliance_due = min(dates) if dates else None
+
 class ExtinguisherRead(ExtinguisherBase):
     id: uuid.UUID
     inspections: List["Inspection"] = []
 
+class InspectionSummary(SQLModel):
+    id: uuid.UUID
+    inspection_type: str
+    inspection_date: datetime
+    observation: Optional[str] = None
+
+class ExtinguisherSummary(ExtinguisherBase):
+    # Slim list projection: the latest inspection instead of the full history
+    id: uuid.UUID
+    latest_inspection: Optional[InspectionSummary] = None
+
 class Inspection(SQLModel, table=True):
+    # Date-ordered scans (exports, since/until filters) and per-asset history (Annex H windows)
+    __table_args__ = (
+        Index("ix_inspection_date", "inspection_date"),
+        Index("ix_inspection_extinguisher_date", "extinguisher_id", "inspection_date"),
+    )
+
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     extinguisher_id: uuid.UUID = Field(foreign_key="extinguisher.id")
     inspector_id: Optional[uuid.UUID] = Field(default=None) # Link to User if authenticated
@@ -84,6 +148,8 @@ class Inspection(SQLModel, table=True):
     
     # Audit
     device_id: Optional[str] = None
+    # Offline sync: "<device_id>:<client uuid>", so a re-sent submission is recognised instead of duplicated
+    idempotency_key: Optional[str] = Field(default=None, unique=True, index=True)
     
     extinguisher: Optional[Extinguisher] = Relationship(back_populates="inspections")
 
@@ -92,4 +158,77 @@ class CompanySettings(SQLModel, table=True):
     company_name: str = Field(default="Siddhi Industrial Solutions")
     logo_url: Optional[str] = None
     timezone: str = Field(default="Asia/Kolkata")
+    # Uploaded photos are re-encoded to these before storage (see images.transcode_upload);
+    # clients should downscale to photo_max_px themselves to save the transfer
+    photo_max_px: int = Field(default=2048)
+    photo_format: str = Field(default="jpeg") # jpeg, webp
+    photo_quality: int = Field(default=80)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class InspectionDailyStat(SQLModel, table=True):
+    # Pre-aggregated inspection counts per local day (see rollups.py)
+    day: date = Field(primary_key=True)
+    inspection_type: str = Field(primary_key=True)
+    observation: str = Field(default="", primary_key=True)
+    location: str = Field(default="", primary_key=True)
+    count: int = Field(default=0)
+
+class IdempotencyKey(SQLModel, table=True):
+    # Idempotency-Key header of a write, per user, and what it produced (see idempotency.py)
+    user_id: uuid.UUID = Field(primary_key=True)
+    key: str = Field(primary_key=True, max_length=255)
+    request_hash: str
+    inspection_id: uuid.UUID
+    expires_at: datetime = Field(index=True)
+
+class Upload(SQLModel, table=True):
+    # An upload accepted by POST /upload/ and forwarded to storage in the background (see uploads.py)
+    id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+    status: str = Field(default="pending", index=True) # pending, transferring, done, failed
+    filename: str
+    content_type: str
+    size: int
+    stored_size: Optional[int] = None # After transcoding
+    url: Optional[str] = None # Final location once done
+    error: Optional[str] = None
+    attempts: int = Field(default=0)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class ChangeLog(SQLModel, table=True):
+    # One row per write to a synced table; seq orders them and is the GET /sync token (see changes.py)
+    __table_args__ = (
+        Index("ix_changelog_entity", "entity", "entity_id"),
+    )
+
+    seq: Optional[int] = Field(default=None, primary_key=True)
+    entity: str # extinguisher, inspection, user, settings
+    entity_id: str
+    deleted: bool = Field(default=False) # Row removed; soft deletes are updates (is_active=False)
+    changed_at: datetime = Field(default_factory=datetime.utcnow)
+
+SYNCED_ENTITIES = {Extinguisher: "extinguisher", Inspection: "inspection", User: "user", CompanySettings: "settings"}
+
+def _record_change(target, connection, deleted: bool = False):
+    connection.execute(ChangeLog.__table__.insert().values(
+        entity=SYNCED_ENTITIES[type(target)], entity_id=str(target.id), deleted=deleted, changed_at=datetime.utcnow(),
+    ))
+
+def _after_insert(mapper, connection, target):
+    _record_change(target, connection)
+
+def _after_update(mapper, connection, target):
+    # Also fires for rows that were only add()ed again with nothing changed
+    session = object_session(target)
+    if session is None or session.is_modified(target, include_collections=False):
+        _record_change(target, connection)
+
+def _after_delete(mapper, connection, target):
+    _record_change(target, connection, deleted=True)
+
+# Same transaction as the write itself. Bulk update()/delete() statements bypass these:
+# call record_changes() next to them (see changes.py).
+for _model in SYNCED_ENTITIES:
+    event.listen(_model, "after_insert", _after_insert)
+    event.listen(_model, "after_update", _after_update)
+    event.listen(_model, "after_delete", _after_delete)
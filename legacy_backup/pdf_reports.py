@@ -0,0 +1,352 @@
+"""
+Inspection PDF reports.
+
+Rendering runs on a process pool (PDF_RENDER_WORKERS, default up to 4) so
+reportlab never holds the API process' GIL. Every rendered PDF is stored in
+an on-disk cache (PDF_CACHE_DIR, bounded by PDF_CACHE_MAX_MB, least recently
+used files evicted first). Cache entries are content-addressed: the name is a
+hash of TEMPLATE_VERSION plus everything printed on the report, so a new
+template or an edited asset simply produces a new entry, and the same hash
+is the download's ETag.
+
+Photos and signatures are embedded as downsized derivatives from the image
+cache (see images.py), not as originals.
+
+reportlab and requests are imported on first use (or by the startup
+warm-up, see startup.py), never at module import.
+
+Bump TEMPLATE_VERSION whenever the layout below changes.
+"""
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from sqlmodel import Session, select
+from models import Inspection, Extinguisher, User
+from cache import DiskCache
+from images import image_cache, is_remote
+
+TEMPLATE_VERSION = "2"
+
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "pdf"))
+PDF_CACHE_MAX_BYTES = int(float(os.getenv("PDF_CACHE_MAX_MB", "512")) * 1024 * 1024)
+INCOMPLETE_SUFFIX = ".incomplete.pdf" # Rendered while an image failed to load; replaced on the next request
+PDF_RENDER_WORKERS = int(os.getenv("PDF_RENDER_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+
+@lru_cache(maxsize=1)
+def get_pdf_styles():
+    """
+    reportlab's sample stylesheet, built once per process. Treat as read-only.
+    """
+    from reportlab.lib.styles import getSampleStyleSheet
+    return getSampleStyleSheet()
+
+
+# --- Report data -------------------------------------------------------------
+
+def _date(value, fmt: str) -> Optional[str]:
+    return value.strftime(fmt) if value else None
+
+
+def report_data(inspection: Inspection, extinguisher: Optional[Extinguisher], inspector_name: Optional[str]) -> dict:
+    """
+    Everything printed on the report, as plain (picklable, hashable) values.
+    """
+    return {
+        "template": TEMPLATE_VERSION,
+        "inspection": {
+            "id": str(inspection.id),
+            "date": _date(inspection.inspection_date, "%d-%b-%Y %H:%M"),
+            "type": inspection.inspection_type,
+            "observation": inspection.observation,
+            "remarks": inspection.remarks,
+            "pressure_tested_on": _date(inspection.pressure_tested_on, "%d-%b-%Y"),
+            "next_hydro_pressure_test_due": _date(inspection.next_hydro_pressure_test_due, "%d-%b-%Y"),
+            "refilled_on": _date(inspection.refilled_on, "%d-%b-%Y"),
+            "photo_path": inspection.photo_path,
+            "signature_path": inspection.signature_path,
+        },
+        "inspector": inspector_name,
+        "extinguisher": {
+            "sl_no": extinguisher.sl_no,
+            "type": extinguisher.type,
+            "capacity": extinguisher.capacity,
+            "location": extinguisher.location,
+            "make": extinguisher.make,
+            "year_of_manufacture": extinguisher.year_of_manufacture,
+        } if extinguisher else None,
+    }
+
+
+def load_report_data(session: Session, inspection_ids: List[uuid.UUID]) -> Dict[uuid.UUID, dict]:
+    """
+    Report data for many inspections with one joined query. Missing ids are left out.
+    """
+    if not inspection_ids:
+        return {}
+    rows = session.exec(
+        select(Inspection, Extinguisher, User.username)
+        .join(Extinguisher, Inspection.extinguisher_id == Extinguisher.id, isouter=True)
+        .join(User, Inspection.inspector_id == User.id, isouter=True)
+        .where(Inspection.id.in_(inspection_ids))
+    ).all()
+    return {inspection.id: report_data(inspection, extinguisher, username) for inspection, extinguisher, username in rows}
+
+
+def report_digest(data: dict) -> str:
+    """
+    Content address of a report: changes whenever anything printed on it (or the template) changes.
+    """
+    canonical = json.dumps(data, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+# --- Rendering (runs in the pool workers) -----------------------------------
+
+def _image_flowable(source: str, kind: str = "pdf"):
+    from reportlab.platypus import Image as ReportLabImage
+
+    # Cloudinary URL or local upload, downsized once and cached
+    path = image_cache.derivative(source, kind)
+    if path is None:
+        return None
+    return ReportLabImage(path, width=300, height=300, kind='proportional') # Maintain aspect ratio
+
+
+def render_report(data: dict) -> Tuple[bytes, bool]:
+    """
+    Build the inspection report PDF from report_data(). Returns (pdf, complete): complete is
+    False when the photo or signature could not be loaded, so the PDF must not be cached
+    under the digest (the image may well load next time).
+    """
+    from io import BytesIO
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+
+    inspection = data["inspection"]
+    extinguisher = data["extinguisher"]
+    styles = get_pdf_styles()
+    complete = True
+
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    story = []
+
+    # Title
+    story.append(Paragraph("Fire Extinguisher Inspection Report", styles['Title']))
+    story.append(Spacer(1, 12))
+
+    # Meta Info
+    meta_data = [
+        ["Inspection ID", inspection["id"]],
+        ["Date", inspection["date"]],
+        ["Inspector", data["inspector"] or "Unknown"],
+        ["Type", inspection["type"]],
+        ["Status", inspection["observation"]],
+    ]
+    meta_table = Table(meta_data, colWidths=[150, 300])
+    meta_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
+        ('GRID', (0,0), (-1,-1), 1, colors.black),
+        ('FONTNAME', (0,0), (-1,-1), 'Helvetica-Bold'),
+    ]))
+    story.append(meta_table)
+    story.append(Spacer(1, 12))
+
+    # Extinguisher Details
+    story.append(Paragraph("Extinguisher Details", styles['Heading2']))
+    if extinguisher:
+        ext_data = [
+            ["Serial No", extinguisher["sl_no"]],
+            ["Type", extinguisher["type"]],
+            ["Capacity", extinguisher["capacity"]],
+            ["Location", extinguisher["location"]],
+            ["Make", extinguisher["make"] or "-"],
+            ["Mfg Year", str(extinguisher["year_of_manufacture"]) or "-"],
+        ]
+        ext_table = Table(ext_data, colWidths=[150, 300])
+        ext_table.setStyle(TableStyle([
+            ('GRID', (0,0), (-1,-1), 1, colors.black),
+        ]))
+        story.append(ext_table)
+    else:
+        story.append(Paragraph("Extinguisher details not found (deleted?)", styles['Normal']))
+
+    story.append(Spacer(1, 12))
+
+    # Inspection Checklist
+    story.append(Paragraph("Checklist & Observations", styles['Heading2']))
+
+    obs_data = [
+         ["Observation", inspection["observation"]],
+         ["Remarks", inspection["remarks"] or "-"],
+         ["Pressure Tested On", inspection["pressure_tested_on"] or "-"],
+         ["Hydro Test Due", inspection["next_hydro_pressure_test_due"] or "-"],
+         ["Refilled On", inspection["refilled_on"] or "-"],
+    ]
+
+    obs_table = Table(obs_data, colWidths=[150, 300])
+    obs_table.setStyle(TableStyle([
+        ('GRID', (0,0), (-1,-1), 1, colors.black),
+    ]))
+    story.append(obs_table)
+    story.append(Spacer(1, 12))
+
+    # Images
+    story.append(Paragraph("Inspection Photo", styles['Heading2']))
+    photo = inspection["photo_path"]
+    if photo:
+        try:
+            flowable = _image_flowable(photo)
+        except Exception as e:
+            flowable = None
+            print(f"Error loading image {photo}: {e}")
+        if flowable:
+            story.append(flowable)
+        elif is_remote(photo):
+            complete = False
+            story.append(Paragraph(f"Error loading image from URL: {photo}", styles['Normal']))
+        else:
+            complete = False
+            story.append(Paragraph(f"Image not found locally: {photo}", styles['Normal']))
+    else:
+        story.append(Paragraph("No photo available.", styles['Normal']))
+
+    story.append(Spacer(1, 12))
+
+    # Signature
+    signature = inspection["signature_path"]
+    if signature:
+        story.append(Paragraph("Signature", styles['Heading2']))
+        if is_remote(signature):
+            flowable = _image_flowable(signature, "signature")
+            if flowable:
+                story.append(flowable)
+            else:
+                complete = False
+
+    doc.build(story)
+    return buffer.getvalue(), complete
+
+
+def _init_worker():
+    # Pay the reportlab import and stylesheet build once per worker, not per report
+    get_pdf_styles()
+    import reportlab.platypus  # noqa: F401
+
+
+def _ping(_=None) -> int:
+    return os.getpid()
+
+
+# --- Render pool -------------------------------------------------------------
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_render_pool() -> Optional[ProcessPoolExecutor]:
+    """
+    The shared render pool, started on first use. None when PDF_RENDER_WORKERS=0 (render in a thread).
+    """
+    global _pool
+    if PDF_RENDER_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            # spawn: no forked copies of the server's threads, locks or DB connections
+            _pool = ProcessPoolExecutor(
+                max_workers=PDF_RENDER_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        return _pool
+
+
+def warm_render_pool():
+    """
+    Start the pool workers ahead of the first download (STARTUP_WARM_PDF_POOL, see startup.py).
+    """
+    pool = get_render_pool()
+    if pool is not None:
+        list(pool.map(_ping, range(PDF_RENDER_WORKERS)))
+
+
+def shutdown_render_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+# --- Disk cache --------------------------------------------------------------
+
+def report_file(digest: str, complete: bool = True) -> str:
+    # Incomplete renders get a scratch name that lookups by digest never find
+    return f"{digest}.pdf" if complete else f"{digest}{INCOMPLETE_SUFFIX}"
+
+
+def is_complete(path: str) -> bool:
+    """
+    False for a report rendered without its photo/signature: serve it, but don't let clients cache it.
+    """
+    return not path.endswith(INCOMPLETE_SUFFIX)
+
+
+pdf_cache = DiskCache("pdf_reports", PDF_CACHE_DIR, PDF_CACHE_MAX_BYTES)
+_inflight: Dict[str, asyncio.Future] = {}
+
+
+async def get_or_render(data: dict, digest: Optional[str] = None) -> str:
+    """
+    Path of the cached PDF for this report data, rendering it on the pool if needed.
+    Concurrent requests for the same report share one render. A render missing an image
+    is returned under its scratch name (see is_complete) and rendered again next time.
+    """
+    digest = digest or report_digest(data)
+    path = pdf_cache.get(report_file(digest))
+    if path:
+        return path
+
+    pending = _inflight.get(digest)
+    if pending is not None:
+        try:
+            return await asyncio.shield(pending)
+        except asyncio.CancelledError:
+            if not pending.cancelled():
+                raise # We were cancelled ourselves
+            return await get_or_render(data, digest) # Whoever started it gave up (audit pack disconnect)
+
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    _inflight[digest] = future
+    try:
+        try:
+            content, complete = await loop.run_in_executor(get_render_pool(), render_report, data)
+        except BrokenProcessPool:
+            # A worker died (OOM, killed): start a fresh pool next time, render this one here
+            print("PDF render pool broke, restarting it")
+            shutdown_render_pool()
+            content, complete = await loop.run_in_executor(None, render_report, data)
+        path = await loop.run_in_executor(None, pdf_cache.put, report_file(digest, complete), content)
+        future.set_result(path)
+        return path
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except BaseException as e:
+        future.set_exception(e)
+        future.exception() # Mark retrieved; waiters (if any) re-raise it
+        raise
+    finally:
+        del _inflight[digest]
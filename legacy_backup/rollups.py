@@ -0,0 +1,171 @@
+"""
+Daily inspection rollup used by /inspections/stats.
+
+Counts are kept per (local day, inspection_type, observation, location), where
+the local day is taken in CompanySettings.timezone. create_inspection bumps the
+matching row in the same transaction as the inspection insert, so the stats
+endpoint only ever reads a handful of pre-aggregated rows.
+
+If the rollup is lost or the company timezone changes, rebuild it with:
+
+    python rollups.py rebuild
+"""
+from collections import Counter
+from datetime import datetime, date, timezone
+from typing import List, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from sqlalchemy import func, delete, insert, update
+from sqlmodel import Session, select
+from models import Inspection, Extinguisher, CompanySettings, InspectionDailyStat
+
+DEFAULT_TIMEZONE = "Asia/Kolkata"
+
+
+def get_company_timezone(session: Session) -> ZoneInfo:
+    settings = session.get(CompanySettings, 1)
+    tz_name = settings.timezone if settings and settings.timezone else DEFAULT_TIMEZONE
+    try:
+        return ZoneInfo(tz_name)
+    except (ZoneInfoNotFoundError, ValueError):
+        print(f"Unknown company timezone '{tz_name}', falling back to UTC")
+        return ZoneInfo("UTC")
+
+
+def local_day(moment: datetime, tz: ZoneInfo) -> date:
+    """
+    Calendar day of a naive-UTC timestamp (as stored in the DB) in the given timezone.
+    """
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(tz).date()
+
+
+def _bump(session: Session, key: dict, count: int):
+    table = InspectionDailyStat.__table__
+    dialect = session.get_bind().dialect.name
+
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as upsert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as upsert
+        statement = upsert(table).values(**key, count=count).on_conflict_do_update(
+            index_elements=list(key.keys()),
+            set_={"count": table.c.count + count},
+        )
+        session.exec(statement)
+        return
+
+    # Generic fallback: increment, insert if nothing was there yet
+    result = session.exec(
+        update(table)
+        .where(*[table.c[name] == value for name, value in key.items()])
+        .values(count=table.c.count + count)
+    )
+    if result.rowcount == 0:
+        session.exec(insert(table).values(**key, count=count))
+
+
+def _rollup_key(inspection: Inspection, location: str, tz: ZoneInfo) -> tuple:
+    return (
+        local_day(inspection.inspection_date, tz),
+        inspection.inspection_type,
+        inspection.observation or "",
+        location or "",
+    )
+
+
+def record_inspection(session: Session, inspection: Inspection, location: str, tz: ZoneInfo):
+    """
+    Add one inspection to the rollup. Runs inside the caller's transaction; nothing is committed here.
+    """
+    record_inspections(session, [(inspection, location)], tz)
+
+
+def record_inspections(session: Session, entries: List[Tuple[Inspection, str]], tz: ZoneInfo):
+    """
+    Add many (inspection, location) pairs to the rollup, one upsert per distinct rollup row.
+    Runs inside the caller's transaction; nothing is committed here.
+    """
+    counts = Counter(_rollup_key(inspection, location, tz) for inspection, location in entries)
+    for (day, inspection_type, observation, location), count in counts.items():
+        _bump(session, {
+            "day": day,
+            "inspection_type": inspection_type,
+            "observation": observation,
+            "location": location,
+        }, count)
+
+
+def _local_day_expression(dialect: str, tz: ZoneInfo):
+    """
+    SQL expression that maps inspection_date (naive UTC) to the local calendar day.
+    """
+    if dialect == "postgresql":
+        return func.date(func.timezone(str(tz), func.timezone("UTC", Inspection.inspection_date)))
+
+    # SQLite has no timezone database: shift by the zone's current UTC offset.
+    # Exact for zones without DST (e.g. Asia/Kolkata); DST zones may misplace
+    # inspections made within an hour of midnight around the changeover.
+    offset = datetime.now(tz).utcoffset()
+    minutes = int(offset.total_seconds() // 60) if offset else 0
+    return func.date(Inspection.inspection_date, f"{minutes:+d} minutes")
+
+
+def rebuild_daily_rollup(session: Session) -> int:
+    """
+    Recompute the whole rollup with one GROUP BY over inspection. Returns the number of rollup rows.
+    The caller commits.
+    """
+    tz = get_company_timezone(session)
+    dialect = session.get_bind().dialect.name
+    day = _local_day_expression(dialect, tz)
+    observation = func.coalesce(Inspection.observation, "")
+    location = func.coalesce(Extinguisher.location, "")
+
+    grouped = (
+        select(day, Inspection.inspection_type, observation, location, func.count())
+        .select_from(Inspection)
+        .join(Extinguisher, Inspection.extinguisher_id == Extinguisher.id, isouter=True)
+        .group_by(day, Inspection.inspection_type, observation, location)
+    )
+
+    table = InspectionDailyStat.__table__
+    session.exec(delete(table))
+    session.exec(
+        insert(table).from_select(
+            ["day", "inspection_type", "observation", "location", "count"],
+            grouped,
+        )
+    )
+    return session.exec(select(func.count()).select_from(table)).one()
+
+
+def daily_counts(session: Session, start_day: date, end_day: date) -> dict:
+    """
+    Total inspections per local day in [start_day, end_day].
+    """
+    statement = (
+        select(InspectionDailyStat.day, func.sum(InspectionDailyStat.count))
+        .where(InspectionDailyStat.day >= start_day, InspectionDailyStat.day <= end_day)
+        .group_by(InspectionDailyStat.day)
+    )
+    counts = {}
+    for day, total in session.exec(statement).all():
+        counts[day] = int(total or 0)
+    return counts
+
+
+if __name__ == "__main__":
+    import sys
+    from database import engine, init_db
+
+    if len(sys.argv) < 2 or sys.argv[1] != "rebuild":
+        print("Usage: python rollups.py rebuild")
+        sys.exit(1)
+
+    init_db()
+    with Session(engine) as session:
+        rows = rebuild_daily_rollup(session)
+        session.commit()
+    print(f"Rollup rebuilt: {rows} rows.")
@@ -1,9 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlmodel import Session, select
-from database import get_session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from database import get_session, get_async_session
 from models import User, PasswordResetToken
-from auth import verify_password, create_access_token, get_current_user, get_password_hash
+from auth import verify_password_async, get_password_hash_async, password_needs_rehash, create_access_token, get_current_user, get_password_hash, token_claims, revoke_user_tokens, remember_user_state
 from pydantic import BaseModel
 import uuid
 from datetime import datetime, timedelta
@@ -20,12 +21,12 @@ class ResetPasswordRequest(BaseModel):
 @router.post("/token")
 async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     # Fetch user
     print(f"Login attempt for: {form_data.username}")
     statement = select(User).where(User.username == form_data.username)
-    user = session.exec(statement).first()
+    user = (await session.exec(statement)).first()
     
     if not user:
         print("User not found")
@@ -36,18 +37,23 @@ async def login_for_access_token(
         )
         
     print(f"User found: {user.username}, Role: {user.role}")
-    if not verify_password(form_data.password, user.password_hash):
+    # bcrypt runs on the hashing pool so the event loop keeps serving other requests
+    if not await verify_password_async(form_data.password, user.password_hash):
         print("Password mismatch")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+    # Transparently move the stored hash to the current BCRYPT_ROUNDS
+    if password_needs_rehash(user.password_hash):
+        user.password_hash = await get_password_hash_async(form_data.password)
+        session.add(user)
+        await session.commit()
         
     # Create token
-    access_token = create_access_token(
-        data={"sub": user.username, "role": user.role}
-    )
+    access_token = create_access_token(data=token_claims(user))
     
     return {"access_token": access_token, "token_type": "bearer"}
 
@@ -129,6 +135,7 @@ def reset_password(
         raise HTTPException(status_code=404, detail="User associated with token not found")
         
     user.password_hash = get_password_hash(request.new_password)
+    revoke_user_tokens(user)
     session.add(user)
     
     # 4. Invalidate Token
@@ -136,5 +143,6 @@ def reset_password(
     session.add(token_record)
     
     session.commit()
+    remember_user_state(user)
     
     return {"status": "success", "message": "Password updated successfully"}
@@ -0,0 +1,119 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlmodel import Session, select
+from sqlalchemy import and_, case, func, or_
+from database import get_session
+from models import Extinguisher
+from compliance import obligations
+from utils import encode_cursor, decode_cursor
+from datetime import datetime, timedelta
+from typing import Optional
+import uuid
+
+router = APIRouter(prefix="/compliance", tags=["compliance"])
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+def due_page(session: Session, response: Response, after: Optional[datetime], before: datetime,
+             location: Optional[str], limit: int, cursor: Optional[str]) -> list:
+    """
+    Active assets with compliance_due in [after, before), earliest first, keyset-paginated
+    on (compliance_due, id) with the next cursor in X-Next-Cursor. One range scan on
+    ix_extinguisher_active_compliance_due (or the location variant).
+    """
+    statement = select(Extinguisher).where(Extinguisher.is_active == True, Extinguisher.compliance_due < before)
+    if after is not None:
+        statement = statement.where(Extinguisher.compliance_due >= after)
+    else:
+        statement = statement.where(Extinguisher.compliance_due.is_not(None))
+    if location:
+        statement = statement.where(Extinguisher.location == location)
+    if cursor:
+        try:
+            due_raw, id_raw = decode_cursor(cursor)
+            after_due, after_id = datetime.fromisoformat(due_raw), uuid.UUID(id_raw)
+        except HTTPException:
+            raise
+        except Exception:
+            raise HTTPException(status_code=400, detail="Invalid cursor.")
+        statement = statement.where(or_(
+            Extinguisher.compliance_due > after_due,
+            and_(Extinguisher.compliance_due == after_due, Extinguisher.id > after_id),
+        ))
+
+    rows = session.exec(
+        statement.order_by(Extinguisher.compliance_due, Extinguisher.id).limit(limit + 1)
+    ).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor([rows[-1].compliance_due, rows[-1].id])
+
+    return [
+        {
+            "id": e.id,
+            "sl_no": e.sl_no,
+            "type": e.type,
+            "location": e.location,
+            "status": e.status,
+            "compliance_due": e.compliance_due,
+            "obligations": obligations(e, before),
+        }
+        for e in rows
+    ]
+
+@router.get("/due")
+def due_soon(
+    response: Response,
+    days: int = Query(30, ge=1, le=366),
+    location: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    session: Session = Depends(get_session)
+):
+    """
+    Assets with an obligation (inspection, maintenance, hydro test, refill, replacement)
+    falling due in the next `days` days, soonest first. Overdue ones are under /overdue.
+    """
+    now = datetime.utcnow()
+    return due_page(session, response, now, now + timedelta(days=days), location, limit, cursor)
+
+@router.get("/overdue")
+def overdue(
+    response: Response,
+    location: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    session: Session = Depends(get_session)
+):
+    """
+    Assets with at least one obligation past due, most overdue first.
+    """
+    return due_page(session, response, None, datetime.utcnow(), location, limit, cursor)
+
+@router.get("/summary")
+def summary_by_location(
+    days: int = Query(30, ge=1, le=366),
+    session: Session = Depends(get_session)
+):
+    """
+    Overdue and due-soon counts per location, in one grouped query over the index.
+    """
+    now = datetime.utcnow()
+    soon = now + timedelta(days=days)
+    rows = session.exec(
+        select(
+            Extinguisher.location,
+            func.sum(case((Extinguisher.compliance_due < now, 1), else_=0)),
+            func.sum(case((Extinguisher.compliance_due >= now, 1), else_=0)),
+        )
+        .where(Extinguisher.is_active == True, Extinguisher.compliance_due < soon)
+        .group_by(Extinguisher.location)
+        .order_by(Extinguisher.location)
+    ).all()
+    return {
+        "days": days,
+        "locations": [
+            {"location": location, "overdue": int(overdue or 0), "due_soon": int(due or 0)}
+            for location, overdue, due in rows
+        ],
+    }
@@ -0,0 +1,44 @@
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, status
+from auth import get_current_user
+from events import broadcaster
+import asyncio
+
+router = APIRouter(tags=["dashboard"])
+
+@router.websocket("/ws/dashboard")
+async def dashboard_events(websocket: WebSocket, token: str = ""):
+    """
+    Live dashboard updates (see events.py). Browsers can't set headers on a WebSocket,
+    so the access token comes as ?token=. Messages are JSON objects with a "type":
+    inspection.created, inspections.synced, extinguisher.created,
+    extinguisher.status_changed, extinguisher.deleted, events.dropped.
+    """
+    try:
+        await get_current_user(token)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    subscriber = broadcaster.subscribe()
+
+    async def send():
+        while True:
+            await websocket.send_text(await subscriber.next())
+
+    async def receive():
+        # Nothing is expected from the client; this notices when it goes away
+        try:
+            while True:
+                await websocket.receive_text()
+        except WebSocketDisconnect:
+            pass
+
+    tasks = [asyncio.create_task(send()), asyncio.create_task(receive())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        broadcaster.unsubscribe(subscriber)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -1,19 +1,166 @@
-from fastapi import APIRouter, Depends, HTTPException, Header
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Response
+from fastapi.responses import JSONResponse
 from sqlmodel import Session, select
+from sqlalchemy import func, or_, and_
 from sqlalchemy.orm import selectinload
-from database import get_session
-from models import Extinguisher, User, Inspection, ExtinguisherRead, ExtinguisherCreate
+from sqlmodel.ext.asyncio.session import AsyncSession
+from database import get_session, get_async_session
+from models import Extinguisher, User, Inspection, ExtinguisherRead, ExtinguisherCreate, ExtinguisherSummary, InspectionSummary
+from utils import encode_cursor, decode_cursor, normalize_serial
+from lookups import resolve_extinguisher, resolve_codes
+from extinguisher_state import recent_ids
+from cache import scan_cache, scan_cache_key, invalidate_scan
 from auth import oauth2_scheme, SECRET_KEY, ALGORITHM, get_current_user
 from jose import jwt, JWTError
 from datetime import datetime, timedelta
 from typing import List, Optional
+from pydantic import BaseModel, Field
+import uuid
+import events
+import compliance
 
 router = APIRouter(prefix="/extinguishers", tags=["extinguishers"])
 
-@router.get("/", response_model=List[ExtinguisherRead])
-def list_extinguishers(session: Session = Depends(get_session)):
-    extinguishers = session.exec(select(Extinguisher).where(Extinguisher.is_active == True).options(selectinload(Extinguisher.inspections)).order_by(Extinguisher.created_at.desc())).all()
-    return extinguishers
+LIST_VIEWS = ("full", "summary")
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+@router.get("/")
+def list_extinguishers(
+    response: Response,
+    view: str = "full",
+    fields: Optional[str] = None,
+    status: Optional[str] = None,
+    location: Optional[str] = None,
+    type_: Optional[str] = Query(None, alias="type"),
+    due_after: Optional[datetime] = None,
+    due_before: Optional[datetime] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    session: Session = Depends(get_session)
+):
+    """
+    List active extinguishers, newest first.
+
+    Without `limit`/`cursor` the whole list is returned (legacy dashboard behaviour).
+    With either, results are keyset-paginated on (created_at, id) and the cursor for
+    the next page comes back in the `X-Next-Cursor` header.
+    `view=summary` swaps the inspection history for `latest_inspection`, and
+    `fields=a,b,c` trims each item down to the named columns.
+    """
+    if view not in LIST_VIEWS:
+        raise HTTPException(status_code=400, detail=f"view must be one of {', '.join(LIST_VIEWS)}")
+
+    item_model = ExtinguisherSummary if view == "summary" else ExtinguisherRead
+    include = None
+    if fields:
+        include = {f.strip() for f in fields.split(",") if f.strip()}
+        unknown = include - set(item_model.model_fields)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+        include.add("id")
+
+    statement = select(Extinguisher).where(Extinguisher.is_active == True)
+
+    # Server-side filters (each backed by an index on extinguisher)
+    if status:
+        statement = statement.where(Extinguisher.status == status)
+    if location:
+        statement = statement.where(Extinguisher.location == location)
+    if type_:
+        statement = statement.where(Extinguisher.type == type_)
+    if due_after:
+        statement = statement.where(Extinguisher.next_service_due >= due_after)
+    if due_before:
+        statement = statement.where(Extinguisher.next_service_due < due_before)
+
+    paginate = limit is not None or cursor is not None
+    if cursor:
+        try:
+            created_at_raw, id_raw = decode_cursor(cursor)
+            after_created_at = datetime.fromisoformat(created_at_raw)
+            after_id = uuid.UUID(id_raw)
+        except HTTPException:
+            raise
+        except Exception:
+            raise HTTPException(status_code=400, detail="Invalid cursor.")
+        statement = statement.where(or_(
+            Extinguisher.created_at < after_created_at,
+            and_(Extinguisher.created_at == after_created_at, Extinguisher.id < after_id),
+        ))
+
+    statement = statement.order_by(Extinguisher.created_at.desc(), Extinguisher.id.desc())
+
+    # The full history is only loaded when the caller actually asked for it
+    wants_history = view == "full" and (include is None or "inspections" in include)
+    if wants_history:
+        statement = statement.options(selectinload(Extinguisher.inspections))
+
+    page_size = limit or DEFAULT_PAGE_SIZE
+    if paginate:
+        statement = statement.limit(page_size + 1)
+
+    extinguishers = session.exec(statement).all()
+
+    if paginate and len(extinguishers) > page_size:
+        extinguishers = extinguishers[:page_size]
+        last = extinguishers[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor([last.created_at, last.id])
+
+    if view == "summary":
+        latest = get_latest_inspections(session, [e.id for e in extinguishers])
+        items = [
+            ExtinguisherSummary.model_validate(e, update={"latest_inspection": latest.get(e.id)})
+            for e in extinguishers
+        ]
+    elif wants_history:
+        items = [ExtinguisherRead.model_validate(e) for e in extinguishers]
+    else:
+        items = [ExtinguisherRead.model_validate(e, update={"inspections": []}) for e in extinguishers]
+
+    if include is not None:
+        return [item.model_dump(include=include) for item in items]
+    return items
+
+
+def get_latest_inspections(session: Session, extinguisher_ids: list) -> dict:
+    """
+    Latest inspection per extinguisher for one page of ids, in a single windowed query.
+    """
+    if not extinguisher_ids:
+        return {}
+
+    ranked = (
+        select(
+            Inspection.id,
+            Inspection.extinguisher_id,
+            Inspection.inspection_type,
+            Inspection.inspection_date,
+            Inspection.observation,
+            func.row_number().over(
+                partition_by=Inspection.extinguisher_id,
+                order_by=Inspection.inspection_date.desc()
+            ).label("rn"),
+        )
+        .where(Inspection.extinguisher_id.in_(extinguisher_ids))
+        .subquery()
+    )
+    rows = session.exec(
+        select(
+            ranked.c.id, ranked.c.extinguisher_id, ranked.c.inspection_type,
+            ranked.c.inspection_date, ranked.c.observation,
+        ).where(ranked.c.rn == 1)
+    ).all()
+
+    return {
+        row.extinguisher_id: InspectionSummary(
+            id=row.id,
+            inspection_type=row.inspection_type,
+            inspection_date=row.inspection_date,
+            observation=row.observation,
+        )
+        for row in rows
+    }
 
 
 def get_optional_user_from_token(token: Optional[str]) -> Optional[str]:
@@ -48,8 +195,10 @@ def create_extinguisher(
     if user.role != "admin":
         raise HTTPException(status_code=403, detail="Admin privileges required")
     
-    # Check for duplicate SL No
-    existing = session.exec(select(Extinguisher).where(Extinguisher.sl_no == extinguisher_data.sl_no)).first()
+    # Check for duplicate SL No (also catches the same serial spelled differently)
+    existing = session.exec(
+        select(Extinguisher).where(Extinguisher.sl_no_normalized == normalize_serial(extinguisher_data.sl_no))
+    ).first()
     if existing:
         raise HTTPException(status_code=400, detail="Serial Number already exists")
     
@@ -64,70 +213,135 @@ def create_extinguisher(
     # So it must be a full URL.
     # For dev: http://localhost:3000
     extinguisher.qr_code_url = f"/extinguisher/{extinguisher.id}"
+    compliance.apply_asset(extinguisher) # First hydro test, maintenance and end-of-life dates
     
     session.add(extinguisher)
     session.commit()
     session.refresh(extinguisher)
+    # A scan of this serial may have been cached as "not found"
+    invalidate_scan(extinguisher)
+    events.publish("extinguisher.created", id=extinguisher.id, sl_no=extinguisher.sl_no,
+                   location=extinguisher.location, status=extinguisher.status)
     return extinguisher
 
-@router.get("/{id}")
-def get_extinguisher(
-    id: str, 
-    authorization: Optional[str] = Header(None),
-    session: Session = Depends(get_session)
-):
-    import logging
-    print(f"DEBUG: get_extinguisher called for ID: {id}")
-    
-    # --- RESTORED LOGIC WITH SAFETY GUARDS ---
-    # We now know connection is good. 
-    # We try to fetch everything, but catch specific subsystem failures.
+def load_scan_payload(session: Session, id: str):
+    """
+    Resolve a scanned identifier and build the user-independent part of the scan response.
+    Returns the payload dict, or a 404 detail string if there is no such (active) extinguisher.
+    """
+    # 1. Fetch Extinguisher (Critical - must succeed): one indexed query, UUID or any serial spelling
+    extinguisher = resolve_extinguisher(session, id)
+         
+    if not extinguisher:
+        return "Extinguisher not found"
     
-    import logging
-    # logging.basicConfig(level=logging.INFO) # Already set globally usually
-    # logger = logging.getLogger(__name__)
+    if not extinguisher.is_active:
+         return "Extinguisher not found (Deleted)"
 
-    ext_uuid = None
-    try:
-        from uuid import UUID
-        ext_uuid = UUID(id)
-    except ValueError:
-        pass
+    last_inspection_at = None
+    last_inspector_name = "N/A"
+    next_due_date = extinguisher.next_service_due
+    history_error = None
 
-    # 1. Fetch Extinguisher (Critical - must succeed)
+    # 2. History (Semi-critical - fails gracefully)
+    # Current state is denormalized onto the extinguisher; only the recent ring needs a query
+    recent_inspections = []
     try:
-        if ext_uuid:
-            extinguisher = session.get(Extinguisher, ext_uuid)
-        else:
-            extinguisher = session.exec(select(Extinguisher).where(Extinguisher.sl_no == id.strip())).first()
-            if not extinguisher:
-                 extinguisher = session.exec(select(Extinguisher).where(Extinguisher.sl_no == id.strip().upper())).first()
-
-        if not extinguisher:
-             # Try fallback to string ID if UUID failed earlier but it really was a string ID in DB (rare)
-             extinguisher = session.exec(select(Extinguisher).where(Extinguisher.id == id)).first()
-             
-        if not extinguisher:
-            return JSONResponse(status_code=404, content={"detail": "Extinguisher not found"})
-        
-        # Ensure we have the UUID
-        ext_uuid = extinguisher.id
-        
-        if not extinguisher.is_active:
-             return JSONResponse(status_code=404, content={"detail": "Extinguisher not found (Deleted)"})
+        if extinguisher.last_inspection_id:
+            last_inspection_at = extinguisher.last_inspection_date
+            if extinguisher.last_inspector_name:
+                last_inspector_name = extinguisher.last_inspector_name
+            
+            # Update Next Due Date logic
+            if extinguisher.last_due_for_refilling:
+                next_due_date = extinguisher.last_due_for_refilling
+            
+            # Populate recent inspections for Admin View
+            ring = recent_ids(extinguisher)
+            if ring:
+                results = session.exec(
+                    select(Inspection).where(Inspection.id.in_(ring)).order_by(Inspection.inspection_date.desc())
+                ).all()
+                for insp in results:
+                    recent_inspections.append({
+                        "id": str(insp.id),
+                        "date": insp.inspection_date,
+                        "type": insp.inspection_type,
+                        "status": insp.observation,
+                        "inspector": "System" # Placeholder, could fetch names if needed heavily
+                    })
 
     except Exception as e:
-        print(f"CRASH in Extinguisher Fetch: {e}")
-        return JSONResponse(status_code=500, content={"detail": f"Database Error: {str(e)}"})
+        print(f"Inspection History Failed: {e}")
+        history_error = f"History Error: {str(e)}"
+
+    return {
+        **extinguisher.model_dump(exclude={"recent_inspection_ids"}),
+        "id": str(extinguisher.id), # Ensure ID is string
+        "last_inspection_date": last_inspection_at,
+        "last_inspector_name": last_inspector_name,
+        "last_inspection_status": extinguisher.status,
+        "next_service_due": next_due_date,
+        "recent_inspections": recent_inspections,
+        "history_error": history_error,
+    }
+
+class ResolveRequest(BaseModel):
+    codes: List[str] = Field(..., max_length=1000)
+
+@router.post("/resolve")
+def resolve_scanned_codes(
+    request: ResolveRequest,
+    user: User = Depends(get_current_user),
+    session: Session = Depends(get_session)
+):
+    """
+    Map a batch of scanned codes (UUIDs or serials in any spelling) to active asset ids
+    in one query. Unknown codes map to null.
+    """
+    resolved = resolve_codes(session, request.codes)
+    return {
+        "results": {
+            code: str(resolved[code].id) if code in resolved else None
+            for code in request.codes
+        }
+    }
+
+@router.get("/{id}")
+async def get_extinguisher(
+    id: str, 
+    authorization: Optional[str] = Header(None),
+    session: AsyncSession = Depends(get_async_session)
+):
+    # Scans repeat a lot during walk-rounds: serve the resolved asset from the scan cache.
+    # create/delete extinguisher and create_inspection invalidate it explicitly.
+    cache_key = scan_cache_key(id)
+    found, payload = scan_cache.get(cache_key)
+    if not found:
+        try:
+            # Cache hits never touch the database; misses run the sync loader without blocking the loop
+            payload = await session.run_sync(load_scan_payload, id)
+        except Exception as e:
+            print(f"CRASH in Extinguisher Fetch: {e}")
+            return JSONResponse(status_code=500, content={"detail": f"Database Error: {str(e)}"})
+
+        # Partial results (history failed) are not worth caching
+        if isinstance(payload, str) or not payload["history_error"]:
+            scan_cache.set(cache_key, payload)
+            if not isinstance(payload, str):
+                # Alias the canonical id so serial and UUID scans share the entry
+                scan_cache.set(scan_cache_key(payload["id"]), payload)
+
+    if isinstance(payload, str):
+        return JSONResponse(status_code=404, content={"detail": payload})
 
     mode = "VIEW"
     debug_info = []
-    last_inspection = None
-    last_inspection_at = None
-    last_inspector_name = "N/A"
-    next_due_date = extinguisher.next_service_due
+    if payload["history_error"]:
+        debug_info.append(payload["history_error"])
+    last_inspection_at = payload["last_inspection_date"]
 
-    # 2. Get User (Optional - Non-critical)
+    # Get User (Optional - Non-critical)
     user = None
     try:
         user = get_optional_user_from_token(authorization)
@@ -135,44 +349,7 @@ def get_extinguisher(
     except Exception as e:
         debug_info.append(f"Auth Parse Error: {e}")
 
-    # 3. Fetch History (Semi-critical - fails gracefully)
-    recent_inspections = []
-    try:
-        statement = select(Inspection).where(Inspection.extinguisher_id == ext_uuid).order_by(Inspection.inspection_date.desc())
-        results = session.exec(statement).all()
-        
-        if results:
-            last_inspection = results[0]
-            last_inspection_at = last_inspection.inspection_date
-            
-            # Update Next Due Date logic
-            if last_inspection.due_for_refilling:
-                next_due_date = last_inspection.due_for_refilling
-            
-            # Try fetch inspector name
-            if last_inspection.inspector_id:
-                 try:
-                    inspector_user = session.get(User, last_inspection.inspector_id)
-                    if inspector_user:
-                        last_inspector_name = inspector_user.username
-                 except:
-                    pass
-            
-            # Populate recent inspections for Admin View
-            for insp in results[:10]: # Limit to 10
-                recent_inspections.append({
-                    "id": str(insp.id),
-                    "date": insp.inspection_date,
-                    "type": insp.inspection_type,
-                    "status": insp.status,
-                    "inspector": "System" # Placeholder, could fetch names if needed heavily
-                })
-
-    except Exception as e:
-        print(f"Inspection History Failed: {e}")
-        debug_info.append(f"History Error: {str(e)}")
-
-    # 4. Logic: Locking (Depends on History)
+    # Logic: Locking (Depends on History)
     try:
         if user:
              # Inspector is viewing
@@ -195,17 +372,10 @@ def get_extinguisher(
         debug_info.append(f"Lock Logic Error: {e}")
         mode = "EDIT"
 
-    return {
-        **extinguisher.model_dump(),
-        "id": str(extinguisher.id), # Ensure ID is string
-        "mode": mode,
-        "last_inspection_date": last_inspection_at,
-        "last_inspector_name": last_inspector_name,
-        "last_inspection_status": extinguisher.status,
-        "next_service_due": next_due_date,
-        "recent_inspections": recent_inspections,
-        "debug_info": debug_info
-    }
+    response = {key: value for key, value in payload.items() if key != "history_error"}
+    response["mode"] = mode
+    response["debug_info"] = debug_info
+    return response
 
 @router.delete("/{id}")
 def delete_extinguisher(
@@ -231,6 +401,8 @@ def delete_extinguisher(
     extinguisher.is_active = False
     session.add(extinguisher)
     session.commit()
+    invalidate_scan(extinguisher)
+    events.publish("extinguisher.deleted", id=extinguisher.id, sl_no=extinguisher.sl_no)
     return {"ok": True, "detail": "Extinguisher deleted successfully"}
 
 
@@ -1,11 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Request, Response
+from fastapi.responses import StreamingResponse, FileResponse
 from sqlmodel import Session, select
-from database import get_session
+from sqlalchemy.exc import IntegrityError
+from sqlmodel.ext.asyncio.session import AsyncSession
+from database import get_session, get_async_session, engine
 from models import Inspection, Extinguisher, User
 from auth import get_current_user
-from datetime import datetime, timedelta
-from pydantic import BaseModel
-from typing import Optional, List
+from rollups import get_company_timezone, daily_counts, record_inspection, record_inspections
+from extinguisher_state import apply_inspection
+from cache import invalidate_scan
+from lookups import resolve_extinguisher, resolve_codes, lock_extinguishers
+import idempotency
+import uploads
+import events
+import compliance
+import analytics_export
+from pdf_reports import load_report_data, report_digest, get_or_render, is_complete
+from audit_pack import audit_pack_ids, stream_zip, stream_merged_pdf, safe_name, AUDIT_PACK_MAX_REPORTS, AUDIT_PACK_MAX_MERGED
+from datetime import datetime, timedelta, timezone
+from pydantic import BaseModel, Field
+from typing import Optional, List, Tuple
+from io import StringIO
+import csv
+import uuid
+import zlib
 
 router = APIRouter(prefix="/inspections", tags=["inspections"])
 
@@ -26,61 +44,47 @@ class InspectionCreate(BaseModel):
     image_urls: Optional[List[str]] = None # Just in case frontend sends it
     device_id: Optional[str] = None
 
+MAX_BATCH_SIZE = 500
+CLOCK_SKEW = timedelta(minutes=5) # Device clocks run a little ahead; further than this is an error
+
+class BatchInspectionItem(InspectionCreate):
+    client_uuid: uuid.UUID # Generated on the device when the inspection is recorded
+    inspection_date: Optional[datetime] = None # When it was recorded; the sync time if missing
+
+class InspectionBatch(BaseModel):
+    device_id: Optional[str] = None # Default for items that don't carry their own
+    inspections: List[BatchInspectionItem] = Field(..., max_length=MAX_BATCH_SIZE)
+
 @router.get("/stats")
-def get_stats(session: Session = Depends(get_session)):
+async def get_stats(
+    days: int = Query(7, ge=1, le=30),
+    session: AsyncSession = Depends(get_async_session)
+):
     """
-    Get inspection counts for the last 7 days.
+    Get inspection counts for the last `days` days (default 7), in the company timezone,
+    compared against the period before it. Reads from the daily rollup, not from inspection.
     """
-    from sqlalchemy import func, cast, Date
-    
-    end_date = datetime.utcnow()
-    start_date = end_date - timedelta(days=6) # Last 7 days including today
-    
-    # SQLite/Postgres compatibility for date truncating can be tricky with plain SQLModel
-    # For simplicity and DB agnostic behavior with small datasets:
-    # Query all inspections in last 7 days and aggregate in Python.
-    # (Optimized approach would use group_by in SQL if DB is strictly Postgres)
-    
-    statement = select(Inspection).where(Inspection.inspection_date >= start_date)
-    recent_inspections = session.exec(statement).all()
-    
-    # Initialize dictionary for last 7 days
-    stats = {}
-    for i in range(7):
-        day = (start_date + timedelta(days=i)).strftime("%a") # Mon, Tue
-        # stats[day] = 0 # If we want strict days, but we want strict ordered list
-    
-    # Better structure: List of {name: "Mon", value: 0}
-    days_map = []
-    for i in range(7):
-        d = start_date + timedelta(days=i)
-        days_map.append({
-            "date": d.date(), 
+    tz = await session.run_sync(get_company_timezone)
+    today = datetime.now(tz).date()
+    start_day = today - timedelta(days=days - 1)
+    previous_start_day = start_day - timedelta(days=days)
+
+    counts = await session.run_sync(daily_counts, previous_start_day, today)
+
+    chart = []
+    for i in range(days):
+        d = start_day + timedelta(days=i)
+        chart.append({
             "name": d.strftime("%a"), # Mon
-            "value": 0
+            "date": d.isoformat(),
+            "value": counts.get(d, 0)
         })
 
-    # Aggregate
-    for insp in recent_inspections:
-        # Use simple date comparison
-        insp_date_str = insp.inspection_date.strftime("%Y-%m-%d")
-        for day in days_map:
-            # day["date"] is a date object
-            if day["date"].strftime("%Y-%m-%d") == insp_date_str:
-                day["value"] += 1
-                break
-                
-    # Calculate Comparison (Previous 7 days)
-    previous_start_date = start_date - timedelta(days=7)
-    previous_period_statement = select(Inspection).where(
-        Inspection.inspection_date >= previous_start_date,
-        Inspection.inspection_date < start_date
+    current_total = sum(point["value"] for point in chart)
+    previous_total = sum(
+        count for day, count in counts.items() if previous_start_day <= day < start_day
     )
-    previous_inspections = session.exec(previous_period_statement).all()
-    
-    current_total = len(recent_inspections)
-    previous_total = len(previous_inspections)
-    
+
     percentage_change = 0.0
     if previous_total > 0:
         percentage_change = ((current_total - previous_total) / previous_total) * 100
@@ -91,225 +95,517 @@ def get_stats(session: Session = Depends(get_session)):
 
     # Return structured data
     return {
-        "chart": [{"name": d["name"], "value": d["value"]} for d in days_map],
+        "chart": chart,
         "total": current_total,
         "change": round(percentage_change, 1),
         "trend": trend,
-        "previous_total": previous_total
+        "previous_total": previous_total,
+        "timezone": str(tz)
     }
 
+EXPORT_CHUNK_ROWS = 500 # CSV rows per streamed chunk
+EXPORT_FETCH_ROWS = 1000 # DB rows per server-side cursor fetch
+
+def iter_csv(header, rows, chunk_rows=EXPORT_CHUNK_ROWS):
+    """
+    Encode rows as CSV text, yielding a chunk every `chunk_rows` rows
+    so only one chunk is ever held in memory.
+    """
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    pending = 0
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= chunk_rows:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+            pending = 0
+    yield buffer.getvalue()
+
+def gzip_chunks(chunks):
+    """
+    Incrementally gzip a stream of text chunks.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) # wbits=31 -> gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
+
+def csv_response(chunks, filename: str, request: Request, gzip: bool):
+    """
+    StreamingResponse for a CSV chunk generator, gzip-encoded when asked for and accepted.
+    """
+    headers = {"Content-Disposition": f"attachment; filename={filename}"}
+    if gzip and "gzip" in request.headers.get("accept-encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+        headers["Vary"] = "Accept-Encoding"
+        chunks = gzip_chunks(chunks)
+    return StreamingResponse(chunks, media_type="text/csv", headers=headers)
+
 @router.get("/export")
-def export_history(session: Session = Depends(get_session)):
+def export_history(
+    request: Request,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    gzip: bool = False,
+    format: str = Query("csv", pattern="^(csv|arrow|parquet)$")
+):
     """
-    Export complete inspection history as CSV.
+    Export inspection history as CSV, newest first.
+
+    Rows are read through a server-side cursor and encoded in chunks while the
+    response is being sent, so memory stays flat regardless of table size.
+    `since`/`until` bound inspection_date for incremental pulls; `gzip=true`
+    compresses the transfer when the client accepts it.
+
+    format=arrow (IPC stream) or format=parquet gives typed, dictionary-encoded
+    columns with asset and inspector details instead (see analytics_export.py);
+    these are compressed already, so `gzip` is ignored.
     """
-    import csv
-    from io import StringIO
-    from fastapi.responses import StreamingResponse
-    
-    # Query all inspections with relations
+    if format != "csv":
+        if not analytics_export.available():
+            raise HTTPException(status_code=501, detail="Columnar export needs pyarrow on the server.")
+        media_type, extension = analytics_export.FORMATS[format]
+        filename = f"inspections_{datetime.utcnow().strftime('%Y%m%d')}.{extension}"
+        return StreamingResponse(
+            analytics_export.stream_export(format, since, until),
+            media_type=media_type,
+            headers={"Content-Disposition": f"attachment; filename={filename}"},
+        )
+
     # Explicit join condition needed for User as FK might not be inferred due to optionality or missing relationship def
     statement = (
-        select(Inspection, User, Extinguisher)
+        select(
+            Inspection.inspection_date,
+            User.username,
+            User.id,
+            Inspection.device_id,
+            Inspection.inspection_type,
+            Extinguisher.sl_no,
+            Extinguisher.location,
+            Inspection.observation,
+            Inspection.remarks,
+        )
         .join(User, Inspection.inspector_id == User.id, isouter=True)
         .join(Extinguisher, Inspection.extinguisher_id == Extinguisher.id, isouter=True)
         .order_by(Inspection.inspection_date.desc())
     )
-    results = session.exec(statement).all()
-    
-    # Create CSV in memory
-    output = StringIO()
-    writer = csv.writer(output)
-    
-    # Headers
-    writer.writerow([
+    if since:
+        statement = statement.where(Inspection.inspection_date >= since)
+    if until:
+        statement = statement.where(Inspection.inspection_date < until)
+
+    def rows():
+        # The request-scoped session is gone by the time the body streams, so use our own
+        with Session(engine) as session:
+            result = session.exec(statement.execution_options(yield_per=EXPORT_FETCH_ROWS))
+            for date, username, user_id, device_id, insp_type, sl_no, location, observation, remarks in result:
+                yield [
+                    date.isoformat(),
+                    username or "Unknown",
+                    user_id or "N/A",
+                    device_id or "N/A",
+                    insp_type,
+                    sl_no or "Deleted Asset",
+                    location or "N/A",
+                    observation or "N/A",
+                    remarks or ""
+                ]
+
+    header = [
         "Timestamp (UTC)", "Inspector Name", "Inspector ID", "Device ID",
         "Action (Type)", "Extinguisher SN", "Location", "Result", "Remarks"
-    ])
-    
-    for inspection, user, ext in results:
-        writer.writerow([
-            inspection.inspection_date.isoformat(),
-            user.username if user else "Unknown",
-            user.id if user else "N/A",
-            inspection.device_id or "N/A",
-            inspection.inspection_type,
-            ext.sl_no if ext else "Deleted Asset",
-            ext.location if ext else "N/A",
-            inspection.observation or "N/A",
-            inspection.remarks or ""
-        ])
-        
-    output.seek(0)
-    
-    response = StreamingResponse(iter([output.getvalue()]), media_type="text/csv")
-    response.headers["Content-Disposition"] = f"attachment; filename=audit_log_{datetime.utcnow().strftime('%Y%m%d')}.csv"
-    return response
+    ]
+    filename = f"audit_log_{datetime.utcnow().strftime('%Y%m%d')}.csv"
+    return csv_response(iter_csv(header, rows()), filename, request, gzip)
 
-@router.get("/export-csv")
-def export_inspections_csv(session: Session = Depends(get_session)):
+ANNEX_H_HEADER = [
+    "SI No", "Type", "Capacity", "Year of Mfg", "Make", "Location", 
+    "Monthly", "Quarterly", "Annual", 
+    "Pressure Test", "Date of Discharge", "Refilled On", "Due for Refilling",
+    "Hydro Test", "Next Hydro", "Status", "Remarks"
+]
+
+def annex_h_statement():
     """
-    Export complete inspection history as CSV, matching Annex H format.
+    One row per active extinguisher with its latest Monthly/Quarterly/Annual dates,
+    the latest non-null pressure/discharge/refill/due dates and the latest remarks.
+
+    Each value is a correlated "latest row" lookup (the portable form of a LATERAL
+    join) that walks ix_inspection_extinguisher_date backwards from the newest
+    inspection, so per asset only a few index entries are touched instead of
+    its whole history.
     """
-    import csv
-    from io import StringIO
-    from fastapi.responses import StreamingResponse
-    from sqlalchemy.orm import selectinload
-    
-    # Query all active extinguishers with their inspections
-    statement = (
-        select(Extinguisher)
+    def latest(column, *conditions):
+        return (
+            select(column)
+            .where(Inspection.extinguisher_id == Extinguisher.id, *conditions)
+            .order_by(Inspection.inspection_date.desc())
+            .limit(1)
+            .correlate(Extinguisher)
+            .scalar_subquery()
+        )
+
+    def latest_of_type(insp_type):
+        return latest(Inspection.inspection_date, Inspection.inspection_type == insp_type)
+
+    def latest_non_null(column):
+        return latest(column, column.is_not(None))
+
+    return (
+        select(
+            Extinguisher.sl_no,
+            Extinguisher.type,
+            Extinguisher.capacity,
+            Extinguisher.year_of_manufacture,
+            Extinguisher.make,
+            Extinguisher.location,
+            latest_of_type("Monthly"),
+            latest_of_type("Quarterly"),
+            latest_of_type("Annual"),
+            latest_non_null(Inspection.pressure_tested_on),
+            latest_non_null(Inspection.date_of_discharge),
+            latest_non_null(Inspection.refilled_on),
+            latest_non_null(Inspection.due_for_refilling),
+            Extinguisher.hydro_pressure_tested_on,
+            Extinguisher.next_hydro_pressure_test_due,
+            Extinguisher.status,
+            latest(Inspection.remarks),
+        )
         .where(Extinguisher.is_active == True)
-        .options(selectinload(Extinguisher.inspections))
-        # .order_by(Extinguisher.sl_no) # Optional: sort by SL No
     )
-    extinguishers = session.exec(statement).all()
-    
-    # Create CSV in memory
-    output = StringIO()
-    writer = csv.writer(output)
-    
-    # Headers to match "Main Safety Audit Report" (Annex H)
-    writer.writerow([
-        "SI No", "Type", "Capacity", "Year of Mfg", "Make", "Location", 
-        "Monthly", "Quarterly", "Annual", 
-        "Pressure Test", "Date of Discharge", "Refilled On", "Due for Refilling",
-        "Hydro Test", "Next Hydro", "Status", "Remarks"
-    ])
-    
-    for ext in extinguishers:
-        # Sort inspections to easily find latest
-        # inspections is a list on the model (selectinload)
-        sorted_inspections = sorted(ext.inspections, key=lambda x: x.inspection_date, reverse=True)
-        
-        # Helper to find latest date for a specific type
-        def get_latest_date(insp_type):
-            for i in sorted_inspections:
-                if i.inspection_type == insp_type:
-                    return i.inspection_date.strftime("%d/%m/%Y")
-            return "-"
-
-        # Helper to format date if exists
-        def fmt_date(d):
-            return d.strftime("%d/%m/%Y") if d else "-"
-            
-        monthly_date = get_latest_date("Monthly")
-        quarterly_date = get_latest_date("Quarterly")
-        annual_date = get_latest_date("Annual")
-        
-        # Per models.py, 'refilled_on' and 'date_of_discharge' are on Inspection model, not Extinguisher model directly?
-        # Let's check Extinguisher model again.
-        # ExtinguisherBase: last_inspection_date, next_service_due, status, hydro_pressure_tested_on, next_hydro_pressure_test_due.
-        # It DOES NOT have refilled_on or date_of_discharge directly. 
-        # So we must get them from the latest relevant inspection.
-
-        def get_latest_attr(attr_name):
-             for i in sorted_inspections:
-                 val = getattr(i, attr_name, None)
-                 if val:
-                     return val.strftime("%d/%m/%Y")
-             return "-"
-
-        writer.writerow([
-            ext.sl_no,
-            ext.type,
-            ext.capacity,
-            ext.year_of_manufacture or "-",
-            ext.make or "-",
-            ext.location,
-            monthly_date,
-            quarterly_date,
-            annual_date,
-            get_latest_attr("pressure_tested_on"), 
-            get_latest_attr("date_of_discharge"),
-            get_latest_attr("refilled_on"),
-            get_latest_attr("due_for_refilling"), 
-            fmt_date(ext.hydro_pressure_tested_on),
-            fmt_date(ext.next_hydro_pressure_test_due),
-            ext.status,
-            sorted_inspections[0].remarks if sorted_inspections and sorted_inspections[0].remarks else "-"
-        ])
-        
-    output.seek(0)
-    
-    response = StreamingResponse(iter([output.getvalue()]), media_type="text/csv")
+
+def iter_annex_h_rows(session: Session):
+    """
+    Annex H report rows, formatted for CSV, read through a server-side cursor.
+    """
+    def fmt_date(d):
+        return d.strftime("%d/%m/%Y") if d else "-"
+
+    result = session.exec(annex_h_statement().execution_options(yield_per=EXPORT_FETCH_ROWS))
+    for (sl_no, ext_type, capacity, year, make, location,
+         monthly, quarterly, annual, pressure, discharge, refilled, due,
+         hydro, next_hydro, ext_status, remarks) in result:
+        yield [
+            sl_no,
+            ext_type,
+            capacity,
+            year or "-",
+            make or "-",
+            location,
+            fmt_date(monthly),
+            fmt_date(quarterly),
+            fmt_date(annual),
+            fmt_date(pressure),
+            fmt_date(discharge),
+            fmt_date(refilled),
+            fmt_date(due),
+            fmt_date(hydro),
+            fmt_date(next_hydro),
+            ext_status,
+            remarks or "-"
+        ]
+
+@router.get("/export-csv")
+def export_inspections_csv(request: Request, gzip: bool = False):
+    """
+    Export complete inspection history as CSV, matching Annex H format.
+    Built from a single query (see annex_h_statement) and streamed row by row.
+    """
+    def rows():
+        with Session(engine) as session:
+            yield from iter_annex_h_rows(session)
+
     filename = f"Main_Safety_Audit_Report_{datetime.utcnow().strftime('%d%m%Y')}.csv"
-    response.headers["Content-Disposition"] = f"attachment; filename={filename}"
-    return response
+    return csv_response(iter_csv(ANNEX_H_HEADER, rows()), filename, request, gzip)
+
+@router.get("/audit-pack")
+async def download_audit_pack(
+    location: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    inspection_type: Optional[str] = None,
+    format: str = Query("zip", pattern="^(zip|pdf)$"),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Every inspection report matching the filter in one download (see audit_pack.py).
+    format=zip streams one PDF per inspection plus index.csv; format=pdf is a single
+    PDF with a contents page. `since`/`until` bound inspection_date as in /export.
+    """
+    limit = AUDIT_PACK_MAX_MERGED if format == "pdf" else AUDIT_PACK_MAX_REPORTS
+    ids = await session.run_sync(audit_pack_ids, location, since, until, inspection_type, limit + 1)
+    if not ids:
+        raise HTTPException(status_code=404, detail="No inspections match the filter")
+    if len(ids) > limit:
+        hint = " or use format=zip" if format == "pdf" else ""
+        raise HTTPException(
+            status_code=400,
+            detail=f"More than {limit} inspections match, narrow the filter{hint}"
+        )
+
+    period = " to ".join(d.strftime("%d-%b-%Y") for d in (since, until) if d)
+    stem = "_".join(["Audit_Pack", safe_name(location or "All"), datetime.utcnow().strftime("%Y%m%d")])
+    if format == "pdf":
+        title = " - ".join(part for part in ("Inspection Audit Pack", location, inspection_type, period) if part)
+        chunks, media_type, filename = stream_merged_pdf(ids, title), "application/pdf", f"{stem}.pdf"
+    else:
+        chunks, media_type, filename = stream_zip(ids), "application/zip", f"{stem}.zip"
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+def build_inspection(
+    data: InspectionCreate,
+    extinguisher: Extinguisher,
+    inspector_id: Optional[uuid.UUID],
+    device_id: Optional[str] = None,
+    idempotency_key: Optional[str] = None,
+) -> Inspection:
+    recorded = {"inspection_date": data.inspection_date} if getattr(data, "inspection_date", None) else {}
+    return Inspection(
+        **recorded,
+        extinguisher_id=extinguisher.id, # Use the real UUID, whatever code was scanned
+        inspector_id=inspector_id,
+        inspection_type=data.inspection_type,
+        observation=data.observation,
+        remarks=data.remarks,
+        pressure_tested_on=data.pressure_tested_on,
+        refilled_on=data.refilled_on,
+        due_for_refilling=data.due_for_refilling,
+        date_of_discharge=data.date_of_discharge,
+        hydro_pressure_tested_on=data.hydro_pressure_tested_on,
+        next_hydro_pressure_test_due=data.next_hydro_pressure_test_due,
+        photo_path=data.photo_path,
+        signature_path=data.signature_path,
+        device_id=device_id or data.device_id,
+        idempotency_key=idempotency_key,
+    )
+
+def update_extinguisher(extinguisher: Extinguisher, inspection: Inspection, inspector_name: Optional[str]) -> bool:
+    """
+    Status, next-due dates and current-state columns after an inspection. Caller adds/commits.
+    An inspection older than the asset's latest (an offline item synced late) only goes into
+    history; returns False then.
+    """
+    if extinguisher.last_inspection_date and inspection.inspection_date < extinguisher.last_inspection_date:
+        return False
+
+    apply_inspection(extinguisher, inspection, inspector_name)
+    compliance.apply_inspection(extinguisher, inspection) # Due dates per IS 2190 rules
+
+    extinguisher.status = "Operational" # Default to Operational on new inspection unless remarks suggest otherwise
+    return True
+
+def recorded_at(value: Optional[datetime]) -> Optional[datetime]:
+    """
+    Client timestamp as naive UTC, like every stored datetime.
+    """
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def batch_idempotency_key(device_id: str, client_uuid: uuid.UUID) -> str:
+    return f"{device_id}:{client_uuid}"
+
+def submit_batch(session: Session, items: list, inspector: User) -> Tuple[dict, List[Extinguisher]]:
+    """
+    Stage (index, key, device_id, item) submissions in the session: one query for already-synced keys,
+    one IN query for the extinguishers, then the inserts and asset updates. Nothing is committed.
+    Returns per-index results and the extinguishers that changed.
+    """
+    keys = [key for _, key, _, _ in items]
+    synced = dict(session.exec(
+        select(Inspection.idempotency_key, Inspection.id).where(Inspection.idempotency_key.in_(keys))
+    ).all()) if keys else {}
+    resolved = resolve_codes(session, list({item.extinguisher_id for _, _, _, item in items}))
+    lock_extinguishers(session, list(resolved.values()))
+
+    results = {}
+    staged = {}
+    touched = {}
+    for index, key, device_id, item in items:
+        existing_id = synced.get(key) or (staged[key][0].id if key in staged else None)
+        if existing_id:
+            results[index] = {"status": "duplicate", "inspection_id": str(existing_id)}
+            continue
+
+        extinguisher = resolved.get(item.extinguisher_id)
+        if not extinguisher:
+            results[index] = {"status": "error", "detail": "Extinguisher not found"}
+            continue
+
+        inspection = build_inspection(item, extinguisher, inspector.id, device_id, key)
+        # Only the newest inspection of an asset, online or offline, sets its state
+        if update_extinguisher(extinguisher, inspection, inspector.username):
+            touched[extinguisher.id] = extinguisher
+        staged[key] = (inspection, extinguisher.location)
+        results[index] = {"status": "created", "inspection_id": str(inspection.id)}
+
+    if staged:
+        # Photos uploaded earlier in the walk-round may have landed in storage already
+        uploads.resolve(session, [inspection for inspection, _ in staged.values()])
+        session.add_all([inspection for inspection, _ in staged.values()])
+        session.add_all(list(touched.values()))
+        record_inspections(session, list(staged.values()), get_company_timezone(session))
+    return results, list(touched.values())
+
+@router.post("/batch")
+def create_inspections_batch(
+    batch: InspectionBatch,
+    current_user: User = Depends(get_current_user),
+    session: Session = Depends(get_session)
+):
+    """
+    Sync many offline inspections in one transaction. Each item is keyed by its device_id and
+    client_uuid; re-sending an already-synced item reports "duplicate" with the stored inspection id
+    instead of inserting it again. Unknown extinguishers are reported per item and don't fail the batch.
+    """
+    results = {}
+    items = []
+    latest_allowed = datetime.utcnow() + CLOCK_SKEW
+    for index, item in enumerate(batch.inspections):
+        device_id = item.device_id or batch.device_id
+        if not device_id:
+            results[index] = {"status": "error", "detail": "device_id is required"}
+            continue
+        item.inspection_date = recorded_at(item.inspection_date)
+        if item.inspection_date and item.inspection_date > latest_allowed:
+            results[index] = {"status": "error", "detail": "inspection_date is in the future"}
+            continue
+        items.append((index, batch_idempotency_key(device_id, item.client_uuid), device_id, item))
+
+    for attempt in range(2):
+        try:
+            staged_results, touched = submit_batch(session, items, current_user)
+            session.commit()
+            break
+        except IntegrityError:
+            # A concurrent retry of the same items committed first: start over, they are duplicates now
+            session.rollback()
+            if attempt:
+                raise HTTPException(status_code=409, detail="Batch conflicts with a concurrent submission, retry")
+    results.update(staged_results)
+
+    for extinguisher in touched:
+        invalidate_scan(extinguisher)
+    created_ids = [uuid.UUID(r["inspection_id"]) for r in staged_results.values() if r["status"] == "created"]
+    if created_ids:
+        uploads.settle(session, session.exec(select(Inspection).where(Inspection.id.in_(created_ids))).all())
+        # One event per batch: a device syncing hundreds would otherwise flood every client's queue
+        events.publish("inspections.synced", count=len(created_ids), extinguisher_ids=[e.id for e in touched])
+
+    keys = {index: key for index, key, _, _ in items}
+    response = []
+    for index, item in enumerate(batch.inspections):
+        response.append({
+            "index": index,
+            "client_uuid": str(item.client_uuid),
+            "idempotency_key": keys.get(index),
+            "extinguisher_id": item.extinguisher_id,
+            "inspection_id": None,
+            "detail": None,
+            **results[index],
+        })
+    summary = {status: sum(1 for r in response if r["status"] == status) for status in ("created", "duplicate", "error")}
+    return {**summary, "results": response}
 
 @router.post("/")
 def create_inspection(
     inspection_data: InspectionCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     current_user: User = Depends(get_current_user),
     session: Session = Depends(get_session)
 ):
-    print(f"Received Inspection: {inspection_data}")
-    
-    ext_uuid = None
-    try:
-        from uuid import UUID
-        ext_uuid = UUID(inspection_data.extinguisher_id)
-    except ValueError:
-        # Not a UUID, assume it is a Serial Number
-        pass
-
-    # 1. Validate Extinguisher
-    if ext_uuid:
-         extinguisher = session.get(Extinguisher, ext_uuid)
-    else:
-         # Try finding by SL No
-         extinguisher = session.exec(select(Extinguisher).where(Extinguisher.sl_no == inspection_data.extinguisher_id)).first()
+    # Retried submission? Hand back what the first attempt created.
+    request_hash = None
+    if idempotency_key is not None:
+        idempotency_key = idempotency.validate_key(idempotency_key)
+        request_hash = idempotency.fingerprint(inspection_data.model_dump_json())
+        replay = replay_inspection(session, current_user.id, idempotency_key, request_hash, response)
+        if replay is not None:
+            return replay
+    
+    # 1. Validate Extinguisher (UUID or Serial Number, one indexed query)
+    extinguisher = resolve_extinguisher(session, inspection_data.extinguisher_id)
 
     if not extinguisher:
-        print(f"Extinguisher not found for ID/SL: {inspection_data.extinguisher_id}")
         raise HTTPException(status_code=404, detail="Extinguisher not found")
+
+    # Concurrent submissions for the same tag update the asset one at a time
+    lock_extinguishers(session, [extinguisher])
     
-    # Ensure we use the real UUID
-    ext_uuid = extinguisher.id
-        
     # 2. Create Inspection
-    new_inspection = Inspection(
-        extinguisher_id=ext_uuid, # Use the UUID object
-        inspector_id=current_user.id,
-        inspection_type=inspection_data.inspection_type,
-        observation=inspection_data.observation,
-        remarks=inspection_data.remarks,
-        pressure_tested_on=inspection_data.pressure_tested_on,
-        refilled_on=inspection_data.refilled_on,
-        due_for_refilling=inspection_data.due_for_refilling,
-        date_of_discharge=inspection_data.date_of_discharge,
-        hydro_pressure_tested_on=inspection_data.hydro_pressure_tested_on,
-        next_hydro_pressure_test_due=inspection_data.next_hydro_pressure_test_due,
-        photo_path=inspection_data.photo_path,
-        signature_path=inspection_data.signature_path,
-        device_id=inspection_data.device_id
-    )
+    new_inspection = build_inspection(inspection_data, extinguisher, current_user.id)
+    uploads.resolve(session, [new_inspection]) # "upload:<id>" references that have landed become URLs
     
     session.add(new_inspection)
     
-    # 3. Update Extinguisher Status
-    extinguisher.last_inspection_date = datetime.utcnow()
-    
-    if inspection_data.inspection_type == "Annual":
-        extinguisher.next_service_due = datetime.utcnow() + timedelta(days=365)
-    else:
-        extinguisher.next_service_due = datetime.utcnow() + timedelta(days=90)
-        
-    extinguisher.status = "Operational" # Default to Operational on new inspection unless remarks suggest otherwise
+    # Keep the /stats rollup in step with the insert (same transaction)
+    record_inspection(session, new_inspection, extinguisher.location, get_company_timezone(session))
     
-    if inspection_data.hydro_pressure_tested_on:
-        extinguisher.hydro_pressure_tested_on = inspection_data.hydro_pressure_tested_on
-    if inspection_data.next_hydro_pressure_test_due:
-        extinguisher.next_hydro_pressure_test_due = inspection_data.next_hydro_pressure_test_due
-        
-    session.add(extinguisher)
-    session.commit()
+    # 3. Update Extinguisher Status
+    previous_status = extinguisher.status
+    update_extinguisher(extinguisher, new_inspection, current_user.username)
     session.add(extinguisher)
-    session.commit()
-    session.refresh(new_inspection)
+
+    if idempotency_key is not None:
+        idempotency.remember(session, current_user.id, idempotency_key, request_hash, new_inspection.id)
+        idempotency.purge_expired(session)
+
+    # One commit for inspection, asset, rollup and key. The response is built from
+    # the in-memory objects, so skip the reload after commit.
+    session.expire_on_commit = False
+    try:
+        session.commit()
+    except IntegrityError:
+        session.rollback()
+        if idempotency_key is None:
+            raise
+        # The same key committed first in a concurrent request
+        replay = replay_inspection(session, current_user.id, idempotency_key, request_hash, response)
+        if replay is None:
+            raise
+        return replay
+    invalidate_scan(extinguisher)
+    uploads.settle(session, [new_inspection])
+
+    events.publish(
+        "inspection.created",
+        id=new_inspection.id,
+        extinguisher_id=extinguisher.id,
+        sl_no=extinguisher.sl_no,
+        location=extinguisher.location,
+        inspection_type=new_inspection.inspection_type,
+        observation=new_inspection.observation,
+        inspector=current_user.username,
+    )
+    if extinguisher.status != previous_status:
+        events.publish("extinguisher.status_changed", id=extinguisher.id, status=extinguisher.status, previous=previous_status)
     
     return new_inspection
 
+def replay_inspection(session: Session, user_id, key: str, request_hash: str, response: Response) -> Optional[Inspection]:
+    record = idempotency.find(session, user_id, key, request_hash)
+    if record is None:
+        return None
+    inspection = session.get(Inspection, record.inspection_id)
+    if inspection is None:
+        # Inspection was removed since: the key is free again
+        session.delete(record)
+        session.flush()
+        return None
+    response.headers["Idempotent-Replayed"] = "true"
+    return inspection
+
 @router.get("/{id}")
 def get_inspection(
     id: str,
@@ -328,157 +624,52 @@ def get_inspection(
     return inspection
 
 @router.get("/{id}/pdf")
-def generate_inspection_pdf(
+async def generate_inspection_pdf(
     id: str,
-    session: Session = Depends(get_session)
+    request: Request,
+    session: AsyncSession = Depends(get_async_session)
 ):
     try:
-        from uuid import UUID
-        insp_uuid = UUID(id)
+        insp_uuid = uuid.UUID(id)
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid Inspection ID")
-        
-    inspection = session.get(Inspection, insp_uuid)
-    if not inspection:
+
+    # Inspection, asset and inspector in one query
+    reports = await session.run_sync(load_report_data, [insp_uuid])
+    if insp_uuid not in reports:
          raise HTTPException(status_code=404, detail="Inspection not found")
-    
-    # Load relations
-    extinguisher = session.get(Extinguisher, inspection.extinguisher_id)
-    inspector = session.get(User, inspection.inspector_id) if inspection.inspector_id else None
-    
-    # PDF Generation
-    from reportlab.lib import colors
-    from reportlab.lib.pagesizes import letter
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image as ReportLabImage
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from io import BytesIO
-    import requests
-    from reportlab.lib.utils import ImageReader
-    
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    story = []
-    styles = getSampleStyleSheet()
-    
-    # Title
-    story.append(Paragraph("Fire Extinguisher Inspection Report", styles['Title']))
-    story.append(Spacer(1, 12))
-    
-    # Meta Info
-    meta_data = [
-        ["Inspection ID", str(inspection.id)],
-        ["Date", inspection.inspection_date.strftime("%d-%b-%Y %H:%M")],
-        ["Inspector", inspector.username if inspector else "Unknown"],
-        ["Type", inspection.inspection_type],
-        ["Status", inspection.observation],
-    ]
-    meta_table = Table(meta_data, colWidths=[150, 300])
-    meta_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
-        ('GRID', (0,0), (-1,-1), 1, colors.black),
-        ('FONTNAME', (0,0), (-1,-1), 'Helvetica-Bold'),
-    ]))
-    story.append(meta_table)
-    story.append(Spacer(1, 12))
-    
-    # Extinguisher Details
-    story.append(Paragraph("Extinguisher Details", styles['Heading2']))
-    if extinguisher:
-        ext_data = [
-            ["Serial No", extinguisher.sl_no],
-            ["Type", extinguisher.type],
-            ["Capacity", extinguisher.capacity],
-            ["Location", extinguisher.location],
-            ["Make", extinguisher.make or "-"],
-            ["Mfg Year", str(extinguisher.year_of_manufacture) or "-"],
-        ]
-        ext_table = Table(ext_data, colWidths=[150, 300])
-        ext_table.setStyle(TableStyle([
-            ('GRID', (0,0), (-1,-1), 1, colors.black),
-        ]))
-        story.append(ext_table)
-    else:
-        story.append(Paragraph("Extinguisher details not found (deleted?)", styles['Normal']))
-        
-    story.append(Spacer(1, 12))
-    
-    # Inspection Checklist
-    story.append(Paragraph("Checklist & Observations", styles['Heading2']))
-    
-    obs_data = [
-         ["Observation", inspection.observation],
-         ["Remarks", inspection.remarks or "-"],
-         ["Pressure Tested On", inspection.pressure_tested_on.strftime("%d-%b-%Y") if inspection.pressure_tested_on else "-"],
-         ["Hydro Test Due", inspection.next_hydro_pressure_test_due.strftime("%d-%b-%Y") if inspection.next_hydro_pressure_test_due else "-"],
-         ["Refilled On", inspection.refilled_on.strftime("%d-%b-%Y") if inspection.refilled_on else "-"],
-    ]
-    
-    obs_table = Table(obs_data, colWidths=[150, 300])
-    obs_table.setStyle(TableStyle([
-        ('GRID', (0,0), (-1,-1), 1, colors.black),
-    ]))
-    story.append(obs_table)
-    story.append(Spacer(1, 12))
-    
-    # Images
-    story.append(Paragraph("Inspection Photo", styles['Heading2']))
-    
-    def fetch_image(url):
-        try:
-            res = requests.get(url, stream=True)
-            if res.status_code == 200:
-                img = BytesIO(res.content)
-                return ReportLabImage(img, width=300, height=300, kind='proportional') # Maintain aspect ratio
-        except Exception as e:
-            print(f"Error fetching image: {e}")
-            return None
-            
-    if inspection.photo_path:
-        print(f"DEBUG: Processing PDF Image Path: {inspection.photo_path}")
-        # Check if it's a URL (Cloudinary)
-        if inspection.photo_path.startswith("http"):
-             img_flowable = fetch_image(inspection.photo_path)
-             if img_flowable:
-                 story.append(img_flowable)
-             else:
-                 story.append(Paragraph(f"Error loading image from URL: {inspection.photo_path}", styles['Normal']))
-        else:
-             # Try to treat as local path or fallback
-             try:
-                 # Check if file exists locally (e.g. uploads/filename)
-                 # This path might be relative to CWD
-                 import os
-                 if os.path.exists(inspection.photo_path):
-                     img = ReportLabImage(inspection.photo_path, width=300, height=300, kind='proportional')
-                     story.append(img)
-                 elif os.path.exists(f"uploads/{inspection.photo_path}"):
-                     img = ReportLabImage(f"uploads/{inspection.photo_path}", width=300, height=300, kind='proportional')
-                     story.append(img)
-                 else:
-                     story.append(Paragraph(f"Image not found locally: {inspection.photo_path}", styles['Normal']))
-             except Exception as e:
-                 story.append(Paragraph(f"Error loading local image: {str(e)}", styles['Normal']))
-    else:
-        story.append(Paragraph("No photo available.", styles['Normal']))
 
-    story.append(Spacer(1, 12))
-    
-    # Signature
-    if inspection.signature_path:
-        story.append(Paragraph("Signature", styles['Heading2']))
-        if inspection.signature_path.startswith("http"):
-             sig_flowable = fetch_image(inspection.signature_path)
-             if sig_flowable:
-                 story.append(sig_flowable)
-    
-    doc.build(story)
-    buffer.seek(0)
-    
-    from fastapi.responses import StreamingResponse
-    filename = f"Inspection_{inspection.id}.pdf"
-    
-    return StreamingResponse(
-        buffer, 
-        media_type="application/pdf", 
-        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    data = reports[insp_uuid]
+    digest = report_digest(data)
+    headers = {
+        "ETag": f'"{digest}"',
+        "Cache-Control": "private, max-age=0, must-revalidate",
+    }
+    if etag_matches(request.headers.get("if-none-match"), digest):
+        return Response(status_code=304, headers=headers)
+
+    # Rendered on the process pool the first time, served from the disk cache after that
+    path = await get_or_render(data, digest)
+    filename = f"Inspection_{insp_uuid}.pdf"
+    if not is_complete(path):
+        # Photo or signature failed to load: no ETag (FileResponse would add one), no caching
+        with open(path, "rb") as f:
+            content = f.read()
+        return Response(
+            content,
+            media_type="application/pdf",
+            headers={"Cache-Control": "no-store", "Content-Disposition": f"attachment; filename={filename}"}
+        )
+    return FileResponse(
+        path,
+        media_type="application/pdf",
+        headers={**headers, "Content-Disposition": f"attachment; filename={filename}"}
     )
+
+def etag_matches(if_none_match: Optional[str], digest: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip().removeprefix("W/").strip('"') for tag in if_none_match.split(",")]
+    return digest in candidates
@@ -0,0 +1,24 @@
+from fastapi import APIRouter
+from cache import CACHES, DISK_CACHES
+from auth import hash_pool
+from pdf_reports import PDF_RENDER_WORKERS
+from images import image_cache
+from events import broadcaster
+import uploads
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+@router.get("/")
+def get_metrics():
+    """
+    Process-local counters for monitoring. Each worker reports its own numbers.
+    """
+    return {
+        "caches": {name: cache.stats() for name, cache in CACHES.items()},
+        "password_hashing": hash_pool.stats(),
+        "disk_caches": {name: cache.stats() for name, cache in DISK_CACHES.items()},
+        "pdf_render_workers": PDF_RENDER_WORKERS,
+        "image_fetches": image_cache.fetch_stats(),
+        "uploads": uploads.stats(),
+        "dashboard_events": broadcaster.stats(),
+    }
@@ -1,49 +1,59 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
-from sqlmodel import Session, select
-from database import get_session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from database import get_async_session
 from models import CompanySettings
-import shutil
 import os
-import uuid
+from static_files import extension, store, STATIC_DIR
 from datetime import datetime
+from typing import Optional
 
 router = APIRouter(prefix="/settings", tags=["settings"])
 
-UPLOAD_DIR = "uploads"
+UPLOAD_DIR = STATIC_DIR
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 @router.get("/")
-def get_settings(session: Session = Depends(get_session)):
-    settings = session.exec(select(CompanySettings).where(CompanySettings.id == 1)).first()
+async def get_settings(session: AsyncSession = Depends(get_async_session)):
+    settings = await session.get(CompanySettings, 1)
     if not settings:
         # Create default if not exists
         settings = CompanySettings(id=1, company_name="Siddhi Industrial Solutions")
         session.add(settings)
-        session.commit()
-        session.refresh(settings)
+        await session.commit()
+        await session.refresh(settings)
     return settings
 
+def save_logo(logo: UploadFile) -> str:
+    # Named by content: a new logo gets a new URL, so /static can let clients cache it forever
+    return store(logo.file, UPLOAD_DIR, extension(logo.filename, ".jpg"), prefix="logo_")
+
 @router.post("/")
 async def update_settings(
     company_name: str = Form(...),
     logo: UploadFile = File(None),
-    session: Session = Depends(get_session)
+    # Upload transcoding (see images.transcode_upload); unchanged when omitted
+    photo_max_px: Optional[int] = Form(None, ge=320, le=8192),
+    photo_format: Optional[str] = Form(None, pattern="^(jpeg|webp)$"),
+    photo_quality: Optional[int] = Form(None, ge=30, le=95),
+    session: AsyncSession = Depends(get_async_session)
 ):
-    settings = session.exec(select(CompanySettings).where(CompanySettings.id == 1)).first()
+    settings = await session.get(CompanySettings, 1)
     if not settings:
          settings = CompanySettings(id=1)
     
     settings.company_name = company_name
+    if photo_max_px is not None:
+        settings.photo_max_px = photo_max_px
+    if photo_format is not None:
+        settings.photo_format = photo_format
+    if photo_quality is not None:
+        settings.photo_quality = photo_quality
     
     if logo:
         try:
-            # Generate unique filename
-            file_ext = logo.filename.split(".")[-1] if "." in logo.filename else "jpg"
-            filename = f"logo_{uuid.uuid4()}.{file_ext}"
-            file_path = os.path.join(UPLOAD_DIR, filename)
-            
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(logo.file, buffer)
+            # File I/O stays off the event loop
+            filename = await run_in_threadpool(save_logo, logo)
             
             # Update logo URL
             settings.logo_url = f"/static/{filename}"
@@ -53,6 +63,6 @@ async def update_settings(
 
     settings.updated_at = datetime.utcnow()
     session.add(settings)
-    session.commit()
-    session.refresh(settings)
+    await session.commit()
+    await session.refresh(settings)
     return settings
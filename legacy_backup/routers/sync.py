@@ -0,0 +1,22 @@
+from fastapi import APIRouter, Depends, Query
+from sqlmodel import Session
+from database import get_session
+from models import User
+from auth import get_current_user
+from changes import changes_since, SYNC_PAGE_SIZE, SYNC_MAX_PAGE_SIZE
+
+router = APIRouter(prefix="/sync", tags=["sync"])
+
+@router.get("")
+def sync_changes(
+    since: int = Query(0, ge=0),
+    limit: int = Query(SYNC_PAGE_SIZE, ge=1, le=SYNC_MAX_PAGE_SIZE),
+    current_user: User = Depends(get_current_user),
+    session: Session = Depends(get_session),
+):
+    """
+    Rows changed after token `since` (0 = everything), in their current state, plus
+    hard deletes. Store `next` and send it as `since` next time; while `has_more`
+    is true, ask again straight away. Users are only included for admins.
+    """
+    return changes_since(session, since, limit, is_admin=current_user.role == "admin")
@@ -0,0 +1,55 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse
+from starlette.concurrency import run_in_threadpool
+from urllib.parse import urlparse
+from images import image_cache
+from static_files import is_hashed, IMMUTABLE, STATIC_DIR, STORED_UPLOADS
+import os
+
+# Registered before the /static mount in main.py, which would otherwise swallow these paths
+router = APIRouter(prefix="/static/thumb", tags=["images"])
+
+# Hosts the remote variant will fetch from, so it can't be used as an open proxy
+THUMB_REMOTE_HOSTS = {
+    host.strip() for host in os.getenv("THUMB_REMOTE_HOSTS", "res.cloudinary.com").split(",") if host.strip()
+}
+
+def thumbnail_response(path: str, immutable: bool = False) -> FileResponse:
+    cache_control = IMMUTABLE if immutable else "public, max-age=86400"
+    return FileResponse(path, media_type="image/jpeg", headers={"Cache-Control": cache_control})
+
+@router.get("")
+async def remote_thumbnail(src: str):
+    """
+    Thumbnail of a Cloudinary photo: /static/thumb?src=https://res.cloudinary.com/...
+    """
+    parsed = urlparse(src)
+    if parsed.scheme != "https" or parsed.hostname not in THUMB_REMOTE_HOSTS:
+        raise HTTPException(status_code=400, detail="Unsupported image source")
+    path = await run_in_threadpool(image_cache.derivative, src, "thumb")
+    if not path:
+        raise HTTPException(status_code=404, detail="Image not available")
+    return thumbnail_response(path)
+
+@router.get("/{name}")
+async def upload_thumbnail(name: str):
+    """
+    Thumbnail of a file under /static, e.g. /static/thumb/<photo>.jpeg for /static/<photo>.jpeg
+    """
+    return await static_thumbnail(STATIC_DIR, name)
+
+@router.get("/uploads/{name}")
+async def stored_upload_thumbnail(name: str):
+    """
+    Thumbnail of a locally stored upload: /static/thumb/uploads/<photo>.jpeg for /static/uploads/<photo>.jpeg
+    """
+    return await static_thumbnail(STORED_UPLOADS, name)
+
+async def static_thumbnail(directory: str, name: str) -> FileResponse:
+    source = os.path.join(directory, name)
+    if name.startswith(".") or os.path.basename(name) != name or not os.path.isfile(source):
+        raise HTTPException(status_code=404, detail="Image not found")
+    path = await run_in_threadpool(image_cache.derivative, source, "thumb")
+    if not path:
+        raise HTTPException(status_code=404, detail="Image not available")
+    return thumbnail_response(path, immutable=is_hashed(name)) # Same name, same content
@@ -1,31 +1,117 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-import cloudinary
-import cloudinary.uploader
+from fastapi import APIRouter, Depends, HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import UploadFile
+from starlette.formparsers import MultiPartParser, MultiPartException
+from sqlmodel.ext.asyncio.session import AsyncSession
+from database import get_async_session
+from models import Upload
+from images import RejectedImage, check_image
+import uploads
+import uuid
+import os
 
 router = APIRouter(prefix="/upload", tags=["upload"])
 
-# Configure Cloudinary
-cloudinary.config( 
-    cloud_name = "dz92qndid", 
-    api_key = "458416816738218", 
-    api_secret = "nG_r4v2K3WUiK1v8hxKcDyAWWW8",
-    secure = True
-)
+# The body is parsed by hand (to enforce the size limit while it streams), so describe it for /docs
+MULTIPART_FILE_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "properties": {"file": {"type": "string", "format": "binary"}},
+            "required": ["file"],
+        }}},
+    }
+}
 
-@router.post("/")
-async def upload_file(file: UploadFile = File(...)):
+IMAGE_MIME = {"JPEG": "image/jpeg", "MPO": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}
+
+def too_large() -> HTTPException:
+    return HTTPException(status_code=413, detail=f"File too large (max {uploads.MAX_UPLOAD_BYTES // (1024 * 1024)} MB)")
+
+async def limited_body(request: Request, limit: int):
+    """
+    The request body, failing with 413 as soon as more than `limit` bytes have arrived.
+    """
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > limit:
+            raise too_large()
+        yield chunk
+
+@router.post("/", status_code=202, openapi_extra=MULTIPART_FILE_BODY)
+async def upload_file(request: Request, session: AsyncSession = Depends(get_async_session)):
+    """
+    Accept a file (multipart field "file") and return a provisional reference, "upload:<id>",
+    straight away. The file is forwarded to storage in the background (see uploads.py) and
+    photo_path / signature_path values holding the reference are rewritten once it lands.
+
+    Images are checked here (format and dimensions, from the header only) and re-encoded
+    to the limits in /settings/ before storage, so clients should downscale to
+    photo_max_px themselves and save the upload bandwidth. Other files are stored as sent.
+    """
+    limit = uploads.MAX_UPLOAD_BYTES + uploads.MULTIPART_OVERHEAD_BYTES
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > limit:
+        raise too_large()
+    if not request.headers.get("content-type", "").startswith("multipart/form-data"):
+        raise HTTPException(status_code=400, detail="Expected multipart/form-data with a 'file' field")
+
+    parser = MultiPartParser(request.headers, limited_body(request, limit), max_files=1, max_fields=10)
+    try:
+        form = await parser.parse()
+    except MultiPartException as e:
+        raise HTTPException(status_code=400, detail=e.message)
+
+    file = form.get("file")
+    try:
+        if not isinstance(file, UploadFile):
+            raise HTTPException(status_code=400, detail="No file uploaded")
+        upload_id = uuid.uuid4()
+        size = await run_in_threadpool(uploads.spool, file.file, upload_id)
+    except uploads.UploadTooLarge:
+        raise too_large()
+    finally:
+        await form.close()
+
+    content_type = file.content_type or "application/octet-stream"
     try:
-        # Upload to Cloudinary
-        # We read the file into memory first to pass it to the uploader
-        content = await file.read()
-        
-        # Upload
-        upload_result = cloudinary.uploader.upload(content, folder="fire_safety_app")
-        
-        # Get secure URL
-        url = upload_result.get("secure_url")
-        
-        return {"url": url}
-    except Exception as e:
-        print(f"Cloudinary Error: {e}")
-        raise HTTPException(status_code=500, detail=f"Image upload failed: {str(e)}")
+        image_format = (await run_in_threadpool(check_image, uploads.spool_path(upload_id)))[0]
+        content_type = IMAGE_MIME[image_format] # What the file is, whatever the client said
+    except RejectedImage as e:
+        if content_type.startswith("image/"):
+            os.remove(uploads.spool_path(upload_id))
+            status = 413 if "dimensions" in str(e) else 415
+            raise HTTPException(status_code=status, detail=str(e))
+        # Not an image (e.g. a PDF certificate): stored unchanged
+
+    upload = Upload(
+        id=upload_id,
+        filename=file.filename or "upload",
+        content_type=content_type,
+        size=size,
+    )
+    session.add(upload)
+    await session.commit()
+    uploads.submit(upload_id)
+
+    return {"url": uploads.reference(upload_id), "id": str(upload_id), "status": "pending"}
+
+@router.get("/{upload_id}")
+async def get_upload(upload_id: uuid.UUID, session: AsyncSession = Depends(get_async_session)):
+    """
+    Transfer status of an upload. `url` is the final location once status is "done".
+    """
+    upload = await session.get(Upload, upload_id)
+    if not upload:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return {
+        "id": str(upload.id),
+        "status": upload.status,
+        "url": upload.url or uploads.reference(upload.id),
+        "size": upload.size,
+        "stored_size": upload.stored_size,
+        "content_type": upload.content_type,
+        "error": upload.error,
+    }
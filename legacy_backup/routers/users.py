@@ -4,7 +4,7 @@ from sqlmodel import Session, select
 from typing import List
 from database import get_session
 from models import User, UserCreate, UserRead, UserUpdate
-from auth import get_current_user, get_password_hash
+from auth import get_current_user, get_password_hash, revoke_user_tokens, remember_user_state
 from utils import validate_password_strength
 
 router = APIRouter(
@@ -76,9 +76,11 @@ def delete_user(
          raise HTTPException(status_code=400, detail="Cannot delete your own account")
          
     user.is_active = False
+    revoke_user_tokens(user)
     session.add(user)
     session.commit()
     session.refresh(user)
+    remember_user_state(user)
     return user
 
 @router.post("/{user_id}/reset-password", response_model=UserRead)
@@ -98,8 +100,10 @@ def reset_password(
     if user_update.password:
         validate_password_strength(user_update.password)
         user.password_hash = get_password_hash(user_update.password)
+        revoke_user_tokens(user)
         session.add(user)
         session.commit()
         session.refresh(user)
+        remember_user_state(user)
         
     return user
@@ -0,0 +1,234 @@
+"""
+Startup profiling and warm-up.
+
+main.py imports this module first. Phases (imports, lifespan steps, warm-up)
+are always timed; with STARTUP_PROFILE=1 every module import is timed as well
+(self and cumulative time, like `python -X importtime`). The report is served
+at /debug/startup, or printed by:
+
+    python startup.py [--top 25]
+
+Warm-up runs on a background thread once the app is ready, so it does not
+delay the first request: it pre-imports and pre-builds things the first PDF
+request would otherwise pay for. Disable with STARTUP_WARMUP=0.
+
+The PDF render pool is not part of it by default: its workers are spawned
+processes, each importing the app's modules, which every uvicorn worker would
+pay at boot whether or not it ever renders a report. The pool starts on the
+first PDF request instead; STARTUP_WARM_PDF_POOL=1 starts it during warm-up.
+"""
+import importlib.abc
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager, redirect_stdout
+
+PROCESS_T0 = time.perf_counter()
+PROFILE_IMPORTS = os.getenv("STARTUP_PROFILE", "0").strip().lower() in ("1", "true", "yes")
+WARMUP_ENABLED = os.getenv("STARTUP_WARMUP", "1").strip().lower() in ("1", "true", "yes")
+WARM_PDF_POOL = os.getenv("STARTUP_WARM_PDF_POOL", "0").strip().lower() in ("1", "true", "yes")
+
+_phases = []
+_imports = {}
+_lock = threading.Lock()
+_ready_ms = None
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 2)
+
+
+@contextmanager
+def phase(name: str):
+    """
+    Time a startup step; shows up under "phases" in the report.
+    """
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = repr(e)
+        raise
+    finally:
+        entry = {"name": name, "started_ms": _ms(start - PROCESS_T0), "duration_ms": _ms(time.perf_counter() - start)}
+        if error:
+            entry["error"] = error
+        with _lock:
+            _phases.append(entry)
+
+
+def mark_ready():
+    global _ready_ms
+    _ready_ms = _ms(time.perf_counter() - PROCESS_T0)
+    print(f"Startup: ready after {_ready_ms} ms")
+
+
+class _TimedLoader:
+    """
+    Wraps a module's loader to time exec_module. Everything else is delegated.
+    """
+    def __init__(self, loader, finder):
+        self._loader = loader
+        self._finder = finder
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        name = module.__name__
+        stack = self._finder.stack()
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            total = time.perf_counter() - start
+            children = stack.pop()
+            if stack:
+                stack[-1] += total
+            _imports[name] = {"cumulative_ms": _ms(total), "self_ms": _ms(total - children)}
+
+
+class _ImportTimer(importlib.abc.MetaPathFinder):
+    def __init__(self):
+        self._local = threading.local()
+
+    def stack(self) -> list:
+        # Imports nest per thread (the warm-up thread imports alongside request threads)
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def find_spec(self, fullname, path, target=None):
+        if getattr(self._local, "resolving", False):
+            return None
+        self._local.resolving = True
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, "find_spec"):
+                    continue
+                spec = finder.find_spec(fullname, path, target)
+                if spec is not None:
+                    if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                        spec.loader = _TimedLoader(spec.loader, self)
+                    return spec
+            return None
+        finally:
+            self._local.resolving = False
+
+
+if PROFILE_IMPORTS:
+    sys.meta_path.insert(0, _ImportTimer())
+
+
+def report(top: int = 25) -> dict:
+    """
+    Structured startup report: phases in order, slowest imports by self time,
+    and cumulative time per top-level package.
+    """
+    with _lock:
+        phases = list(_phases)
+        imports = dict(_imports)
+
+    packages = {}
+    for name, timing in imports.items():
+        root = name.split(".")[0]
+        packages[root] = round(packages.get(root, 0.0) + timing["self_ms"], 2)
+
+    slowest = sorted(imports.items(), key=lambda item: item[1]["self_ms"], reverse=True)[:top]
+    return {
+        "ready_ms": _ready_ms,
+        "import_profiling": PROFILE_IMPORTS,
+        "phases": phases,
+        "imports": [{"module": name, **timing} for name, timing in slowest],
+        "packages": dict(sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]),
+        "modules_timed": len(imports),
+    }
+
+
+# --- Warm-up -----------------------------------------------------------------
+
+def _warm_pdf():
+    from pdf_reports import get_pdf_styles
+    get_pdf_styles()
+    import reportlab.platypus  # noqa: F401
+    import reportlab.lib.utils  # noqa: F401
+
+
+def _warm_pdf_pool():
+    from pdf_reports import warm_render_pool
+    warm_render_pool()
+
+
+def _warm_http():
+    from images import get_http
+    get_http()
+
+
+def _warm_database():
+    from sqlalchemy import text
+    from database import engine
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+
+WARMUP_TASKS = [
+    ("warm-up: database connection", _warm_database),
+    ("warm-up: reportlab, PDF styles", _warm_pdf),
+    ("warm-up: requests", _warm_http),
+]
+if WARM_PDF_POOL:
+    WARMUP_TASKS.append(("warm-up: PDF render pool", _warm_pdf_pool))
+
+
+def _run_warmup():
+    for name, task in WARMUP_TASKS:
+        try:
+            with phase(name):
+                task()
+        except Exception as e:
+            print(f"Startup {name} failed: {e}")
+
+
+def start_warmup():
+    """
+    Run the warm-up tasks in the background. Returns the thread (None if disabled).
+    """
+    if not WARMUP_ENABLED:
+        return None
+    thread = threading.Thread(target=_run_warmup, name="startup-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+    import json
+
+    parser = argparse.ArgumentParser(description="Print the API startup report.")
+    parser.add_argument("--top", type=int, default=25)
+    args = parser.parse_args()
+
+    if not PROFILE_IMPORTS:
+        print("Tip: set STARTUP_PROFILE=1 to time individual imports.", file=sys.stderr)
+
+    sys.modules.setdefault("startup", sys.modules["__main__"])
+
+    async def boot():
+        async with main.lifespan(main.app):
+            thread = getattr(main.app.state, "warmup_thread", None)
+            if thread is not None:
+                thread.join()
+
+    # The app's own log lines go to stderr so stdout is just the report
+    with redirect_stdout(sys.stderr):
+        with phase("import main"):
+            import main
+        asyncio.run(boot())
+    print(json.dumps(report(args.top), indent=2))
@@ -0,0 +1,240 @@
+"""
+Files under /static (STATIC_DIR, default uploads/): content-hashed names and HTTP caching.
+
+Logos and locally stored uploads are written by store() as
+<prefix><sha256[:32]>.<ext>. The name changes whenever the content does, so
+CachedStaticFiles serves those with a year-long `immutable` Cache-Control and
+the hash as a strong ETag. Older names (logo_<uuid>.png, <uuid>.jpeg) get
+`no-cache` and a content ETag instead: clients revalidate and get a 304.
+
+Text-like files (SVG logos, mostly) also get a gzip sibling, <name>.gz, served
+to clients that accept it. Raster images are already compressed and are left
+alone.
+
+Nothing ever deletes from STATIC_DIR on the request path; collect_garbage()
+removes files no longer referenced by CompanySettings or any Inspection:
+
+    python static_files.py gc [--dry-run]
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import time
+import uuid
+from typing import Optional, Set, Tuple
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+from cache import TTLCache
+
+STATIC_DIR = os.path.abspath(os.getenv("STATIC_DIR", "uploads")) # Mounted at STATIC_URL by main.py
+STATIC_URL = "/static/"
+STORED_UPLOADS = os.path.join(STATIC_DIR, "uploads") # storage.LocalStorage, served at /static/uploads/
+HASH_LENGTH = 32 # Hex digits of sha256 kept in names
+HASHED_NAME = re.compile(r"^(?:[a-z]+_)?(?P<digest>[0-9a-f]{%d})\.[a-z0-9]{1,8}$" % HASH_LENGTH)
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "public, no-cache"
+COMPRESSIBLE_TYPES = {"image/svg+xml", "application/json", "application/javascript", "application/xml"}
+GZIP_MIN_SAVING = 0.1 # Keep a .gz only if it is at least this much smaller
+GC_GRACE_SECONDS = int(float(os.getenv("STATIC_GC_GRACE_HOURS", "168")) * 3600)
+COPY_CHUNK_BYTES = 1024 * 1024
+
+# Content ETags of non-hashed files, keyed by path, mtime and size so edits miss
+_etags = TTLCache("static_etags", maxsize=4096, ttl=24 * 3600)
+
+
+def is_hashed(name: str) -> bool:
+    return HASHED_NAME.match(name) is not None
+
+
+def extension(filename: Optional[str], default: str = "") -> str:
+    """
+    Lower-case extension with the dot, if it is short and plain; else default.
+    """
+    ext = os.path.splitext(filename or "")[1].lower()
+    return ext if re.fullmatch(r"\.[a-z0-9]{1,8}", ext) else default
+
+
+def is_compressible(name: str) -> bool:
+    media_type = mimetypes.guess_type(name)[0] or ""
+    return media_type.startswith("text/") or media_type in COMPRESSIBLE_TYPES
+
+
+def precompress(path: str) -> Optional[str]:
+    """
+    Write path + ".gz" if the file is text-like and gzip pays off. Returns its path.
+    """
+    if not is_compressible(path):
+        return None
+    with open(path, "rb") as f:
+        content = f.read()
+    packed = gzip.compress(content, compresslevel=9, mtime=0)
+    if len(packed) > len(content) * (1 - GZIP_MIN_SAVING):
+        return None
+    tmp = f"{path}.gz.tmp"
+    with open(tmp, "wb") as out:
+        out.write(packed)
+    os.replace(tmp, f"{path}.gz")
+    return f"{path}.gz"
+
+
+def store(source, directory: str, ext: str, prefix: str = "") -> str:
+    """
+    Copy a file object into directory as <prefix><hash><ext>. Returns the name.
+    Identical content ends up in the same file, written once.
+    """
+    os.makedirs(directory, exist_ok=True)
+    tmp = os.path.join(directory, f".{uuid.uuid4()}.tmp")
+    digest = hashlib.sha256()
+    try:
+        with open(tmp, "wb") as out:
+            while chunk := source.read(COPY_CHUNK_BYTES):
+                digest.update(chunk)
+                out.write(chunk)
+        name = f"{prefix}{digest.hexdigest()[:HASH_LENGTH]}{ext}"
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            os.remove(tmp)
+        else:
+            os.replace(tmp, path)
+            precompress(path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return name
+
+
+def store_path(path: str, directory: str, ext: str, prefix: str = "") -> str:
+    with open(path, "rb") as f:
+        return store(f, directory, ext, prefix)
+
+
+# --- Serving -----------------------------------------------------------------
+
+def _content_etag(path: str, stat_result: os.stat_result) -> str:
+    key = (path, stat_result.st_mtime_ns, stat_result.st_size)
+    found, etag = _etags.get(key)
+    if not found:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            while chunk := f.read(COPY_CHUNK_BYTES):
+                digest.update(chunk)
+        etag = digest.hexdigest()[:HASH_LENGTH]
+        _etags.set(key, etag)
+    return etag
+
+
+class CachedStaticFiles(StaticFiles):
+    """
+    StaticFiles with Cache-Control by name, strong content ETags and .gz variants.
+    """
+
+    def lookup_path(self, path: str) -> Tuple[str, Optional[os.stat_result]]:
+        full_path, stat_result = super().lookup_path(path)
+        # Runs in a thread: hash legacy files here rather than on the event loop
+        if stat_result and not is_hashed(os.path.basename(full_path)) and os.path.isfile(full_path):
+            _content_etag(full_path, stat_result)
+        return full_path, stat_result
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        name = os.path.basename(full_path)
+        match = HASHED_NAME.match(name)
+        etag = match.group("digest") if match else _content_etag(full_path, stat_result)
+        headers = {"cache-control": IMMUTABLE if match else REVALIDATE}
+        media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+
+        path = full_path
+        if is_compressible(name):
+            headers["vary"] = "Accept-Encoding"
+            gz = f"{full_path}.gz"
+            if "gzip" in request_headers.get("accept-encoding", "") and os.path.isfile(gz):
+                path, stat_result = gz, os.stat(gz)
+                headers["content-encoding"] = "gzip"
+                etag = f"{etag}-gz"
+        headers["etag"] = f'"{etag}"'
+
+        response = FileResponse(path, status_code=status_code, headers=headers, media_type=media_type,
+                                stat_result=stat_result)
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+# --- Garbage collection ------------------------------------------------------
+
+def local_name(value: Optional[str]) -> Optional[str]:
+    """
+    The STATIC_DIR file a stored reference points at, if it is local.
+    """
+    if not value or value.startswith(("http:", "https:", "upload:")):
+        return None
+    return os.path.basename(value.split("?", 1)[0])
+
+
+def referenced_names(session) -> Set[str]:
+    from sqlmodel import select
+    from models import CompanySettings, Inspection
+
+    values = list(session.exec(select(CompanySettings.logo_url)).all())
+    for column in (Inspection.photo_path, Inspection.signature_path):
+        values += session.exec(select(column).where(column.is_not(None)).distinct()).all()
+    return {name for name in map(local_name, values) if name}
+
+
+def static_path(url: str) -> Optional[str]:
+    """
+    The file under STATIC_DIR that a /static/... URL serves, if it stays inside STATIC_DIR.
+    """
+    if not url.startswith(STATIC_URL):
+        return None
+    path = os.path.normpath(os.path.join(STATIC_DIR, url[len(STATIC_URL):].split("?", 1)[0]))
+    return path if path.startswith(STATIC_DIR + os.sep) else None
+
+
+def collect_garbage(session, directory: str = STATIC_DIR, grace_seconds: int = GC_GRACE_SECONDS,
+                    dry_run: bool = False) -> dict:
+    """
+    Delete files in directory that nothing references any more. Files newer than
+    grace_seconds are kept: an upload can land before the inspection that uses it is saved.
+    """
+    keep = referenced_names(session)
+    cutoff = time.time() - grace_seconds
+    removed, freed = [], 0
+    for entry in os.scandir(directory):
+        if not entry.is_file() or entry.name.startswith("."):
+            continue
+        owner = entry.name[:-3] if entry.name.endswith(".gz") else entry.name
+        if owner in keep or entry.stat().st_mtime > cutoff:
+            continue
+        removed.append(entry.name)
+        freed += entry.stat().st_size
+        if not dry_run:
+            os.remove(entry.path)
+    return {"removed": len(removed), "bytes_freed": freed, "kept": len(keep), "dry_run": dry_run, "files": removed}
+
+
+if __name__ == "__main__":
+    import sys
+    from sqlmodel import Session
+    from database import engine, init_db
+
+    if len(sys.argv) < 2 or sys.argv[1] != "gc":
+        print("Usage: python static_files.py gc [--dry-run]")
+        sys.exit(1)
+
+    init_db()
+    dry_run = "--dry-run" in sys.argv[2:]
+    with Session(engine) as session:
+        # Top level (logos, older uploads) and uploads/ (storage.LocalStorage)
+        for directory in (STATIC_DIR, STORED_UPLOADS):
+            if not os.path.isdir(directory):
+                continue
+            result = collect_garbage(session, directory, dry_run=dry_run)
+            for name in result.pop("files"):
+                print(f"{'Would remove' if dry_run else 'Removed'} {os.path.join(directory, name)}")
+            print(directory, result)
@@ -0,0 +1,95 @@
+"""
+Where uploaded files end up. The upload route spools the file to local disk
+and a background worker hands it to the configured backend
+(UPLOAD_STORAGE = cloudinary | local | s3, default cloudinary), which returns
+the value stored in Inspection.photo_path / signature_path:
+
+- cloudinary: the secure_url (CLOUDINARY_* settings)
+- local: /static/uploads/<name>, the file written to STORED_UPLOADS (under
+  the /static mount's directory); named by content hash (see static_files.py),
+  so identical files are stored once
+- s3: S3_PUBLIC_URL/<key> for any S3-compatible store
+  (S3_BUCKET, S3_ENDPOINT_URL, S3_PREFIX; credentials the usual boto3 way)
+
+Client libraries are imported when the backend is first used.
+"""
+import os
+from functools import lru_cache
+from static_files import STATIC_URL, STORED_UPLOADS, extension, store_path
+
+UPLOAD_STORAGE = os.getenv("UPLOAD_STORAGE", "cloudinary").strip().lower()
+
+
+class LocalStorage:
+    def __init__(self, directory: str = STORED_UPLOADS, url_prefix: str = f"{STATIC_URL}uploads/"):
+        self.directory = directory
+        self.url_prefix = url_prefix
+
+    def save(self, path: str, name: str, content_type: str) -> str:
+        return self.url_prefix + store_path(path, self.directory, extension(name))
+
+
+class S3Storage:
+    def __init__(self, bucket: str, public_url: str, prefix: str = "", endpoint_url: str = None):
+        self.bucket = bucket
+        self.public_url = public_url.rstrip("/")
+        self.prefix = prefix.strip("/")
+        self.endpoint_url = endpoint_url
+
+    @property
+    def client(self):
+        return _s3_client(self.endpoint_url)
+
+    def save(self, path: str, name: str, content_type: str) -> str:
+        key = f"{self.prefix}/{name}" if self.prefix else name
+        self.client.upload_file(path, self.bucket, key, ExtraArgs={"ContentType": content_type})
+        return f"{self.public_url}/{key}"
+
+
+@lru_cache(maxsize=4)
+def _s3_client(endpoint_url):
+    import boto3
+    return boto3.client("s3", endpoint_url=endpoint_url)
+
+
+class CloudinaryStorage:
+    def __init__(self, folder: str = "fire_safety_app"):
+        self.folder = folder
+
+    def save(self, path: str, name: str, content_type: str) -> str:
+        result = get_uploader().upload(path, folder=self.folder)
+        return result.get("secure_url")
+
+
+@lru_cache(maxsize=1)
+def get_uploader():
+    """
+    Import and configure Cloudinary on first upload instead of at startup.
+    """
+    import cloudinary
+    import cloudinary.uploader
+
+    # Configure Cloudinary
+    cloudinary.config( 
+        cloud_name = os.getenv("CLOUDINARY_CLOUD_NAME", "dz92qndid"), 
+        api_key = os.getenv("CLOUDINARY_API_KEY", "458416816738218"), 
+        api_secret = os.getenv("CLOUDINARY_API_SECRET", "nG_r4v2K3WUiK1v8hxKcDyAWWW8"),
+        secure = True
+    )
+    return cloudinary.uploader
+
+
+@lru_cache(maxsize=1)
+def get_storage():
+    if UPLOAD_STORAGE == "local":
+        return LocalStorage()
+    if UPLOAD_STORAGE == "s3":
+        return S3Storage(
+            bucket=os.environ["S3_BUCKET"],
+            public_url=os.environ["S3_PUBLIC_URL"],
+            prefix=os.getenv("S3_PREFIX", "fire_safety_app"),
+            endpoint_url=os.getenv("S3_ENDPOINT_URL"),
+        )
+    if UPLOAD_STORAGE == "cloudinary":
+        return CloudinaryStorage()
+    raise ValueError(f"Unknown UPLOAD_STORAGE: {UPLOAD_STORAGE}")
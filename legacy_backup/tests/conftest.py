@@ -0,0 +1,57 @@
+"""
+The app on a throwaway SQLite database, run in-process through TestClient.
+"""
+import os
+import sys
+import tempfile
+import uuid
+
+_workdir = tempfile.mkdtemp(prefix="fire_safety_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_workdir, 'test.db')}"
+os.environ.setdefault("PDF_CACHE_DIR", os.path.join(_workdir, "pdf"))
+os.environ.setdefault("STARTUP_WARMUP", "0")
+os.environ.setdefault("COMPLIANCE_JOB_MINUTES", "0")
+os.environ.setdefault("PDF_RENDER_WORKERS", "0") # Render in a thread, no process pool to spawn
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(_workdir) # uploads/, spool/ and the PDF cache are relative paths
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+
+@pytest.fixture(scope="session")
+def app_client():
+    import main
+
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.fixture(scope="session")
+def admin_token(app_client):
+    from database import engine
+    from models import User
+    from auth import create_access_token, get_password_hash, token_claims
+
+    with Session(engine) as session:
+        admin = User(username="test_admin", password_hash=get_password_hash("x"), role="admin")
+        session.add(admin)
+        session.commit()
+        session.refresh(admin)
+        return create_access_token(data=token_claims(admin))
+
+
+@pytest.fixture
+def client(app_client, admin_token):
+    app_client.headers["Authorization"] = f"Bearer {admin_token}"
+    return app_client
+
+
+@pytest.fixture
+def extinguisher(client):
+    response = client.post("/extinguishers/", json={
+        "sl_no": f"T-{uuid.uuid4().hex[:8]}", "type": "CO2", "capacity": "4.5KG", "location": "Test Bay",
+    })
+    assert response.status_code == 200, response.text
+    return response.json()
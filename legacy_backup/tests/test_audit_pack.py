@@ -0,0 +1,37 @@
+import asyncio
+import uuid
+
+import audit_pack
+
+
+def test_closing_zip_stream_cancels_pending_renders(client, extinguisher, monkeypatch, tmp_path):
+    ids = []
+    for _ in range(3):
+        response = client.post("/inspections/", json={"extinguisher_id": extinguisher["id"], "inspection_type": "Monthly"})
+        ids.append(uuid.UUID(response.json()["id"]))
+    ready = tmp_path / "report.pdf"
+    ready.write_bytes(b"%PDF-1.4 test")
+    cancelled = []
+
+    async def fake_render(data, digest=None):
+        if data["inspection"]["id"] == str(ids[0]):
+            return str(ready)
+        try:
+            await asyncio.sleep(3600)
+        except asyncio.CancelledError:
+            cancelled.append(data["inspection"]["id"])
+            raise
+
+    monkeypatch.setattr(audit_pack, "get_or_render", fake_render)
+    monkeypatch.setattr(audit_pack, "audit_pack_ids", lambda *args, **kwargs: ids)
+
+    async def download_first_entry():
+        stream = audit_pack.stream_zip(ids)
+        first = await stream.__anext__()
+        await stream.aclose() # What the server does when the client disconnects
+        await asyncio.sleep(0)
+        return first
+
+    first = client.portal.call(download_first_entry)
+    assert first
+    assert sorted(cancelled) == sorted(str(i) for i in ids[1:])
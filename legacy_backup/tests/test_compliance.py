@@ -0,0 +1,54 @@
+import uuid
+from datetime import datetime, timedelta
+
+from sqlmodel import Session
+
+import compliance
+from database import engine
+from models import Extinguisher
+
+
+def test_due_date_rules():
+    assert compliance.family("CO2") == "co2"
+    assert compliance.family("ABC Powder") == "dcp"
+    assert compliance.family("Mechanical Foam") == "foam"
+    assert compliance.add_months(datetime(2026, 1, 31), 1) == datetime(2026, 2, 28)
+    assert compliance.add_months(datetime(2026, 11, 15), 3) == datetime(2027, 2, 15)
+
+
+def test_annual_inspection_moves_maintenance_and_service_dates(client, extinguisher):
+    response = client.post("/inspections/", json={"extinguisher_id": extinguisher["id"], "inspection_type": "Annual"})
+    done_on = datetime.fromisoformat(response.json()["inspection_date"])
+    with Session(engine) as session:
+        asset = session.get(Extinguisher, uuid.UUID(extinguisher["id"]))
+        assert asset.next_service_due == compliance.add_months(done_on, compliance.INSPECTION_INTERVAL_MONTHS)
+        assert asset.next_maintenance_due == compliance.add_months(done_on, compliance.MAINTENANCE_INTERVAL_MONTHS)
+        assert asset.compliance_due == min(asset.next_service_due, asset.next_maintenance_due,
+                                           *[d for d in (asset.next_hydro_pressure_test_due, asset.end_of_life) if d])
+
+
+def test_status_job_clears_scan_cache(client, extinguisher):
+    client.post("/inspections/", json={"extinguisher_id": extinguisher["id"], "inspection_type": "Quarterly"})
+    assert client.get(f"/extinguishers/{extinguisher['id']}").json()["status"] == "Operational" # Now cached
+
+    with Session(engine) as session:
+        asset = session.get(Extinguisher, uuid.UUID(extinguisher["id"]))
+        asset.next_service_due = datetime.utcnow() - timedelta(days=1)
+        session.add(asset)
+        session.commit()
+        counts = compliance.evaluate_statuses(session)
+    assert counts["overdue"] >= 1
+    assert client.get(f"/extinguishers/{extinguisher['id']}").json()["status"] == compliance.OVERDUE_STATUS
+
+
+def test_only_one_worker_leads_the_status_job(tmp_path):
+    from sqlalchemy import create_engine
+
+    other_engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}")
+    first, second = compliance.JobLeader(other_engine), compliance.JobLeader(other_engine)
+    assert first.acquire()
+    assert first.acquire() # Still ours
+    assert not second.acquire()
+    first.release()
+    assert second.acquire()
+    second.release()
@@ -0,0 +1,56 @@
+import asyncio
+
+import events
+
+
+class DroppingPubSub:
+    """
+    Stand-in for a redis.asyncio PubSub whose connection drops after its messages.
+    """
+    def __init__(self, messages):
+        self.messages = messages
+        self.closed = False
+
+    async def subscribe(self, channel):
+        pass
+
+    async def listen(self):
+        for data in self.messages:
+            yield {"type": "message", "data": data}
+        raise ConnectionError("Connection closed by server.")
+
+    async def aclose(self):
+        self.closed = True
+
+
+class FakeClient:
+    def __init__(self, sessions):
+        self.sessions = sessions
+        self.opened = []
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        pubsub = DroppingPubSub(self.sessions[len(self.opened)])
+        self.opened.append(pubsub)
+        return pubsub
+
+
+def test_redis_listener_resubscribes_after_connection_drop(monkeypatch):
+    monkeypatch.setattr(events, "EVENTS_RECONNECT_MAX_SECONDS", 0.01)
+    backend = events.RedisBackend()
+    backend._client = FakeClient([["a"], ["b"], ["c"], [], [], []])
+    delivered = []
+
+    async def scenario():
+        pubsub = await backend._subscribe()
+        listener = asyncio.ensure_future(backend._listen(pubsub, delivered.append))
+        while len(delivered) < 3:
+            await asyncio.sleep(0.01)
+        listener.cancel()
+        try:
+            await listener
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(asyncio.wait_for(scenario(), 5))
+    assert delivered == ["a", "b", "c"]
+    assert all(pubsub.closed for pubsub in backend._client.opened)
@@ -0,0 +1,92 @@
+import uuid
+from datetime import datetime, timedelta
+
+
+def batch_item(extinguisher_id: str, **fields) -> dict:
+    return {"extinguisher_id": extinguisher_id, "inspection_type": "Quarterly", "client_uuid": str(uuid.uuid4()), **fields}
+
+
+def test_late_offline_item_does_not_overwrite_newer_state(client, extinguisher):
+    online = client.post("/inspections/", json={"extinguisher_id": extinguisher["id"], "inspection_type": "Annual"})
+    assert online.status_code == 200
+    latest = client.get(f"/extinguishers/{extinguisher['id']}").json()
+
+    recorded = (datetime.utcnow() - timedelta(days=3)).isoformat()
+    response = client.post("/inspections/batch", json={"device_id": "tablet-1", "inspections": [
+        batch_item(extinguisher["id"], inspection_date=recorded, observation="Not Ok"),
+    ]})
+    assert response.status_code == 200
+    result = response.json()["results"][0]
+    assert result["status"] == "created"
+
+    stored = client.get(f"/inspections/{result['inspection_id']}").json()
+    assert stored["inspection_date"].startswith(recorded[:19])
+    after = client.get(f"/extinguishers/{extinguisher['id']}").json()
+    for column in ("last_inspection_date", "next_service_due", "status"):
+        assert after[column] == latest[column]
+
+
+def test_batch_rejects_future_inspection_date(client, extinguisher):
+    future = (datetime.utcnow() + timedelta(days=1)).isoformat()
+    response = client.post("/inspections/batch", json={"device_id": "tablet-1", "inspections": [
+        batch_item(extinguisher["id"], inspection_date=future),
+    ]})
+    assert response.status_code == 200
+    assert response.json()["results"][0]["status"] == "error"
+    assert response.json()["results"][0]["detail"] == "inspection_date is in the future"
+
+
+def inspection_count(extinguisher_id: str) -> int:
+    from sqlmodel import Session, func, select
+    from database import engine
+    from models import Inspection
+
+    with Session(engine) as session:
+        return session.exec(select(func.count()).select_from(Inspection)
+                            .where(Inspection.extinguisher_id == uuid.UUID(extinguisher_id))).one()
+
+
+def test_idempotency_key_replays_the_first_inspection(client, extinguisher):
+    body = {"extinguisher_id": extinguisher["id"], "inspection_type": "Monthly", "remarks": "Retry me"}
+    headers = {"Idempotency-Key": f"key-{uuid.uuid4()}"}
+
+    first = client.post("/inspections/", json=body, headers=headers)
+    again = client.post("/inspections/", json=body, headers=headers)
+
+    assert first.status_code == again.status_code == 200
+    assert "Idempotent-Replayed" not in first.headers
+    assert again.headers["Idempotent-Replayed"] == "true"
+    assert again.json()["id"] == first.json()["id"]
+    assert inspection_count(extinguisher["id"]) == 1
+
+
+def test_idempotency_key_reused_for_another_payload_is_rejected(client, extinguisher):
+    headers = {"Idempotency-Key": f"key-{uuid.uuid4()}"}
+    first = client.post("/inspections/", json={"extinguisher_id": extinguisher["id"], "inspection_type": "Monthly"},
+                        headers=headers)
+    assert first.status_code == 200
+
+    other = client.post("/inspections/", json={"extinguisher_id": extinguisher["id"], "inspection_type": "Annual"},
+                        headers=headers)
+    assert other.status_code == 422
+    assert inspection_count(extinguisher["id"]) == 1
+
+
+def test_batch_reports_resent_items_as_duplicates(client, extinguisher):
+    item = batch_item(extinguisher["id"])
+    first = client.post("/inspections/batch", json={"device_id": "tablet-1", "inspections": [item, dict(item)]})
+    assert first.status_code == 200
+    created, repeated = first.json()["results"]
+    assert created["status"] == "created"
+    assert repeated["status"] == "duplicate"
+    assert repeated["inspection_id"] == created["inspection_id"]
+
+    resent = client.post("/inspections/batch", json={"device_id": "tablet-1", "inspections": [item]})
+    assert resent.status_code == 200
+    assert resent.json()["duplicate"] == 1
+    assert resent.json()["results"][0]["inspection_id"] == created["inspection_id"]
+
+    # The key is device_id + client_uuid: another device's item with the same uuid is its own inspection
+    other_device = client.post("/inspections/batch", json={"device_id": "tablet-2", "inspections": [item]})
+    assert other_device.json()["results"][0]["status"] == "created"
+    assert inspection_count(extinguisher["id"]) == 2
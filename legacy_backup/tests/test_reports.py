@@ -0,0 +1,61 @@
+import asyncio
+import uuid
+
+import pdf_reports
+
+
+def create_inspection(client, extinguisher, **fields) -> dict:
+    response = client.post("/inspections/", json={"extinguisher_id": extinguisher["id"], "inspection_type": "Quarterly", **fields})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_report_is_cached_with_etag(client, extinguisher):
+    inspection = create_inspection(client, extinguisher)
+    first = client.get(f"/inspections/{inspection['id']}/pdf")
+    assert first.status_code == 200
+    assert first.content.startswith(b"%PDF")
+
+    again = client.get(f"/inspections/{inspection['id']}/pdf", headers={"If-None-Match": first.headers["etag"]})
+    assert again.status_code == 304
+
+
+def test_report_with_missing_photo_is_not_cached(client, extinguisher):
+    from sqlmodel import Session
+    from database import engine
+    from pdf_reports import load_report_data, report_digest, report_file, pdf_cache
+
+    inspection = create_inspection(client, extinguisher, photo_path="/static/uploads/not-there-yet.jpg")
+    response = client.get(f"/inspections/{inspection['id']}/pdf")
+    assert response.status_code == 200
+    assert response.content.startswith(b"%PDF")
+    assert "etag" not in response.headers
+    assert response.headers["cache-control"] == "no-store"
+
+    inspection_id = uuid.UUID(inspection["id"])
+    with Session(engine) as session:
+        digest = report_digest(load_report_data(session, [inspection_id])[inspection_id])
+    assert pdf_cache.get(report_file(digest)) is None
+
+
+def test_waiter_renders_itself_when_shared_render_is_cancelled(client, extinguisher, monkeypatch, tmp_path):
+    monkeypatch.setattr(pdf_reports, "pdf_cache", pdf_reports.DiskCache("test_pdf", str(tmp_path), 10 ** 8))
+    data = {"inspection": {"id": str(uuid.uuid4())}}
+
+    def slow_render(report):
+        import time
+        time.sleep(0.2)
+        return b"%PDF-1.4 test", True
+
+    monkeypatch.setattr(pdf_reports, "render_report", slow_render)
+
+    async def scenario():
+        owner = asyncio.ensure_future(pdf_reports.get_or_render(data, "d1"))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.ensure_future(pdf_reports.get_or_render(data, "d1"))
+        await asyncio.sleep(0.01)
+        owner.cancel()
+        return await waiter
+
+    path = client.portal.call(scenario)
+    assert path.endswith("d1.pdf")
@@ -0,0 +1,18 @@
+from PIL import Image
+
+from images import local_path
+from storage import LocalStorage
+
+
+def test_local_storage_returns_a_url_the_static_mount_serves(client, tmp_path):
+    spooled = tmp_path / "spooled"
+    Image.new("RGB", (40, 30), "red").save(spooled, "JPEG")
+
+    url = LocalStorage().save(str(spooled), "photo.jpg", "image/jpeg")
+
+    assert url.startswith("/static/uploads/") and url.endswith(".jpg")
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.content == spooled.read_bytes()
+    assert local_path(url) is not None # What PDFs and thumbnails read
+    assert client.get(url.replace("/static/", "/static/thumb/")).status_code == 200
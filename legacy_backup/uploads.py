@@ -0,0 +1,295 @@
+"""
+Uploads: accepted quickly, stored in the background.
+
+POST /upload/ streams the multipart body into a spool file (UPLOAD_SPOOL_DIR),
+refusing anything over MAX_UPLOAD_MB while it is still arriving, records an
+Upload row and answers right away with a provisional reference,
+"upload:<id>". Clients store that reference in photo_path / signature_path
+exactly like a URL.
+
+A small thread pool (UPLOAD_WORKERS) re-encodes photos to the size, format
+and quality in CompanySettings (see images.transcode_upload), then forwards
+the result to the storage backend (see storage.py), retrying failures with
+backoff. On success the row
+gets the final URL, and every inspection holding the reference is rewritten to
+it. Inspections saved after that resolve the reference themselves (see
+resolve / settle). Transfers interrupted by a restart are picked up again by
+resume_transfers() at startup.
+"""
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import update
+from sqlmodel import Session, select
+from database import engine
+from models import CompanySettings, Inspection, Upload
+from storage import get_storage, UPLOAD_STORAGE
+from images import TranscodeParams, transcode_upload
+from changes import record_changes
+
+MAX_UPLOAD_BYTES = int(float(os.getenv("MAX_UPLOAD_MB", "15")) * 1024 * 1024)
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "spool"))
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "4"))
+UPLOAD_MAX_ATTEMPTS = int(os.getenv("UPLOAD_MAX_ATTEMPTS", "3"))
+UPLOAD_STALE_SECONDS = 600 # A transfer this old with no progress was interrupted
+SPOOL_CHUNK_BYTES = 1024 * 1024
+MULTIPART_OVERHEAD_BYTES = 64 * 1024 # Boundaries and part headers on top of the file itself
+PROVISIONAL_PREFIX = "upload:"
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+# --- References --------------------------------------------------------------
+
+def reference(upload_id: uuid.UUID) -> str:
+    return f"{PROVISIONAL_PREFIX}{upload_id}"
+
+
+def parse_reference(value: Optional[str]) -> Optional[uuid.UUID]:
+    if not value or not value.startswith(PROVISIONAL_PREFIX):
+        return None
+    try:
+        return uuid.UUID(value[len(PROVISIONAL_PREFIX):])
+    except ValueError:
+        return None
+
+
+def _references(inspections: Iterable[Inspection]) -> Dict[uuid.UUID, str]:
+    refs = {}
+    for inspection in inspections:
+        for value in (inspection.photo_path, inspection.signature_path):
+            upload_id = parse_reference(value)
+            if upload_id:
+                refs[upload_id] = value
+    return refs
+
+
+def resolve(session: Session, inspections: List[Inspection]) -> bool:
+    """
+    Replace references to finished uploads with their URLs, in place.
+    Returns True if any reference is still pending.
+    """
+    refs = _references(inspections)
+    if not refs:
+        return False
+    done = dict(session.exec(
+        select(Upload.id, Upload.url).where(Upload.id.in_(list(refs)), Upload.status == "done")
+    ).all())
+    urls = {refs[upload_id]: url for upload_id, url in done.items()}
+    for inspection in inspections:
+        inspection.photo_path = urls.get(inspection.photo_path, inspection.photo_path)
+        inspection.signature_path = urls.get(inspection.signature_path, inspection.signature_path)
+    return len(done) < len(refs)
+
+
+def settle(session: Session, inspections: List[Inspection]):
+    """
+    Call after committing inspections that may hold references. An upload that
+    finished between resolve() and the commit has already rewritten the rows it
+    could see, but not ours: catch it here.
+    """
+    if not _references(inspections):
+        return
+    resolve(session, inspections)
+    if session.dirty:
+        session.commit()
+
+
+# --- Spooling ----------------------------------------------------------------
+
+def spool_path(upload_id: uuid.UUID) -> str:
+    return os.path.join(UPLOAD_SPOOL_DIR, str(upload_id))
+
+
+def spool(source, upload_id: uuid.UUID) -> int:
+    """
+    Copy an uploaded file object into the spool in chunks. Returns its size.
+    """
+    os.makedirs(UPLOAD_SPOOL_DIR, exist_ok=True)
+    path = spool_path(upload_id)
+    size = 0
+    try:
+        with open(path, "wb") as out:
+            while chunk := source.read(SPOOL_CHUNK_BYTES):
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    raise UploadTooLarge()
+                out.write(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return size
+
+
+def storage_name(upload_id: uuid.UUID, filename: str) -> str:
+    """
+    <id>.<ext>, keeping a short extension from the client's file name.
+    """
+    ext = os.path.splitext(filename or "")[1].lower()
+    if not re.fullmatch(r"\.[a-z0-9]{1,8}", ext):
+        ext = ""
+    return f"{upload_id}{ext}"
+
+
+# --- Transfers ---------------------------------------------------------------
+
+_executor = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS, thread_name_prefix="upload")
+_stats_lock = threading.Lock()
+_stats = {"queued": 0, "done": 0, "failed": 0, "retries": 0, "transcoded": 0, "bytes_received": 0, "bytes_stored": 0}
+
+
+def _count(name: str, delta: int = 1):
+    with _stats_lock:
+        _stats[name] += delta
+
+
+def submit(upload_id: uuid.UUID):
+    _count("queued")
+    _executor.submit(transfer, upload_id)
+
+
+def transfer(upload_id: uuid.UUID):
+    """
+    Forward one spooled upload to storage. Claims the row first, so a transfer
+    resumed by two workers at once runs only once.
+    """
+    try:
+        # Objects stay usable after commit, and no connection is held while storage is slow
+        with Session(engine, expire_on_commit=False) as session:
+            claimed = session.exec(
+                update(Upload)
+                .where(Upload.id == upload_id, Upload.status == "pending")
+                .values(status="transferring", attempts=Upload.attempts + 1, updated_at=datetime.utcnow())
+            ).rowcount
+            session.commit()
+            if not claimed:
+                return
+            upload = session.get(Upload, upload_id)
+            session.commit()
+            _transfer(session, upload)
+    except Exception as e:
+        print(f"Upload {upload_id} transfer crashed: {e}")
+    finally:
+        _count("queued", -1)
+
+
+def photo_params(session: Session) -> TranscodeParams:
+    settings = session.get(CompanySettings, 1) or CompanySettings()
+    session.commit() # Don't hold the connection while encoding
+    return TranscodeParams(settings.photo_max_px, settings.photo_format, settings.photo_quality)
+
+
+def _prepare(session: Session, upload: Upload) -> str:
+    """
+    Path of the file to store: the transcoded photo for images, the spool file otherwise.
+    Sets the stored size, content type and name on the upload.
+    """
+    path = spool_path(upload.id)
+    if not upload.content_type.startswith("image/"):
+        upload.stored_size = upload.size
+        return path
+
+    out = f"{path}.out"
+    upload.content_type, extension = transcode_upload(path, out, photo_params(session))
+    upload.filename = f"{os.path.splitext(upload.filename)[0]}{extension}"
+    upload.stored_size = os.path.getsize(out)
+    _count("transcoded")
+    return out
+
+
+def _transfer(session: Session, upload: Upload):
+    try:
+        path = _prepare(session, upload)
+    except Exception as e:
+        # Never store an image we could not strip: keep the spool file and give up
+        print(f"Upload {upload.id} could not be transcoded: {e}")
+        upload.status, upload.error, upload.updated_at = "failed", f"Transcoding failed: {e}"[:500], datetime.utcnow()
+        session.add(upload)
+        session.commit()
+        _count("failed")
+        return
+    name = storage_name(upload.id, upload.filename)
+    while True:
+        try:
+            url = get_storage().save(path, name, upload.content_type)
+            if not url:
+                raise RuntimeError("Storage returned no URL")
+            break
+        except Exception as e:
+            if upload.attempts >= UPLOAD_MAX_ATTEMPTS:
+                print(f"Upload {upload.id} failed after {upload.attempts} attempts: {e}")
+                upload.status, upload.error, upload.updated_at = "failed", str(e)[:500], datetime.utcnow()
+                session.add(upload)
+                session.commit()
+                _count("failed")
+                return # Spool file kept for a manual retry
+            print(f"Upload {upload.id} attempt {upload.attempts} failed, retrying: {e}")
+            _count("retries")
+            time.sleep(2 ** upload.attempts)
+            upload.attempts += 1
+            upload.updated_at = datetime.utcnow()
+            session.add(upload)
+            session.commit()
+
+    # Mark done first, then rewrite: an inspection committed in between will see "done" in settle()
+    upload.status, upload.url, upload.error, upload.updated_at = "done", url, None, datetime.utcnow()
+    session.add(upload)
+    session.commit()
+
+    ref = reference(upload.id)
+    for column in (Inspection.photo_path, Inspection.signature_path):
+        ids = session.exec(select(Inspection.id).where(column == ref)).all()
+        if ids:
+            session.exec(update(Inspection).where(Inspection.id.in_(ids)).values({column.key: url}))
+            record_changes(session, "inspection", ids)
+    session.commit()
+    _count("done")
+    _count("bytes_received", upload.size)
+    _count("bytes_stored", upload.stored_size)
+
+    for leftover in {path, spool_path(upload.id)}:
+        try:
+            os.remove(leftover)
+        except FileNotFoundError:
+            pass
+
+
+def resume_transfers() -> int:
+    """
+    Re-queue uploads left pending (or stuck mid-transfer) by a restart. Returns how many.
+    """
+    stale = datetime.utcnow() - timedelta(seconds=UPLOAD_STALE_SECONDS)
+    with Session(engine) as session:
+        session.exec(
+            update(Upload)
+            .where(Upload.status == "transferring", Upload.updated_at < stale)
+            .values(status="pending")
+        )
+        session.commit()
+        ids = session.exec(select(Upload.id).where(Upload.status == "pending")).all()
+    resumed = 0
+    for upload_id in ids:
+        if os.path.exists(spool_path(upload_id)):
+            submit(upload_id)
+            resumed += 1
+    return resumed
+
+
+def stats() -> dict:
+    with _stats_lock:
+        saved = _stats["bytes_received"] - _stats["bytes_stored"]
+        return {
+            "workers": UPLOAD_WORKERS,
+            "storage": UPLOAD_STORAGE,
+            **_stats,
+            "bytes_saved": saved,
+            "bytes_saved_per_upload": saved // _stats["done"] if _stats["done"] else 0,
+            "stored_ratio": round(_stats["bytes_stored"] / _stats["bytes_received"], 4) if _stats["bytes_received"] else None,
+        }
@@ -1,4 +1,6 @@
 import re
+import json
+import base64
 from fastapi import HTTPException, status
 
 def validate_password_strength(password: str):
@@ -27,3 +29,36 @@ def validate_password_strength(password: str):
         )
     
     return True
+
+def encode_cursor(values: list) -> str:
+    """
+    Pack keyset values into an opaque, URL-safe cursor string.
+    """
+    raw = json.dumps(values, default=str, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> list:
+    """
+    Reverse of encode_cursor. Raises 400 on anything we did not issue.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(values, list):
+            raise ValueError("cursor is not a list")
+        return values
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor."
+        )
+
+SERIAL_SEPARATORS = re.compile(r"[\s\-_/.]+")
+
+def normalize_serial(sl_no: str) -> str:
+    """
+    Canonical form of an extinguisher serial for lookups: trimmed, upper-cased,
+    with runs of separators (space, -, _, /, .) collapsed to a single '-'.
+    "fe 001", "FE_001" and " Fe--001 " all become "FE-001".
+    """
+    return SERIAL_SEPARATORS.sub("-", sl_no.strip().upper()).strip("-")